@@ -1,16 +1,25 @@
 import streamlit as st
-import PyPDF2
 import json
 from datetime import datetime
 from pathlib import Path
-import groq
 import pandas as pd
 import plotly.graph_objects as go
-import hashlib
-import io
 import os
+import queue
 import re
-import unicodedata
+import secrets
+import threading
+from backends import BACKENDS, DEFAULT_BACKEND, DEFAULT_BASE_URL, DEFAULT_CASSETTE, chat, get_client
+from scheduler import RATE_LIMITS, parse_limits
+from pipeline import (
+    DEFAULT_OPTIONS, extract_json_strict, screen_batch, validate_referential_structure,
+)
+from keywords import keyword_index
+from registry import get_registry, get_store, referential_hash
+from runs import get_run_store, run_owner
+from metrics import METRICS, PROMETHEUS_FILE, METRICS_FILE, diff, stage_rows, totals, write_default_files
+from exports import EXPORT_FORMATS, available_formats, export_bytes, export_record
+from scoring import DEFAULT_POLICY, apply_scores, compile_weights, normalize_status, requirement_matrix
 
 # ===================== i18n =====================
 LANGS = {
@@ -94,14 +103,109 @@ T = {
     },
     "synth": {"fr": "### 🧠 Synthèse IA", "en": "### 🧠 AI Summary", "es": "### 🧠 Resumen de IA"},
     "gauge": {"fr": "Score Global", "en": "Overall Score", "es": "Puntuación Global"},
-    "justif": {"fr": "*Justification:*", "en": "*Justification:*", "es": "*Justificación:*"},
-    "elements_cv": {"fr": "*Éléments du CV:*", "en": "*CV Evidence:*", "es": "*Evidencias del CV:*"},
-    "confidence": {"fr": "*Confiance:*", "en": "*Confidence:*", "es": "*Confianza:*"},
+    "justif": {"fr": "Justification", "en": "Justification", "es": "Justificación"},
+    "elements_cv": {"fr": "Éléments du CV", "en": "CV Evidence", "es": "Evidencias del CV"},
+    "confidence": {"fr": "Confiance", "en": "Confidence", "es": "Confianza"},
+    "tokens_saved": {"fr": "Tokens économisés (compactage)", "en": "Tokens saved (compaction)", "es": "Tokens ahorrados (compactación)"},
+    "chunked": {
+        "fr": "🧩 Analyse découpée par groupes d'exigences",
+        "en": "🧩 Split analysis by requirement groups",
+        "es": "🧩 Análisis dividido por grupos de requisitos",
+    },
+    "chunked_help": {
+        "fr": "Une requête courte par catégorie d'exigences, en parallèle : évite les réponses tronquées sur les grands référentiels.",
+        "en": "One short request per requirement category, in parallel: avoids truncated answers on large referentials.",
+        "es": "Una petición corta por categoría de requisitos, en paralelo: evita respuestas truncadas en referenciales grandes.",
+    },
+    "prescreen": {
+        "fr": "🔎 Pré-filtrage local (sans IA)",
+        "en": "🔎 Local pre-screening (no AI)",
+        "es": "🔎 Pre-filtrado local (sin IA)",
+    },
+    "prescreen_modes": {
+        "fr": {"": "Désactivé", "facts": "Faits transmis à l'IA", "filter": "Faits + rejet des CV éliminatoires"},
+        "en": {"": "Off", "facts": "Facts passed to the AI", "filter": "Facts + reject disqualified CVs"},
+        "es": {"": "Desactivado", "facts": "Hechos enviados a la IA", "filter": "Hechos + rechazo de CV eliminatorios"},
+    },
+    "prescreen_help": {
+        "fr": "Vérifie localement l'expérience, les formations (HACCP, Lead Auditor) et le nombre d'audits. En mode rejet, un CV qui échoue une exigence critique n'est pas envoyé à l'IA.",
+        "en": "Checks experience, courses (HACCP, Lead Auditor) and audit counts locally. In reject mode, a CV failing a critical requirement is not sent to the AI.",
+        "es": "Comprueba localmente la experiencia, los cursos (HACCP, Lead Auditor) y el número de auditorías. En modo rechazo, un CV que no cumple un requisito crítico no se envía a la IA.",
+    },
+    "prescreen_rejected": {
+        "fr": "🔎 Rejeté par le pré-filtrage local : aucune analyse IA effectuée.",
+        "en": "🔎 Rejected by local pre-screening: no AI analysis performed.",
+        "es": "🔎 Rechazado por el pre-filtrado local: no se realizó análisis de IA.",
+    },
+    "retrieval": {
+        "fr": "🎯 N'envoyer que les passages pertinents du CV",
+        "en": "🎯 Send only the relevant CV passages",
+        "es": "🎯 Enviar solo los pasajes relevantes del CV",
+    },
+    "retrieval_help": {
+        "fr": "Le CV est découpé en passages ; pour chaque exigence, seuls les passages les plus proches (BM25) sont transmis au modèle. Réduit fortement les tokens pour les CV longs.",
+        "en": "The CV is split into passages; for each requirement only the closest passages (BM25) are sent to the model. Greatly reduces tokens for long CVs.",
+        "es": "El CV se divide en pasajes; para cada requisito solo se envían al modelo los pasajes más cercanos (BM25). Reduce mucho los tokens en CV largos.",
+    },
+    "retrieval_tokens": {
+        "fr": "Tokens du CV envoyés (passages retenus / CV complet)",
+        "en": "CV tokens sent (selected passages / full CV)",
+        "es": "Tokens del CV enviados (pasajes seleccionados / CV completo)",
+    },
+    "stream": {
+        "fr": "📡 Affichage en direct (streaming)",
+        "en": "📡 Live display (streaming)",
+        "es": "📡 Visualización en directo (streaming)",
+    },
+    "stream_help": {
+        "fr": "Affiche chaque verdict par exigence dès sa réception.",
+        "en": "Shows each per-requirement verdict as soon as it arrives.",
+        "es": "Muestra cada veredicto por requisito en cuanto llega.",
+    },
+    "truncated": {
+        "fr": "Réponse du modèle tronquée : seules les exigences complètes ont été conservées.",
+        "en": "Model response was truncated: only complete requirements were kept.",
+        "es": "Respuesta del modelo truncada: solo se conservaron los requisitos completos.",
+    },
+    "extraction_partial": {
+        "fr": "Extraction du PDF interrompue (délai dépassé) : l'analyse ne porte que sur une partie du CV.",
+        "en": "PDF extraction was interrupted (timeout): only part of the CV was analysed.",
+        "es": "Extracción del PDF interrumpida (tiempo agotado): solo se analizó una parte del CV.",
+    },
+    "failed_requirements": {
+        "fr": "Exigences non évaluées (requête en échec, à relancer) : {ids}.",
+        "en": "Requirements not evaluated (request failed, run again): {ids}.",
+        "es": "Requisitos no evaluados (solicitud fallida, volver a lanzar): {ids}.",
+    },
+    "weighting": {"fr": "⚖️ Pondération du score", "en": "⚖️ Score weighting", "es": "⚖️ Ponderación de la puntuación"},
+    "use_hierarchy": {
+        "fr": "Pondérations catégories / sous-catégories du référentiel",
+        "en": "Referential category / subcategory weights",
+        "es": "Ponderaciones de categorías / subcategorías del referencial",
+    },
+    "challenge_factor": {
+        "fr": "Crédit d'une exigence « à challenger »",
+        "en": "Credit for a “to review” requirement",
+        "es": "Crédito de un requisito « a revisar »",
+    },
+    "use_confidence": {
+        "fr": "Moduler par la confiance du modèle",
+        "en": "Scale by model confidence",
+        "es": "Modular por la confianza del modelo",
+    },
+    "critical_ko": {"fr": "🚫 Critiques non conformes", "en": "🚫 Critical non-compliant", "es": "🚫 Críticos no conformes"},
+    "parallel": {
+        "fr": "⚡ Analyses simultanées :",
+        "en": "⚡ Concurrent analyses:",
+        "es": "⚡ Análisis simultáneos:",
+    },
     "export": {
-        "fr": "💾 Télécharger CSV",
-        "en": "💾 Download CSV",
-        "es": "💾 Descargar CSV",
+        "fr": "💾 Télécharger",
+        "en": "💾 Download",
+        "es": "💾 Descargar",
     },
+    "export_format": {"fr": "Format d'export", "en": "Export format", "es": "Formato de exportación"},
+    "include_text": {"fr": "Inclure le texte brut des CV", "en": "Include raw CV text", "es": "Incluir el texto bruto de los CV"},
     "admin_header": {
         "fr": "🛠️ Administration des référentiels",
         "en": "🛠️ Referentials Administration",
@@ -195,11 +299,18 @@ T = {
         "en": "Filename (without .json)",
         "es": "Nombre de archivo (sin .json)",
     },
-    "backup": {
-        "fr": "Créer une sauvegarde .bak",
-        "en": "Create a .bak backup",
-        "es": "Crear copia .bak",
+    "history": {
+        "fr": "🕘 Versions enregistrées",
+        "en": "🕘 Saved versions",
+        "es": "🕘 Versiones guardadas",
+    },
+    "history_help": {
+        "fr": "Chaque enregistrement archive une version identifiée par l'empreinte de son contenu.",
+        "en": "Every save archives a version identified by its content hash.",
+        "es": "Cada guardado archiva una versión identificada por la huella de su contenido.",
     },
+    "restore": {"fr": "↩️ Restaurer cette version", "en": "↩️ Restore this version", "es": "↩️ Restaurar esta versión"},
+    "no_history": {"fr": "Aucune version archivée.", "en": "No archived version.", "es": "Ninguna versión archivada."},
     "save_changes": {
         "fr": "💾 Sauvegarder les modifications",
         "en": "💾 Save changes",
@@ -242,40 +353,96 @@ T = {
     "scoring_details": {"fr": "Détails du scoring", "en": "Scoring details", "es": "Detalles de la puntuación"},
     "top_missing": {"fr": "Principaux manques", "en": "Top missing items", "es": "Principales ausencias"},
     "download_json": {"fr": "📥 Télécharger le JSON détaillé", "en": "📥 Download detailed JSON", "es": "📥 Descargar JSON detallado"},
+    "runs": {"fr": "🗂️ Analyses précédentes", "en": "🗂️ Previous runs", "es": "🗂️ Análisis anteriores"},
+    "open_run": {"fr": "📂 Ouvrir", "en": "📂 Open", "es": "📂 Abrir"},
+    "no_runs": {"fr": "Aucune analyse enregistrée.", "en": "No saved run.", "es": "Ningún análisis guardado."},
+    "keep_cv_text": {"fr": "Conserver le texte des CV dans l'historique", "en": "Keep CV text in the history", "es": "Conservar el texto de los CV en el historial"},
+    "keep_cv_text_help": {
+        "fr": "Par défaut, seuls les résultats sont enregistrés sur disque (pas le texte brut des CV, donnée personnelle). Les analyses ne sont visibles que par votre clé API ou votre session.",
+        "en": "By default only the results are saved to disk (not the raw CV text, which is personal data). Runs are only visible to your API key or session.",
+        "es": "Por defecto solo se guardan en disco los resultados (no el texto bruto de los CV, dato personal). Los análisis solo son visibles para su clave API o su sesión.",
+    },
+    "run_version_missing": {
+        "fr": "La version du référentiel utilisée par cette analyse n'est plus disponible : scores et pondérations sont calculés avec la version courante.",
+        "en": "The referential version used by this run is no longer available: scores and weights are computed with the current version.",
+        "es": "La versión del referencial usada por este análisis ya no está disponible: puntuaciones y ponderaciones se calculan con la versión actual.",
+    },
+    "current_run": {"fr": "Analyse affichée :", "en": "Displayed run:", "es": "Análisis mostrado:"},
+    "matrix_title": {"fr": "Crédit par exigence et par candidat", "en": "Credit per requirement and candidate", "es": "Crédito por requisito y candidato"},
+    "requirement": {"fr": "Exigence", "en": "Requirement", "es": "Requisito"},
+    "per_page": {"fr": "Candidats par page", "en": "Candidates per page", "es": "Candidatos por página"},
+    "page": {"fr": "Page", "en": "Page", "es": "Página"},
+    "open_candidate": {"fr": "Ouvrir le détail d'un candidat", "en": "Open a candidate's details", "es": "Abrir el detalle de un candidato"},
+    "cascade": {"fr": "🪜 Cascade : modèle rapide d'abord", "en": "🪜 Cascade: fast model first", "es": "🪜 Cascada: modelo rápido primero"},
+    "cascade_help": {
+        "fr": "Le modèle rapide évalue toutes les exigences ; seules celles « à challenger » ou de confiance insuffisante sont réévaluées par le modèle choisi.",
+        "en": "The fast model evaluates every requirement; only “to review” or low-confidence ones are re-evaluated by the selected model.",
+        "es": "El modelo rápido evalúa todos los requisitos; solo los « a revisar » o de baja confianza los reevalúa el modelo elegido.",
+    },
+    "fast_model": {"fr": "Modèle rapide", "en": "Fast model", "es": "Modelo rápido"},
+    "escalate_below": {"fr": "Réévaluer sous la confiance", "en": "Re-evaluate below confidence", "es": "Reevaluar por debajo de la confianza"},
+    "cascade_summary": {
+        "fr": "🪜 {escalated}/{total} exigences réévaluées par {model} (les autres : {fast_model}).",
+        "en": "🪜 {escalated}/{total} requirements re-evaluated by {model} (others: {fast_model}).",
+        "es": "🪜 {escalated}/{total} requisitos reevaluados por {model} (los demás: {fast_model}).",
+    },
+    "pack": {"fr": "🧳 Grouper les CV courts", "en": "🧳 Pack short CVs", "es": "🧳 Agrupar los CV cortos"},
+    "pack_help": {
+        "fr": "Plusieurs CV courts sont évalués dans une même requête (le référentiel n'est envoyé qu'une fois) : moins de requêtes pour le quota par minute. Sans effet avec le mode découpé ou la cascade.",
+        "en": "Several short CVs are evaluated in a single request (the referential is sent once): fewer requests against the per-minute quota. No effect with split mode or cascade.",
+        "es": "Varios CV cortos se evalúan en una misma solicitud (el referencial se envía una vez): menos solicitudes para la cuota por minuto. Sin efecto con el modo dividido o la cascada.",
+    },
+    "pack_summary": {
+        "fr": "🧳 Évalué avec {others} autre(s) CV dans une même requête.",
+        "en": "🧳 Evaluated with {others} other CV(s) in a single request.",
+        "es": "🧳 Evaluado con {others} CV más en una misma solicitud.",
+    },
+    "backend": {"fr": "🔌 Fournisseur du modèle", "en": "🔌 Model provider", "es": "🔌 Proveedor del modelo"},
+    "backends": {
+        "fr": {"groq": "Groq", "openai": "API compatible OpenAI (URL)", "replay": "Rejeu de réponses enregistrées"},
+        "en": {"groq": "Groq", "openai": "OpenAI-compatible API (URL)", "replay": "Replay recorded responses"},
+        "es": {"groq": "Groq", "openai": "API compatible con OpenAI (URL)", "replay": "Repetición de respuestas grabadas"},
+    },
+    "rate_limits": {"fr": "🚦 Quotas par minute", "en": "🚦 Per-minute limits", "es": "🚦 Cuotas por minuto"},
+    "rate_limits_help": {
+        "fr": "Vide : quotas réels lus dans les réponses du fournisseur, 429 réessayées. « free » : plan gratuit Groq. Sinon modele=requêtes:tokens, séparés par des virgules (* = autres modèles).",
+        "en": "Empty: actual limits read from the provider's responses, 429s retried. “free”: Groq free tier. Otherwise model=requests:tokens, comma-separated (* = other models).",
+        "es": "Vacío: cuotas reales leídas en las respuestas del proveedor, 429 reintentados. «free»: plan gratuito de Groq. Si no, modelo=solicitudes:tokens, separados por comas (* = otros modelos).",
+    },
+    "base_url": {"fr": "URL de base (…/v1)", "en": "Base URL (…/v1)", "es": "URL base (…/v1)"},
+    "model_name": {"fr": "🤖 Nom du modèle", "en": "🤖 Model name", "es": "🤖 Nombre del modelo"},
+    "cassette": {"fr": "Fichier de réponses (JSONL)", "en": "Responses file (JSONL)", "es": "Archivo de respuestas (JSONL)"},
+    "record": {"fr": "🎙️ Enregistrer les réponses", "en": "🎙️ Record responses", "es": "🎙️ Grabar las respuestas"},
+    "record_help": {
+        "fr": "Chaque réponse du modèle est ajoutée au fichier de réponses, pour être rejouée ensuite sans appel réel (démos, tests de charge).",
+        "en": "Each model response is appended to the responses file so it can be replayed later without real calls (demos, load tests).",
+        "es": "Cada respuesta del modelo se añade al archivo de respuestas para repetirla después sin llamadas reales (demos, pruebas de carga).",
+    },
+    "diagnostics": {"fr": "🩺 Diagnostic", "en": "🩺 Diagnostics", "es": "🩺 Diagnóstico"},
+    "diag_scopes": {
+        "fr": {"run": "Analyse affichée", "process": "Depuis le démarrage"},
+        "en": {"run": "Displayed run", "process": "Since startup"},
+        "es": {"run": "Análisis mostrado", "process": "Desde el inicio"},
+    },
+    "diag_help": {
+        "fr": "Durées par étape et compteurs. « llm » inclut l'attente de quota (« rate_limit_wait »). Fichiers écrits après chaque analyse :",
+        "en": "Per-stage timings and counters. “llm” includes quota waiting (“rate_limit_wait”). Files written after each run:",
+        "es": "Duraciones por etapa y contadores. « llm » incluye la espera de cuota (« rate_limit_wait »). Archivos escritos tras cada análisis:",
+    },
+    "diag_tokens": {"fr": "Tokens envoyés / reçus", "en": "Tokens in / out", "es": "Tokens enviados / recibidos"},
+    "diag_requests": {"fr": "Appels IA (réessais)", "en": "AI calls (retries)", "es": "Llamadas IA (reintentos)"},
+    "diag_failures": {"fr": "Erreurs / JSON invalides", "en": "Errors / invalid JSON", "es": "Errores / JSON inválidos"},
+    "diag_cache": {"fr": "Cache résultats / texte (hits)", "en": "Result / text cache (hits)", "es": "Caché resultados / texto (aciertos)"},
+    "diag_empty": {"fr": "Aucune mesure pour l'instant.", "en": "No measurement yet.", "es": "Ninguna medida por ahora."},
 }
 
 def tr(key, lang):
     return T.get(key, {}).get(lang, T.get(key, {}).get("en", key))
 
 # ===================== Helpers =====================
-def strip_accents(s):
-    return "".join(c for c in unicodedata.normalize("NFD", s or "") if unicodedata.category(c) != "Mn")
-
-def normalize_status(raw):
-    if not raw:
-        return "CHALLENGE"
-    s = strip_accents(str(raw)).upper().strip()
-    mapping = {
-        "CONFORME": "OK",
-        "COMPLIANT": "OK",
-        "CUMPLE": "OK",
-        "OK": "OK",
-        "A CHALLENGER": "CHALLENGE",
-        "A REVOIR": "CHALLENGE",
-        "A VERIFIER": "CHALLENGE",
-        "TO REVIEW": "CHALLENGE",
-        "REVIEW": "CHALLENGE",
-        "TO CHALLENGE": "CHALLENGE",
-        "A REVISAR": "CHALLENGE",
-        "POR REVISAR": "CHALLENGE",
-        "NON CONFORME": "KO",
-        "NON-COMPLIANT": "KO",
-        "NON COMPLIANT": "KO",
-        "NOT COMPLIANT": "KO",
-        "NO CUMPLE": "KO",
-        "INCUMPLE": "KO",
-    }
-    return mapping.get(s, "CHALLENGE")
+STATUS_EMOJI = {"OK": "✅", "CHALLENGE": "⚠️", "KO": "❌"}
+MODELS = ["openai/gpt-oss-120b", "llama-3.3-70b-versatile", "meta-llama/llama-4-maverick-17b-128e-instruct", "moonshotai/kimi-k2-instruct-0905"]
+PAGE_SIZES = [10, 25, 50, 100]
 
 def jauge(label, value, lang):
     fig = go.Figure(go.Indicator(
@@ -292,84 +459,234 @@ def jauge(label, value, lang):
     fig.update_layout(height=300)
     st.plotly_chart(fig, use_container_width=True)
 
-def extract_json_strict(text):
-    s = (text or "").strip()
-    a, b = s.find("{"), s.rfind("}")
-    if a == -1 or b == -1 or b <= a:
-        return None
+def comparison_chart(results, selected_ref, ref_hash, policy, lang):
+    """
+    Une seule figure pour tout le lot : carte de chaleur candidats × exigences
+    (crédit obtenu par exigence), au lieu d'une jauge par candidat.
+    """
+    matrix = requirement_matrix([r["details"] for r in results], [r["nom"] for r in results], compile_weights(selected_ref, ref_hash), policy)
+    if matrix.empty or not len(matrix.columns):
+        return
+    labels = [f"{i + 1}. {r['nom']} ({r['score']:.0%})" for i, r in enumerate(results)]
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(), x=list(matrix.columns), y=labels, zmin=0, zmax=1,
+        colorscale=[[0, "#dc3545"], [0.5, "#ffc107"], [1, "#28a745"]],
+        hovertemplate="%{y}<br>%{x}: %{z:.0%}<extra></extra>", colorbar={"tickformat": ".0%"},
+    ))
+    fig.update_layout(height=min(2000, 160 + 22 * len(results)), title=tr("matrix_title", lang), yaxis={"autorange": "reversed"}, margin={"l": 10, "r": 10, "t": 40, "b": 10})
+    st.plotly_chart(fig, use_container_width=True)
+
+def render_candidate(result, selected_ref, ref_hash, lang, include_text=False):
+    """
+    Détail d'un seul candidat (rendu uniquement quand il est ouvert).
+    """
+    st.subheader(f"{tr('detail_title', lang)} {result['nom']}")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        jauge(tr("gauge", lang), result["score"], lang)
+    with col2:
+        st.markdown(tr("synth", lang))
+        st.info(result["synthese"])
+        if result.get("truncated"):
+            st.warning(tr("truncated", lang))
+        if result.get("extraction_partial"):
+            st.warning(tr("extraction_partial", lang))
+        if result.get("failed_requirements"):
+            st.warning(tr("failed_requirements", lang).format(ids=", ".join(map(str, result["failed_requirements"]))))
+        if result.get("prescreen_rejected"):
+            st.warning(tr("prescreen_rejected", lang))
+        if result.get("cascade"):
+            st.caption(tr("cascade_summary", lang).format(**result["cascade"]))
+        if result.get("pack") and not result["pack"].get("fallback"):
+            st.caption(tr("pack_summary", lang).format(others=result["pack"]["size"] - 1))
+
+    # Détails par exigence : un seul tableau au lieu d'un bloc par ligne
+    st.dataframe(pd.DataFrame([{
+        "": STATUS_EMOJI.get(normalize_status(d.get("statut")), "❓"),
+        tr("requirement", lang): d.get("exigence_titre", ""),
+        tr("justif", lang): d.get("justification", ""),
+        tr("elements_cv", lang): d.get("elements_cv", ""),
+        tr("confidence", lang): float(d.get("confiance", 0) or 0),
+    } for d in result["details"]]), use_container_width=True, hide_index=True, column_config={
+        tr("confidence", lang): st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format="%.2f"),
+    })
+
+    with st.expander(tr("explain_more", lang), expanded=False):
+        # Ce que nous avons cherché + détection naïve dans le CV
+        if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict):
+            st.markdown(f"**{tr('what_we_checked', lang)}**")
+            st.dataframe(pd.DataFrame([
+                {"ID": req_id, tr("requirement", lang): title, tr("found_in_cv", lang): ", ".join(presence) if presence else "—"}
+                for req_id, title, presence in keyword_index(selected_ref, ref_hash).presence(result.get("cv_text", ""))
+            ]), use_container_width=True, hide_index=True)
+
+        # Détails de scoring
+        st.markdown(f"**{tr('scoring_details', lang)}**")
+        st.write({
+            tr("ok_count", lang): result["conformes"],
+            tr("challenge_count", lang): result["challengers"],
+            tr("ko_count", lang): result["non_conformes"],
+            tr("score_global", lang): f"{result['score']:.0%}",
+            tr("tokens_saved", lang): result.get("compaction", {}).get("tokens_saved", 0),
+            **({tr("retrieval_tokens", lang): f"{result['retrieval']['tokens_after']} / {result['retrieval']['tokens_before']}"} if result.get("retrieval") else {}),
+        })
+
+        # Faits du pré-filtrage local
+        if result.get("prescreen") and result["prescreen"]["verdicts"]:
+            st.markdown(f"**{tr('prescreen', lang)}**")
+            st.dataframe(pd.DataFrame(result["prescreen"]["verdicts"]), use_container_width=True)
+
+        # Top manques
+        st.markdown(f"**{tr('top_missing', lang)}**")
+        missing = [d for d in result["details"] if normalize_status(d.get("statut")) == "KO"]
+        for m in missing[:5]:
+            st.write(f"• {m.get('exigence_titre','')}")
+
+        # Export JSON détaillé
+        st.download_button(
+            tr("download_json", lang), data=lambda: json.dumps(export_record(result, include_text), ensure_ascii=False, indent=2),
+            file_name=f"detailed_{result['nom']}.json", mime="application/json", on_click="ignore",
+        )
+
+def run_label(meta):
+    return f"{meta['created_at'].replace('T', ' ')} · {meta.get('referential', '')} · {meta['candidates']} CV · {meta.get('model', '')}"
+
+def open_run(run):
+    # Run courant : conservé en session et repris dans l'URL (rechargement de la page)
+    if run is None:
+        return
+    st.session_state["run"] = run
+    st.query_params["run"] = run["meta"]["id"]
+
+def run_referential(meta, referentials, fallback):
+    """
+    Référentiel dans la version exacte utilisée par le run : version courante si
+    l'empreinte correspond, sinon version archivée, à défaut la version courante
+    (l'appelant compare alors referential_hash() du résultat à celle du run).
+    """
+    current = referentials.get(meta.get("referential"))
+    if current is not None and referential_hash(current) == meta.get("ref_hash"):
+        return current
     try:
-        return json.loads(s[a:b+1])
-    except Exception:
-        pass
-    stack, start = 0, None
-    for i, ch in enumerate(s):
-        if ch == "{":
-            if stack == 0:
-                start = i
-            stack += 1
-        elif ch == "}":
-            stack -= 1
-            if stack == 0 and start is not None:
-                try:
-                    return json.loads(s[start:i+1])
-                except Exception:
-                    continue
-    return None
-
-def validate_analysis(obj):
-    if not isinstance(obj, dict):
-        return False, "root-not-dict"
-    if "analysis" not in obj or not isinstance(obj["analysis"], list):
-        return False, "no-analysis"
-    ok_items = []
-    for it in obj["analysis"]:
-        if not isinstance(it, dict):
+        return get_store().load_version(meta["referential"], meta["ref_hash"])
+    except (OSError, ValueError, KeyError):
+        return current if current is not None else fallback
+
+def render_results(results, selected_ref, ref_hash, policy, lang):
+    """
+    Tableau comparatif (grille virtualisée), figure de comparaison unique, liste
+    paginée des candidats et détail du seul candidat ouvert : le volume rendu dépend
+    de la page affichée, pas de la taille du lot.
+    """
+    # Scores recalculés d'un bloc (vectorisé) selon la pondération choisie, sans appel LLM
+    apply_scores(results, selected_ref, policy, ref_hash)
+    st.subheader(tr("compare", lang))
+    comparison_df = pd.DataFrame([{
+        tr("candidate", lang): r["nom"],
+        tr("score_global", lang): f"{r['score']:.0%}",
+        tr("ok_count", lang): r["conformes"],
+        tr("challenge_count", lang): r["challengers"],
+        tr("ko_count", lang): r["non_conformes"],
+        tr("critical_ko", lang): r.get("critiques_ko", 0)
+    } for r in results])
+    st.dataframe(comparison_df, use_container_width=True)
+    comparison_chart(results, selected_ref, ref_hash, policy, lang)
+
+    # Exports : générés seulement au clic (fonction passée au bouton), par morceaux
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        fmt = st.selectbox(tr("export_format", lang), available_formats(), format_func=lambda f: EXPORT_FORMATS[f]["label"])
+    with col2:
+        include_text = st.checkbox(tr("include_text", lang), value=False)
+    with col3:
+        st.download_button(
+            label=tr("export", lang), data=lambda: export_bytes(results, fmt, include_text),
+            file_name=f"analyse_cv_gfsi_{datetime.now().strftime('%Y%m%d_%H%M')}.{EXPORT_FORMATS[fmt]['ext']}",
+            mime=EXPORT_FORMATS[fmt]["mime"], on_click="ignore",
+        )
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        per_page = st.selectbox(tr("per_page", lang), PAGE_SIZES, index=1)
+        n_pages = max(1, -(-len(results) // per_page))
+        page = st.number_input(tr("page", lang), min_value=1, max_value=n_pages, value=1, step=1) if n_pages > 1 else 1
+    first = (page - 1) * per_page
+    with col2:
+        opened = st.radio(
+            tr("open_candidate", lang), [None] + list(range(first, min(first + per_page, len(results)))),
+            format_func=lambda i: "—" if i is None else f"{i + 1}. {results[i]['nom']} — {results[i]['score']:.0%}",
+        )
+    if opened is not None:
+        render_candidate(results[opened], selected_ref, ref_hash, lang, include_text)
+
+def cache_hits(snapshot, cache):
+    return sum(c["value"] for c in snapshot["counters"] if c["name"] == "cache_hits" and c["labels"].get("cache") == cache)
+
+def render_diagnostics(run, lang):
+    """
+    Panneau de diagnostic : coût de l'analyse affichée (écart entre deux instantanés)
+    ou cumul du processus (toutes sessions confondues).
+    """
+    scopes = tr("diag_scopes", lang)
+    available = [s for s in scopes if s != "run" or (run and run["meta"].get("metrics"))]
+    scope = st.radio(tr("diagnostics", lang), available, format_func=lambda s: scopes[s], horizontal=True, label_visibility="collapsed")
+    snapshot = run["meta"]["metrics"] if scope == "run" else METRICS.snapshot()
+    if not snapshot["counters"] and not snapshot["timers"]:
+        st.caption(tr("diag_empty", lang))
+        return
+    st.metric(tr("diag_tokens", lang), f"{totals(snapshot, 'tokens_in'):,} / {totals(snapshot, 'tokens_out'):,}")
+    st.metric(tr("diag_requests", lang), f"{totals(snapshot, 'llm_requests')} ({totals(snapshot, 'llm_retries')})")
+    st.metric(tr("diag_failures", lang), f"{totals(snapshot, 'llm_errors')} / {totals(snapshot, 'parse_failures')}")
+    st.metric(tr("diag_cache", lang), f"{cache_hits(snapshot, 'result')} / {cache_hits(snapshot, 'text')}")
+    rows = stage_rows(snapshot)
+    if rows:
+        st.dataframe(pd.DataFrame(rows)[["stage", "count", "total_s", "mean_ms", "max_ms"]].round(3), hide_index=True, use_container_width=True)
+    st.caption(f"{tr('diag_help', lang)} `{METRICS_FILE}`, `{PROMETHEUS_FILE}`")
+
+def analyse_live(run_batch):
+    """
+    Exécute run_batch(on_item) dans un thread et affiche, depuis le thread du script,
+    chaque verdict par exigence dès sa réception (les threads d'analyse n'appellent pas st.*).
+    Une ligne par exigence : un verdict reçu à nouveau (réessai, repli de la cascade) remplace le précédent.
+    """
+    events, out, errors = queue.Queue(), [], []
+
+    def target():
+        try:
+            out.extend(run_batch(lambda name, item: events.put((name, item))))
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    boxes, lines = {}, {}
+    while worker.is_alive() or not events.empty():
+        try:
+            name, item = events.get(timeout=0.1)
+        except queue.Empty:
             continue
-        need = ["exigence_id", "exigence_titre", "statut", "justification", "confiance", "ponderation", "niveau_requis"]
-        if not all(k in it for k in need):
-            continue
-        it["statut"] = normalize_status(it.get("statut"))
-        if "category_id" not in it:
-            it["category_id"] = ""
-        ok_items.append(it)
-    obj["analysis"] = ok_items
-    if "score_global" not in obj:
-        obj["score_global"] = 0
-    if "synthese" not in obj:
-        obj["synthese"] = ""
-    return True, obj
-
-@st.cache_data
-def pdf_to_text(file_bytes: bytes):
-    reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
-    return " ".join([(page.extract_text() or "") for page in reader.pages])
-
-def file_digest(uploaded_file):
+        if name not in boxes:
+            boxes[name] = st.expander(f"⏳ {name}", expanded=True)
+        line = (name, str(item.get("exigence_id", "")))
+        if line not in lines:
+            lines[line] = boxes[name].empty()
+        emoji = STATUS_EMOJI.get(normalize_status(item.get("statut")), "❓")
+        lines[line].write(f"{emoji} **{item.get('exigence_id','')}** – {item.get('exigence_titre','')}")
+    worker.join()
+    if errors:
+        raise errors[0]
+    return out
+
+def file_bytes(uploaded_file):
     uploaded_file.seek(0)
     data = uploaded_file.read()
     uploaded_file.seek(0)
-    return hashlib.sha256(data).hexdigest(), data
-
-def validate_referential_structure(data: dict):
-    if not isinstance(data, dict):
-        return False, "root must be object"
-    if "exigences" not in data and "categories" not in data:
-        return False, "missing 'exigences' or 'categories'"
-    if "exigences" in data and not isinstance(data["exigences"], dict):
-        return False, "'exigences' must be object"
-    if "categories" in data and not isinstance(data["categories"], dict):
-        return False, "'categories' must be object"
-    return True, "OK"
+    return data
 
 def save_referential_to_json(referential_data: dict, filename: str) -> bool:
+    # Écriture atomique + archivage de la version (empreinte du contenu)
     try:
-        ref_dir = Path("referentiels")
-        ref_dir.mkdir(exist_ok=True)
-        safe = filename.strip().replace(" ", "_").replace("/", "_")
-        if not safe.endswith(".json"):
-            safe += ".json"
-        with open(ref_dir / safe, "w", encoding="utf-8") as f:
-            json.dump(referential_data, f, ensure_ascii=False, indent=2)
+        get_store().save(referential_data, filename)
         return True
     except Exception as e:
         st.error(f"Save error: {e}")
@@ -380,77 +697,6 @@ def is_admin_authenticated(password: str) -> bool:
     expected = st.secrets.get("ADMIN_PASSWORD", os.environ.get("ADMIN_PASSWORD", ""))
     return bool(expected) and password == expected
 
-def build_prompt(selected_ref, cv_text, lang):
-    if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict) and selected_ref["exigences"]:
-        lines = []
-        for req_id, req in selected_ref["exigences"].items():
-            lines.append(
-                f"REQUIREMENT {req_id}: {req.get('title','')}\n"
-                f"Description: {req.get('description','')}\n"
-                f"Level: {req.get('niveau_requis','')}\n"
-                f"Weight: {req.get('ponderation',1.0)}\n"
-                "Criteria:\n" + "\n".join(["• "+c for c in req.get("criteres", [])])
-            )
-            lines.append("Conform examples:\n" + "\n".join(["• "+e for e in req.get("exemples_conformes", [])]))
-            lines.append("Non-conform examples:\n" + "\n".join(["• "+e for e in req.get("exemples_non_conformes", [])]) + "\n---")
-        exigences_detail = "\n".join(lines)
-    else:
-        lines = []
-        for cat, cat_data in selected_ref.get("categories", {}).items():
-            lines.append(f"== CATEGORY {cat} (weight {cat_data.get('weight',0)}) ==")
-            lines.append(cat_data.get("description",""))
-            for sub, sub_data in cat_data.get("subcategories", {}).items():
-                lines.append(f"-- Subcategory {sub} (weight {sub_data.get('weight',0)}) --")
-                for req in sub_data.get("requirements", []):
-                    lines.append(
-                        f"REQUIREMENT {req.get('id','N/A')}\n"
-                        f"Text: {req.get('text','')}\n"
-                        f"Minimum acceptable: {req.get('minimum_acceptable','')}\n"
-                        f"References: {', '.join(req.get('references', []))}\n---"
-                    )
-        exigences_detail = "\n".join(lines)
-
-    lang_text = {
-        "fr": "Français",
-        "en": "English",
-        "es": "Español",
-    }[lang]
-
-    schema = {
-        "analysis": [{
-            "exigence_id": "ID exact",
-            "exigence_titre": "Title",
-            "category_id": "Category/Subcategory",
-            "statut": "COMPLIANT | TO_REVIEW | NON_COMPLIANT | CONFORME | A CHALLENGER | NON CONFORME | CUMPLE | A REVISAR | NO CUMPLE",
-            "justification": "Evidence and reasoning",
-            "elements_cv": "CV quotes",
-            "confiance": 0.0,
-            "niveau_requis": "obligatoire|recommande|souhaitable|mandatory|recommended|desirable",
-            "ponderation": 1.0
-        }],
-        "score_global": 0.0,
-        "synthese": "Summary and recommendations"
-    }
-
-    return f"""
-You are a senior GFSI conformity expert.
-Respond ONLY with STRICTLY VALID JSON using EXACTLY the following keys/schema (keys in English). All texts (justification, synthese) must be written in {lang_text}.
-Schema:
-{json.dumps(schema, ensure_ascii=False, indent=2)}
-
-REFERENTIAL:
-{exigences_detail}
-
-CANDIDATE CV:
-{cv_text}
-
-Method:
-1) Match CV evidence against each requirement criteria and examples
-2) Decide status: COMPLIANT / TO_REVIEW / NON_COMPLIANT
-3) Provide precise justification with CV evidence quotes
-4) Provide confidence 0..1
-"""
-
 # ===================== Streamlit UI =====================
 st.set_page_config(page_title="GFSI CV", layout="wide")
 
@@ -464,36 +710,38 @@ st.title(tr("app_title", lang))
 
 with st.sidebar:
     st.header(tr("config", lang))
-    api_key = st.text_input(tr("api_key", lang), type="password", help="Get a key at console.groq.com")
+    backend = st.selectbox(tr("backend", lang), BACKENDS, index=BACKENDS.index(DEFAULT_BACKEND) if DEFAULT_BACKEND in BACKENDS else 0,
+                           format_func=lambda b: tr("backends", lang)[b], key="backend")
+    api_key = st.text_input(tr("api_key", lang), type="password", key="api_key", help="Get a key at console.groq.com") if backend != "replay" else ""
+    base_url = st.text_input(tr("base_url", lang), value=DEFAULT_BASE_URL, key="base_url") if backend == "openai" else None
+    record = st.checkbox(tr("record", lang), key="record", help=tr("record_help", lang)) if backend != "replay" else False
+    cassette = st.text_input(tr("cassette", lang), value=DEFAULT_CASSETTE, key="cassette") if backend == "replay" or record else None
+    rate_limits = st.text_input(tr("rate_limits", lang), value=RATE_LIMITS, key="rate_limits", help=tr("rate_limits_help", lang)) if backend != "replay" else ""
+    try:
+        parse_limits(rate_limits)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        st.stop()
     st.divider()
     st.subheader(tr("admin", lang))
-    admin_pass = st.text_input(tr("admin_pwd", lang), type="password", help="Defined in st.secrets['ADMIN_PASSWORD'] or env var ADMIN_PASSWORD")
+    admin_pass = st.text_input(tr("admin_pwd", lang), type="password", key="admin_pwd", help="Defined in st.secrets['ADMIN_PASSWORD'] or env var ADMIN_PASSWORD")
     admin_ok = is_admin_authenticated(admin_pass)
     if admin_ok:
         st.success(tr("admin_ok", lang))
     else:
         st.caption(tr("admin_hint", lang))
-    if not api_key:
+    if backend == "groq" and not api_key:
         st.warning(tr("need_api", lang))
         st.stop()
-    client = groq.Client(api_key=api_key)
-
-    @st.cache_data
-    def load_referentials():
-        out = {}
-        ref_dir = Path("referentiels")
-        if ref_dir.exists():
-            for file in ref_dir.glob("*.json"):
-                try:
-                    with open(file, encoding="utf-8") as f:
-                        data = json.load(f)
-                    if "exigences" in data or "categories" in data:
-                        out[file.stem] = data
-                except Exception as e:
-                    st.error(f"❌ {e}")
-        return out
-
-    referentials = load_referentials()
+    # Client partagé entre sessions et reruns (pool de connexions HTTP, délais explicites)
+    client = get_client(backend, api_key, base_url, record=cassette if record else None, cassette=cassette if backend == "replay" else None,
+                        rate_limits=rate_limits)
+
+    # Registre partagé par toutes les sessions : aucune copie, relecture des seuls fichiers modifiés
+    registry = get_registry()
+    referentials = registry.snapshot()
+    for message in registry.error_messages():
+        st.error(f"❌ {message}")
     if not referentials:
         st.error(tr("no_refs", lang))
         st.stop()
@@ -507,136 +755,99 @@ with st.sidebar:
         st.info(meta_line)
         st.caption(f"{tr('meta_version', lang)}: {md.get('version','N/A')} | {tr('meta_date', lang)}: {md.get('date_creation', md.get('last_updated','N/A'))}")
 
-    model = st.selectbox(tr("model", lang), ["openai/gpt-oss-120b", "llama-3.3-70b-versatile", "meta-llama/llama-4-maverick-17b-128e-instruct", "moonshotai/kimi-k2-instruct-0905"])
+    if backend == "openai":
+        model = st.text_input(tr("model_name", lang), value=os.environ.get("LLM_MODEL", "openai/gpt-oss-120b"), key="model_name")
+    else:
+        model = st.selectbox(tr("model", lang), MODELS)
+    max_workers = st.slider(tr("parallel", lang), min_value=1, max_value=16, value=4)
+    chunked = st.checkbox(tr("chunked", lang), value=False, help=tr("chunked_help", lang))
+    stream = st.checkbox(tr("stream", lang), value=False, help=tr("stream_help", lang))
+    retrieval = st.checkbox(tr("retrieval", lang), value=False, help=tr("retrieval_help", lang))
+    cascade = st.checkbox(tr("cascade", lang), value=False, help=tr("cascade_help", lang))
+    fast_model, escalate_below = DEFAULT_OPTIONS["fast_model"], DEFAULT_OPTIONS["escalate_below"]
+    if cascade and backend == "openai":
+        fast_model = st.text_input(tr("fast_model", lang), value=fast_model, key="fast_model")
+    elif cascade:
+        fast_model = st.selectbox(tr("fast_model", lang), [fast_model] + [m for m in MODELS if m != fast_model], key="fast_model")
+    if cascade:
+        escalate_below = st.slider(tr("escalate_below", lang), 0.0, 1.0, escalate_below, 0.05)
+    pack = st.checkbox(tr("pack", lang), value=False, help=tr("pack_help", lang))
+    prescreen_modes = tr("prescreen_modes", lang)
+    prescreen_mode = st.selectbox(tr("prescreen", lang), list(prescreen_modes), format_func=lambda m: prescreen_modes[m], help=tr("prescreen_help", lang)) or None
+    with st.expander(tr("weighting", lang)):
+        policy = {
+            "hierarchy": st.checkbox(tr("use_hierarchy", lang), value=DEFAULT_POLICY["hierarchy"]),
+            "challenge_factor": st.slider(tr("challenge_factor", lang), 0.0, 1.0, DEFAULT_POLICY["challenge_factor"], 0.05),
+            "use_confidence": st.checkbox(tr("use_confidence", lang), value=DEFAULT_POLICY["use_confidence"]),
+        }
+
+    # Analyses précédentes : ré-ouverture instantanée, sans appel LLM
+    # Runs cloisonnés : ceux de la clé API (à défaut de la session), tous en mode admin
+    run_store = get_run_store()
+    owner = run_owner(api_key, st.session_state.setdefault("session_id", secrets.token_hex(16)))
+    if "run" not in st.session_state and st.query_params.get("run"):
+        st.session_state["run"] = run_store.load(st.query_params["run"], owner, admin_ok)
+    with st.expander(tr("runs", lang)):
+        keep_text = st.checkbox(tr("keep_cv_text", lang), value=False, help=tr("keep_cv_text_help", lang))
+        past_runs = run_store.list_runs(owner, admin_ok)
+        if past_runs:
+            past = st.selectbox(tr("runs", lang), past_runs, format_func=run_label, label_visibility="collapsed")
+            if st.button(tr("open_run", lang)):
+                open_run(run_store.load(past["id"], owner, admin_ok))
+        else:
+            st.caption(tr("no_runs", lang))
 
 # ===================== Main: Upload & Analyse =====================
 uploaded_files = st.file_uploader(tr("uploader", lang), type=["pdf"], accept_multiple_files=True)
 
 if uploaded_files and st.button(tr("run", lang)):
-    results_all, details_export = [], []
+    results_all = []
+    before = METRICS.snapshot()
     with st.spinner(tr("analyzing", lang)):
-        for up in uploaded_files:
-            try:
-                digest, data = file_digest(up)
-                cv_text = pdf_to_text(data)
-                prompt = build_prompt(selected_ref, cv_text, lang)
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.1,
-                    max_tokens=4000
-                )
-                raw = response.choices[0].message.content or ""
-                parsed = extract_json_strict(raw)
-                if not parsed:
-                    st.error(f"{tr('invalid_json', lang)} {up.name}")
-                    continue
-                ok, res = validate_analysis(parsed)
-                if not ok:
-                    st.error(f"{tr('invalid_json', lang)} {up.name}")
-                    continue
-                analysis = res["analysis"]
-                for a in analysis:
-                    a["cv"] = up.name
-                    details_export.append(a)
-                score_pondere, poids_total = 0.0, 0.0
-                ok_c = ch_c = ko_c = 0
-                for item in analysis:
-                    statut = item.get("statut", "")
-                    norm = normalize_status(statut)
-                    ponderation = float(item.get("ponderation", 1.0) or 1.0)
-                    confiance = float(item.get("confiance", 0) or 0)
-                    if norm == "OK":
-                        ok_c += 1
-                        score_pondere += confiance * ponderation
-                    elif norm == "CHALLENGE":
-                        ch_c += 1
-                        score_pondere += (confiance * 0.5) * ponderation
-                    else:
-                        ko_c += 1
-                    poids_total += ponderation
-                score_final = (score_pondere / poids_total) if poids_total > 0 else 0.0
-                results_all.append({
-                    "nom": up.name,
-                    "conformes": ok_c,
-                    "challengers": ch_c,
-                    "non_conformes": ko_c,
-                    "score": round(score_final, 2),
-                    "score_global": res.get("score_global", score_final),
-                    "details": analysis,
-                    "synthese": res.get("synthese", ""),
-                    "cv_text": cv_text
-                })
-            except Exception as e:
-                st.error(f"❌ {up.name} : {e}")
+        ref_hash = referential_hash(selected_ref)
+        options = {"chunked": chunked, "policy": policy, "prescreen": prescreen_mode, "retrieval": retrieval, "cascade": cascade, "fast_model": fast_model, "escalate_below": escalate_below, "pack": pack}
+        files = [(up.name, file_bytes(up)) for up in uploaded_files]
+        # Même chaîne que le CLI (cache, extraction, appels groupés ou non, mise en cache) : l'UI ne fait qu'afficher
+        if stream:
+            analysed = analyse_live(lambda on_item: screen_batch(client, model, selected_ref, lang, files, max_workers, ref_hash=ref_hash, options=dict(options, on_item=on_item)))
+        else:
+            analysed = screen_batch(client, model, selected_ref, lang, files, max_workers, ref_hash=ref_hash, options=options)
+        for name, result, err in analysed:
+            if err is not None:
+                st.error(f"❌ {name} : {err}")
+            elif result is None:
+                st.error(f"{tr('invalid_json', lang)} {name}")
+            else:
+                results_all.append(result)
 
+    # Coût du lot (durées, tokens, réessais, caches) conservé avec le run et exporté
+    run_metrics = diff(METRICS.snapshot(), before)
+    try:
+        write_default_files()
+    except OSError:
+        pass
     if results_all:
-        st.subheader(tr("compare", lang))
-        comparison_df = pd.DataFrame([{
-            tr("candidate", lang): r["nom"],
-            tr("score_global", lang): f"{r['score']:.0%}",
-            tr("ok_count", lang): r["conformes"],
-            tr("challenge_count", lang): r["challengers"],
-            tr("ko_count", lang): r["non_conformes"]
-        } for r in results_all])
-        st.dataframe(comparison_df, use_container_width=True)
-
-        for result in results_all:
-            st.subheader(f"{tr('detail_title', lang)} {result['nom']}")
-            col1, col2 = st.columns([1, 2])
-            with col1:
-                jauge(tr("gauge", lang), result["score"], lang)
-            with col2:
-                st.markdown(tr("synth", lang))
-                st.info(result["synthese"])
-
-            # === Explications détaillées ===
-            with st.expander(tr("explain_more", lang), expanded=False):
-                df = pd.DataFrame(result["details"])
-                status_emoji = {"OK": "✅", "CHALLENGE": "⚠️", "KO": "❌"}
-
-                # Ce que nous avons cherché + détection naïve dans le CV
-                st.markdown(f"**{tr('what_we_checked', lang)}**")
-                if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict):
-                    for req_id, req in selected_ref["exigences"].items():
-                        keywords = [w for w in re.findall(r"[A-Za-zÀ-ÿ]{4,}", " ".join(req.get("criteres", [])))][:10]
-                        presence = [k for k in keywords if strip_accents(k).lower() in strip_accents(result["cv_text"]).lower()]
-                        st.write(f"• {req_id} – {req.get('title','')}")
-                        st.caption(f"{tr('found_in_cv', lang)}: {', '.join(presence) if presence else '—'}")
-
-                # Détails par exigence
-                for _, row in df.iterrows():
-                    norm = normalize_status(row.get("statut"))
-                    emoji = status_emoji.get(norm, "❓")
-                    st.write(f"{emoji} **{row.get('exigence_titre','')}**")
-                    st.write(f"{tr('justif', lang)} {row.get('justification','')}")
-                    if row.get('elements_cv'):
-                        st.write(f"{tr('elements_cv', lang)} {row.get('elements_cv')}")
-                    st.write(f"{tr('confidence', lang)} {float(row.get('confiance',0)):.0%}")
-                    st.divider()
-
-                # Détails de scoring
-                st.markdown(f"**{tr('scoring_details', lang)}**")
-                st.write({
-                    tr("ok_count", lang): result["conformes"],
-                    tr("challenge_count", lang): result["challengers"],
-                    tr("ko_count", lang): result["non_conformes"],
-                    tr("score_global", lang): f"{result['score']:.0%}"
-                })
-
-                # Top manques
-                st.markdown(f"**{tr('top_missing', lang)}**")
-                missing = [d for d in result["details"] if normalize_status(d.get("statut")) == "KO"]
-                for m in missing[:5]:
-                    st.write(f"• {m.get('exigence_titre','')}")
-
-                # Export JSON détaillé
-                detailed_json = json.dumps(result, ensure_ascii=False, indent=2)
-                st.download_button(tr("download_json", lang), data=detailed_json.encode("utf-8"), file_name=f"detailed_{result['nom']}.json", mime="application/json")
-
-        export_df = pd.DataFrame([d for d in details_export])
-        csv = export_df.to_csv(index=False, encoding="utf-8")
-        st.download_button(label=tr("export", lang), data=csv, file_name=f"analyse_cv_gfsi_{datetime.now().strftime('%Y%m%d_%H%M')}.csv", mime="text/csv")
+        # Run enregistré (session + disque) : les reruns ré-affichent les résultats sans appel LLM
+        meta = run_store.save(
+            results_all, owner=owner, keep_text=keep_text, referential=ref_name, ref_hash=ref_hash, model=model, lang=lang,
+            options={"chunked": chunked, "prescreen": prescreen_mode, "retrieval": retrieval, "cascade": cascade, "pack": pack}, metrics=run_metrics,
+        )
+        open_run({"meta": meta, "results": results_all})
+
+if st.session_state.get("run"):
+    run = st.session_state["run"]
+    st.caption(f"{tr('current_run', lang)} {run_label(run['meta'])}")
+    with METRICS.timer("render"):
+        # Empreinte du référentiel réellement affiché : les caches par empreinte (poids, mots-clés) restent cohérents
+        shown_ref = run_referential(run["meta"], referentials, selected_ref)
+        shown_hash = referential_hash(shown_ref)
+        if shown_hash != run["meta"]["ref_hash"]:
+            st.warning(tr("run_version_missing", lang))
+        render_results(run["results"], shown_ref, shown_hash, policy, lang)
+
+# Panneau rempli en fin de script, pour inclure l'analyse et le rendu qui viennent d'avoir lieu
+with st.sidebar.expander(tr("diagnostics", lang)):
+    render_diagnostics(st.session_state.get("run"), lang)
 
 # ===================== Admin: CRUD Référentiels =====================
 st.divider()
@@ -669,15 +880,7 @@ Date: {datetime.now().date()}
 Text:
 {exigences_text}
 """
-                    response = client.chat.completions.create(
-                        messages=[
-                            {"role": "system", "content": "You are an expert in structuring compliance referentials."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        model="llama-3.1-8b-instant",
-                        max_tokens=4000,
-                        temperature=0.1
-                    )
+                    response = chat(client, "llama-3.1-8b-instant", prompt, 4000, system="You are an expert in structuring compliance referentials.")
                     content = response.choices[0].message.content or ""
                     m = re.search(r"```json\s*(\{.*?\})\s*```", content, re.DOTALL)
                     raw_json = m.group(1) if m else content
@@ -699,7 +902,7 @@ Text:
                         if save_referential_to_json(gen, ref_filename):
                             st.success(f"{tr('saved_under', lang)} referentiels/{ref_filename}.json")
                             st.caption(tr("reload_refs", lang))
-                            load_referentials.clear()
+                            registry.refresh(force=True)
                             st.rerun()
 
     # Import JSON
@@ -720,7 +923,7 @@ Text:
                     if st.button(tr("save_import", lang)):
                         if save_referential_to_json(data, filename):
                             st.success(f"{tr('saved_under', lang)} referentiels/{filename}.json")
-                            load_referentials.clear()
+                            registry.refresh(force=True)
                             st.rerun()
             except Exception as e:
                 st.error(f"JSON parse: {e}")
@@ -728,7 +931,7 @@ Text:
     # Éditer existant
     with tab_editer:
         st.subheader(tr("edit_ref", lang))
-        referentials = load_referentials()
+        referentials = registry.snapshot()
         edit_key = st.selectbox(tr("which_ref", lang), list(referentials.keys()))
         current = referentials[edit_key]
         raw = st.text_area(tr("edit_here", lang), value=json.dumps(current, ensure_ascii=False, indent=2), height=400)
@@ -736,7 +939,15 @@ Text:
         with col1:
             new_name = st.text_input(tr("new_name", lang), value=edit_key)
         with col2:
-            keep_backup = st.checkbox(tr("backup", lang), value=True)
+            versions = get_store().versions(edit_key)
+            if versions:
+                version = st.selectbox(tr("history", lang), versions, format_func=lambda v: f"{v['saved_at']} · {v['hash'][:12]}", help=tr("history_help", lang))
+                if st.button(tr("restore", lang)):
+                    get_store().restore(edit_key, version["hash"])
+                    registry.refresh(force=True)
+                    st.rerun()
+            else:
+                st.caption(tr("no_history", lang))
         if st.button(tr("save_changes", lang)):
             try:
                 data = json.loads(raw)
@@ -744,11 +955,9 @@ Text:
                 if not ok:
                     st.error(f"{tr('json_invalid', lang)} {msg}")
                 else:
-                    if keep_backup:
-                        save_referential_to_json(current, f"{edit_key}.bak_{datetime.now().strftime('%Y%m%d_%H%M')}")
                     if save_referential_to_json(data, new_name):
                         st.success(f"{tr('saved_under', lang)} referentiels/{new_name}.json")
-                        load_referentials.clear()
+                        registry.refresh(force=True)
                         st.rerun()
             except Exception as e:
                 st.error(f"JSON: {e}")
@@ -756,11 +965,11 @@ Text:
     # Dupliquer
     with tab_dupliquer:
         st.subheader(tr("dup", lang))
-        referentials = load_referentials()
+        referentials = registry.snapshot()
         src = st.selectbox(tr("source", lang), list(referentials.keys()), key="dup_src")
         target = st.text_input(tr("target", lang), value=f"{src}_copy")
         if st.button(tr("duplicate", lang)):
             if save_referential_to_json(referentials[src], target):
                 st.success(f"{tr('saved_under', lang)} referentiels/{target}.json")
-                load_referentials.clear()
+                registry.refresh(force=True)
                 st.rerun()
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+from cache import make_key
+from scheduler import RATE_LIMITS, ScheduledClient, make_scheduler, shared_scheduler
+
+# Fournisseurs de modèles interchangeables. Tous exposent client.chat.completions.create
+# (interface Groq/OpenAI, réponses avec choices[0].message.content et usage) :
+#   - "groq"   : API Groq (SDK officiel) ;
+#   - "openai" : toute URL compatible OpenAI (/chat/completions), ex. serveur d'inférence local ;
+#   - "replay" : réponses enregistrées (cassette JSONL), sans réseau ni coût.
+# record=<cassette> enregistre les réponses d'un fournisseur réel pour les rejouer.
+# Les clients sont partagés par tout le processus (une connexion HTTP réutilisée par
+# fournisseur, pool borné) et ont des délais d'attente explicites.
+
+BACKENDS = ["groq", "openai", "replay"]
+DEFAULT_BACKEND = os.environ.get("LLM_BACKEND", "groq")
+DEFAULT_BASE_URL = os.environ.get("LLM_BASE_URL", "http://127.0.0.1:8000/v1")
+DEFAULT_CASSETTE = os.environ.get("LLM_CASSETTE", "cassettes/responses.jsonl")
+
+READ_TIMEOUT = 120.0
+
+
+def make_timeout(read=READ_TIMEOUT):
+    # Délais (secondes) : connexion, lecture (entre deux fragments en streaming), écriture, attente du pool
+    return httpx.Timeout(connect=10.0, read=read, write=30.0, pool=60.0)
+
+
+TIMEOUT = make_timeout()
+POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0)
+REPLAY_CHUNK_CHARS = 40
+
+
+class ReplayMissError(LookupError):
+    pass
+
+
+class BackendHTTPError(Exception):
+    """
+    Réponse HTTP en erreur d'un fournisseur compatible OpenAI. status_code et
+    response (en-têtes, dont retry-after) sont lus par l'ordonnanceur pour les réessais.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        super().__init__(f"HTTP {response.status_code}: {response.text[:300]}")
+
+
+def to_namespace(value):
+    # Réponse JSON -> objets à attributs (response.choices[0].message.content, response.usage…)
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [to_namespace(v) for v in value]
+    return value
+
+
+def make_response(content, usage=None, model=""):
+    return to_namespace({
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    })
+
+
+def make_chunk(content, usage=None):
+    return to_namespace({"choices": [{"index": 0, "delta": {"content": content}}], "usage": usage})
+
+
+def request_key(kwargs):
+    """
+    Empreinte d'une requête (modèle, messages, paramètres de génération) : clé de la cassette.
+    """
+    return make_key(kwargs.get("model"), json.dumps(kwargs.get("messages"), ensure_ascii=False, sort_keys=True),
+                    kwargs.get("max_tokens"), kwargs.get("temperature"))
+
+
+def usage_dict(usage):
+    if usage is None:
+        return None
+    fields = ("prompt_tokens", "completion_tokens", "total_tokens")
+    return {f: (usage.get(f) if isinstance(usage, dict) else getattr(usage, f, None)) for f in fields}
+
+
+class RawResponse:
+    """
+    Réponse brute (comme with_raw_response des SDK) : en-têtes HTTP (quotas
+    x-ratelimit-*) et réponse décodée par parse().
+    """
+
+    def __init__(self, headers, parsed):
+        self.headers = headers
+        self.parsed = parsed
+
+    def parse(self):
+        return self.parsed
+
+
+class ChatClient:
+    """
+    Base des clients maison : expose chat.completions.create(**kwargs) et
+    chat.completions.with_raw_response.create(**kwargs) comme les SDK.
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=self.create, with_raw_response=SimpleNamespace(create=self.create_raw)))
+
+    def create(self, stream=False, **kwargs):
+        return self.create_raw(stream=stream, **kwargs).parse()
+
+    def create_raw(self, stream=False, **kwargs):
+        raise NotImplementedError
+
+
+class OpenAICompatibleClient(ChatClient):
+    """
+    Client HTTP minimal pour une API compatible OpenAI (POST {base_url}/chat/completions),
+    réponses complètes ou en streaming SSE. Les erreurs réseau sont converties en
+    TimeoutError / ConnectionError, les statuts HTTP en BackendHTTPError.
+    """
+
+    def __init__(self, base_url, api_key=None, http=None, timeout=TIMEOUT):
+        super().__init__()
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.http = http or httpx.Client(timeout=timeout, limits=POOL_LIMITS)
+
+    def create_raw(self, stream=False, **kwargs):
+        body = dict(kwargs, stream=True) if stream else kwargs
+        if stream:
+            return self._stream(body)
+        try:
+            response = self.http.post(self.url, json=body, headers=self.headers)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+        if response.status_code >= 400:
+            raise BackendHTTPError(response)
+        return RawResponse(response.headers, to_namespace(response.json()))
+
+    def _stream(self, body):
+        # Requête envoyée tout de suite (comme les SDK) : un 429 est levé par create(),
+        # donc réessayé par l'ordonnanceur. OpenAI ne renvoie l'usage que sur demande.
+        request = self.http.build_request("POST", self.url, json=dict(body, stream_options={"include_usage": True}), headers=self.headers)
+        try:
+            response = self.http.send(request, stream=True)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+        if response.status_code >= 400:
+            response.read()
+            response.close()
+            raise BackendHTTPError(response)
+        return RawResponse(response.headers, self._events(response))
+
+    @staticmethod
+    def _events(response):
+        try:
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    return
+                yield to_namespace(json.loads(data))
+        except httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+        finally:
+            response.close()
+
+
+class Cassette:
+    """
+    Réponses enregistrées, une ligne JSON par requête : empreinte de la requête, modèle,
+    contenu, usage et durée d'origine. Le texte des prompts (CV) n'est pas conservé.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.mtime = None
+
+    def load(self):
+        with self.lock:
+            try:
+                mtime = self.path.stat().st_mtime_ns
+            except OSError:
+                return self.entries
+            if mtime != self.mtime:
+                entries = {}
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries[entry["key"]] = entry
+                self.entries, self.mtime = entries, mtime
+            return self.entries
+
+    def get(self, key):
+        return self.load().get(key)
+
+    def append(self, entry):
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class RecordingClient(ChatClient):
+    """
+    Transmet les requêtes au client réel et enregistre chaque réponse réussie
+    (streaming compris) dans la cassette. Les en-têtes du client réel sont conservés.
+    """
+
+    def __init__(self, client, cassette):
+        super().__init__()
+        self.client = client
+        self.cassette = cassette
+
+    def create_raw(self, stream=False, **kwargs):
+        start = time.perf_counter()
+        key = request_key(kwargs)
+        completions = self.client.chat.completions
+        raw = getattr(completions, "with_raw_response", None)
+        if stream:
+            kwargs = dict(kwargs, stream=True)
+        if raw is not None:
+            response = raw.create(**kwargs)
+            headers, result = response.headers, response.parse()
+        else:
+            headers, result = {}, completions.create(**kwargs)
+        if not stream:
+            self._save(key, kwargs, result.choices[0].message.content or "", getattr(result, "usage", None), start)
+            return RawResponse(headers, result)
+        return RawResponse(headers, self._stream(key, kwargs, start, result))
+
+    def _stream(self, key, kwargs, start, chunks):
+        parts, usage = [], None
+        for chunk in chunks:
+            usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+            yield chunk
+        self._save(key, kwargs, "".join(parts), usage, start)
+
+    def _save(self, key, kwargs, content, usage, start):
+        self.cassette.append({
+            "key": key, "model": kwargs.get("model"), "content": content, "usage": usage_dict(usage),
+            "elapsed": round(time.perf_counter() - start, 3), "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+
+
+class ReplayClient(ChatClient):
+    """
+    Rejoue les réponses de la cassette (ReplayMissError si la requête n'y figure pas).
+    speed : 0 = instantané, 1 = durée d'origine (tests de charge réalistes), 0.5 = deux fois plus vite.
+    """
+
+    def __init__(self, cassette, speed=0.0):
+        super().__init__()
+        self.cassette = cassette
+        self.speed = speed
+
+    def create_raw(self, stream=False, **kwargs):
+        return RawResponse({}, self._replay(stream, kwargs))
+
+    def _replay(self, stream, kwargs):
+        entry = self.cassette.get(request_key(kwargs))
+        if entry is None:
+            raise ReplayMissError(f"no recorded response for this request in {self.cassette.path}")
+        if self.speed:
+            time.sleep(entry.get("elapsed", 0) * self.speed)
+        content, usage = entry["content"], to_namespace(entry.get("usage"))
+        if not stream:
+            return make_response(content, usage, entry.get("model", ""))
+        chunks = [content[i:i + REPLAY_CHUNK_CHARS] for i in range(0, len(content), REPLAY_CHUNK_CHARS)] or [""]
+        return iter([make_chunk(text, usage if i == len(chunks) - 1 else None) for i, text in enumerate(chunks)])
+
+
+_HTTP = {}
+_CLIENTS = {}
+_CASSETTES = {}
+_lock = threading.Lock()
+
+
+def pooled_http(name, timeout=TIMEOUT):
+    """
+    Client httpx partagé (pool de connexions keep-alive) pour un fournisseur donné.
+    """
+    key = (name, str(timeout))
+    with _lock:
+        if key not in _HTTP:
+            _HTTP[key] = httpx.Client(timeout=timeout, limits=POOL_LIMITS)
+        return _HTTP[key]
+
+
+def get_cassette(path):
+    key = os.path.abspath(path)
+    with _lock:
+        if key not in _CASSETTES:
+            _CASSETTES[key] = Cassette(path)
+        return _CASSETTES[key]
+
+
+def raw_client(backend, api_key=None, base_url=None, timeout=TIMEOUT, cassette=None, speed=0.0):
+    if backend == "groq":
+        import groq
+        # max_retries=0 : les réessais (retry-after, backoff) sont ceux de l'ordonnanceur
+        return groq.Client(api_key=api_key, base_url=base_url or None, timeout=timeout, max_retries=0,
+                           http_client=pooled_http(f"groq:{base_url or ''}", timeout))
+    if backend == "openai":
+        return OpenAICompatibleClient(base_url or DEFAULT_BASE_URL, api_key, pooled_http(f"openai:{base_url}", timeout), timeout)
+    if backend == "replay":
+        return ReplayClient(get_cassette(cassette or DEFAULT_CASSETTE), speed)
+    raise ValueError(f"unknown LLM backend: {backend}")
+
+
+def build_client(backend=DEFAULT_BACKEND, api_key=None, base_url=None, timeout=TIMEOUT, record=None, cassette=None,
+                 speed=0.0, scheduler=None, max_retries=6, rate_limits=RATE_LIMITS):
+    """
+    Client prêt à l'emploi (non partagé) : fournisseur, enregistrement éventuel
+    (record=chemin de cassette), puis ordonnanceur (quotas rate_limits, voir
+    scheduler.parse_limits, et réessais). En rejeu, pas d'ordonnanceur.
+    """
+    client = raw_client(backend, api_key, base_url, timeout, cassette, speed)
+    if backend == "replay":
+        return client
+    if record:
+        client = RecordingClient(client, get_cassette(record))
+    return ScheduledClient(client, scheduler or make_scheduler(rate_limits, max_retries))
+
+
+def get_client(backend=DEFAULT_BACKEND, api_key=None, base_url=None, record=None, cassette=None, speed=0.0,
+               rate_limits=RATE_LIMITS):
+    """
+    Client partagé par toutes les sessions pour une même configuration : construit une
+    seule fois (et non à chaque rerun Streamlit), connexions HTTP réutilisées.
+    L'ordonnanceur est celui de la clé API (quotas communs à l'organisation).
+    """
+    key = make_key(backend, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest(), base_url, record, cassette,
+                   speed, (rate_limits or "").strip())
+    with _lock:
+        client = _CLIENTS.get(key)
+    if client is None:
+        scheduler = shared_scheduler(api_key, rate_limits) if backend != "replay" else None
+        client = build_client(backend, api_key, base_url, record=record, cassette=cassette, speed=speed, scheduler=scheduler)
+        with _lock:
+            client = _CLIENTS.setdefault(key, client)
+    return client
+
+
+def chat(client, model, prompt, max_tokens=4000, temperature=0.1, system=None, stream=False):
+    """
+    Appel chat.completions.create avec les paramètres habituels du projet
+    (message système facultatif, un seul message utilisateur).
+    """
+    messages = ([{"role": "system", "content": system}] if system else []) + [{"role": "user", "content": prompt}]
+    return client.chat.completions.create(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                                          **({"stream": True} if stream else {}))
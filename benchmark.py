@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import tempfile
+import argparse
+
+# Caches disque isolés (supprimés en fin de benchmark) : un benchmark ne lit ni ne remplit
+# les caches de l'application. À définir avant l'import du pipeline, qui ouvre les caches.
+if "CV_CACHE_DIR" not in os.environ:
+    os.environ["CV_CACHE_DIR"] = tempfile.mkdtemp(prefix="cvscreen-bench-")
+    atexit.register(shutil.rmtree, os.environ["CV_CACHE_DIR"], ignore_errors=True)
+
+from backends import build_client  # noqa: E402
+from extraction import PdfExtractor  # noqa: E402
+from metrics import METRICS, diff, stage_rows, totals  # noqa: E402
+from mock_llm import MockLLMServer, canned_analysis  # noqa: E402
+from pipeline import DEFAULT_OPTIONS, build_prompt, extract_json_strict, iter_ordered, pdf_to_text, screen_batch, screen_pdf, validate_analysis  # noqa: E402
+from registry import get_registry, referential_hash  # noqa: E402
+from scheduler import make_scheduler  # noqa: E402
+from scoring import compile_weights, score_candidates  # noqa: E402
+from synthetic_cv import synthetic_pdf  # noqa: E402
+
+# Benchmarks hors ligne, sans clé API ni CV réels :
+#   python benchmark.py micro -r IFS                  micro-benchmarks des étapes locales
+#   python benchmark.py e2e -r IFS -n 100 -w 8        chaîne complète contre le serveur simulé
+# Résultats : CV/minute, latences p50/p95 (ms) et durées par étape (voir metrics.py).
+
+DEFAULT_MODEL = "openai/gpt-oss-120b"
+
+
+def percentile(values, q):
+    """
+    Percentile par interpolation linéaire (q entre 0 et 100).
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def summarize(durations):
+    # Durées en secondes -> statistiques en millisecondes
+    return {
+        "n": len(durations),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 3) if durations else 0.0,
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "max_ms": round(max(durations) * 1000, 3) if durations else 0.0,
+    }
+
+
+def time_calls(func, iterations, setup=None):
+    """
+    Durée de chaque appel func(*setup()) ; setup n'est pas chronométré.
+    """
+    durations = []
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def micro(selected_ref, iterations=200, pages=2, batch=100):
+    """
+    Micro-benchmarks des étapes locales (sans réseau) : extraction du texte, prompt,
+    parsing et validation de la réponse, scores d'un lot de `batch` candidats.
+    """
+    ref_hash = referential_hash(selected_ref)
+    pdf = synthetic_pdf(0, pages)
+    cv_text = pdf_to_text(pdf)
+    raw = canned_analysis(build_prompt(selected_ref, cv_text, "fr", ref_hash))
+    analysis = validate_analysis(json.loads(raw))[1]["analysis"]
+    weights = compile_weights(selected_ref, ref_hash)
+    analyses = [analysis] * batch
+    return {
+        "pdf_to_text": summarize(time_calls(pdf_to_text, max(1, iterations // 10), lambda: (pdf,))),
+        "build_prompt": summarize(time_calls(lambda: build_prompt(selected_ref, cv_text, "fr", ref_hash), iterations)),
+        "extract_json_strict": summarize(time_calls(lambda: extract_json_strict(raw), iterations)),
+        "validate_analysis": summarize(time_calls(validate_analysis, iterations, lambda: (json.loads(raw),))),
+        f"score_candidates[{batch}]": summarize(time_calls(lambda: score_candidates(analyses, weights), max(1, iterations // 10))),
+    }
+
+
+def end_to_end(selected_ref, count=50, pages=2, workers=4, model=DEFAULT_MODEL, latency=0.5, jitter=0.2,
+               error_rate=0.0, chunked=False, stream=False, real_limits=False, extract_workers=None, seed=0, backend="groq", cascade=False, fast_latency=None,
+               pack=False, pack_size=DEFAULT_OPTIONS["pack_size"]):
+    """
+    Chaîne complète (extraction PDF, prompt, appel LLM, parsing, scores) sur `count`
+    CV synthétiques, contre le serveur simulé. Renvoie débit, latences et étapes.
+    Avec pack, le lot entier passe par screen_batch (requêtes groupées) : pas de
+    latence par CV, seulement le débit et la durée des appels (étape llm).
+    """
+    ref_hash = referential_hash(selected_ref)
+    pdfs = [(f"cv_{i + 1:04d}.pdf", synthetic_pdf(seed + i, pages)) for i in range(count)]
+    options = {"chunked": chunked, "cascade": cascade, "pack": pack, "pack_size": pack_size}
+    if stream:
+        options["on_item"] = lambda name, item: None
+    extractor = PdfExtractor(extract_workers)
+    # Sans quotas par défaut : on mesure le pipeline et non les limites du compte Groq (--real-limits : plan gratuit)
+    scheduler = make_scheduler("free" if real_limits else "")
+    latencies, failures = [], 0
+    fast = {DEFAULT_OPTIONS["fast_model"]: fast_latency} if fast_latency is not None else None
+    with MockLLMServer(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed, model_latency=fast) as server:
+        # Même construction qu'en production (réessais par l'ordonnanceur) ; "openai" mesure le client HTTP maison
+        client = build_client(backend, "mock", server.url if backend == "groq" else f"{server.url}/v1", scheduler=scheduler)
+
+        def run(name, data):
+            start = time.perf_counter()
+            result = screen_pdf(client, model, selected_ref, "fr", name, data, ref_hash, None, extractor, options)
+            return result, time.perf_counter() - start
+
+        before = METRICS.snapshot()
+        start = time.perf_counter()
+        try:
+            if pack:
+                failures = sum(1 for _, result, err in screen_batch(client, model, selected_ref, "fr", pdfs, workers, extractor, ref_hash, options=options)
+                               if err is not None or result is None)
+            else:
+                for _, out, err in iter_ordered(run, pdfs, workers):
+                    if err is not None or out[0] is None:
+                        failures += 1
+                    else:
+                        latencies.append(out[1])
+        finally:
+            extractor.close()
+        wall = time.perf_counter() - start
+        measured = diff(METRICS.snapshot(), before)
+        served = server.stats
+    return {
+        "cvs": count,
+        "failures": failures,
+        "wall_s": round(wall, 3),
+        "cvs_per_min": round((count - failures) / wall * 60, 1) if wall else 0.0,
+        "latency": summarize(latencies),
+        "llm_requests": served["requests"],
+        "llm_errors_injected": served["errors"],
+        "retries": totals(measured, "llm_retries"),
+        "tokens_in": totals(measured, "tokens_in"),
+        "tokens_out": totals(measured, "tokens_out"),
+        "stages": stage_rows(measured),
+    }
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(c)), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(str(r.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne (CV synthétiques, serveur LLM simulé).")
+    parser.add_argument("mode", choices=["micro", "e2e"], help="micro : étapes locales ; e2e : chaîne complète")
+    parser.add_argument("-r", "--referential", default="IFS", help="Nom du référentiel (fichier de referentiels/ sans .json)")
+    parser.add_argument("-p", "--pages", type=int, default=2, help="Pages par CV synthétique")
+    parser.add_argument("-i", "--iterations", type=int, default=200, help="[micro] Répétitions par fonction")
+    parser.add_argument("-n", "--count", type=int, default=50, help="[e2e] Nombre de CV")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="[e2e] Analyses simultanées")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help="[e2e] Nom du modèle (quotas, budget de tokens)")
+    parser.add_argument("--latency", type=float, default=0.5, help="[e2e] Latence moyenne du serveur simulé (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="[e2e] Variation de la latence (secondes)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="[e2e] Proportion de 429 simulés")
+    parser.add_argument("--chunked", action="store_true", help="[e2e] Analyse découpée par groupes d'exigences")
+    parser.add_argument("--cascade", action="store_true", help="[e2e] Cascade modèle rapide -> modèle choisi")
+    parser.add_argument("--fast-latency", type=float, help="[e2e] Latence simulée du modèle rapide de la cascade (secondes)")
+    parser.add_argument("--pack", action="store_true", help="[e2e] Plusieurs CV courts par requête (avec -p 1 : 2 pages dépassent pack_max_cv_tokens)")
+    parser.add_argument("--pack-size", type=int, default=DEFAULT_OPTIONS["pack_size"], help="[e2e] CV au plus par requête groupée")
+    parser.add_argument("--stream", action="store_true", help="[e2e] Réponses en streaming")
+    parser.add_argument("--backend", default="groq", choices=["groq", "openai"], help="[e2e] Client utilisé contre le serveur simulé")
+    parser.add_argument("--real-limits", action="store_true", help="[e2e] Appliquer les quotas du plan gratuit Groq")
+    parser.add_argument("--extract-workers", type=int, default=None, help="[e2e] Processus d'extraction PDF (0 = sans pool)")
+    parser.add_argument("--json", help="Écrire aussi les résultats dans ce fichier JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    referentials = get_registry().snapshot()
+    if args.referential not in referentials:
+        print(f"Référentiel inconnu : {args.referential} (disponibles : {', '.join(referentials)})", file=sys.stderr)
+        return 2
+    selected_ref = referentials[args.referential]
+    if args.mode == "micro":
+        results = micro(selected_ref, args.iterations, args.pages)
+        print_table([dict(stats, function=name) for name, stats in results.items()], ["function", "n", "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+    else:
+        results = end_to_end(selected_ref, args.count, args.pages, args.workers, args.model, args.latency, args.jitter,
+                             args.error_rate, args.chunked, args.stream, args.real_limits, args.extract_workers, backend=args.backend, cascade=args.cascade,
+                             fast_latency=args.fast_latency, pack=args.pack, pack_size=args.pack_size)
+        latency = f", p50 {results['latency']['p50_ms']:.0f} ms, p95 {results['latency']['p95_ms']:.0f} ms" if results["latency"]["n"] else ""
+        print(f"{results['cvs'] - results['failures']}/{results['cvs']} CV en {results['wall_s']} s : {results['cvs_per_min']} CV/min{latency}")
+        print(f"Appels LLM : {results['llm_requests']} (erreurs simulées {results['llm_errors_injected']}, réessais {results['retries']}), "
+              f"tokens {results['tokens_in']} / {results['tokens_out']}")
+        print_table([{k: round(v, 3) if isinstance(v, float) else v for k, v in r.items()} for r in results["stages"]],
+                    ["stage", "count", "total_s", "mean_ms", "max_ms"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+
+# Dossier racine des caches disque (surchargeable via la variable d'environnement CV_CACHE_DIR)
+CACHE_DIR = Path(os.environ.get("CV_CACHE_DIR", ".cache"))
+# Écritures entre deux parcours complets du dossier (expiration, écritures d'autres processus)
+PRUNE_EVERY = 200
+# Une éviction ramène le cache à 90 % de ses limites : pas de parcours à chaque écriture une fois plein
+LOW_WATER = 0.9
+
+
+def make_key(*parts):
+    """
+    Construit une clé de cache stable (SHA-256) à partir d'éléments hétérogènes.
+    """
+    raw = json.dumps([str(p) for p in parts], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def content_hash(data):
+    """
+    Empreinte SHA-256 du contenu d'un objet JSON (indépendante de l'ordre des clés).
+    """
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def atomic_write_text(path, text):
+    """
+    Écrit un fichier texte de façon atomique : fichier temporaire dans le même
+    dossier, puis rename. Un lecteur concurrent voit l'ancien ou le nouveau
+    contenu, jamais un fichier partiel.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, value, **dump_kwargs):
+    """
+    Écrit un objet JSON de façon atomique (voir atomic_write_text).
+    """
+    atomic_write_text(path, json.dumps(value, ensure_ascii=False, **dump_kwargs))
+
+
+class HashMemo:
+    """
+    Cache mémoire borné des valeurs calculées une fois par version de contenu
+    (clé : empreinte du référentiel). Au-delà de max_entries, la plus ancienne entrée
+    est oubliée. Le calcul se fait hors verrou : deux threads peuvent calculer la
+    même valeur, la première enregistrée est conservée.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self.lock:
+            value = self.entries.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key]
+            if len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = value
+        return value
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskCache:
+    """
+    Cache clé -> valeur JSON persistant sur disque, un fichier par entrée.
+    Éviction LRU (date de dernier accès) au-delà de max_entries / max_bytes,
+    et expiration des entrées non utilisées depuis plus de ttl secondes.
+    Les écritures sont atomiques (fichier temporaire + rename) et le cache
+    peut être partagé entre threads et sessions Streamlit. Le nombre et la taille
+    des entrées sont suivis en mémoire : le dossier n'est parcouru qu'au dépassement
+    d'une limite ou toutes les PRUNE_EVERY écritures.
+    """
+
+    def __init__(self, directory, max_entries=2000, max_bytes=200 * 1024 * 1024, ttl=30 * 24 * 3600):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None  # nombre et taille estimés depuis le dernier parcours (None : jamais parcouru)
+        self._bytes = 0
+        self._writes = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            info = path.stat()
+        except FileNotFoundError:
+            return default
+        now = time.time()
+        if self.ttl and now - info.st_mtime > self.ttl:
+            self._remove(path)
+            return default
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self._remove(path)
+            return default
+        try:
+            # Marque l'entrée comme récemment utilisée (LRU)
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = None
+        atomic_write_json(path, value)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        with self._lock:
+            if self._entries is not None:
+                self._entries += old_size is None
+                self._bytes += size - (old_size or 0)
+                self._writes += 1
+            due = (self._entries is None or self._writes >= PRUNE_EVERY
+                   or self._entries > self.max_entries or self._bytes > self.max_bytes)
+        if due:
+            self.prune()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        for path in self.directory.glob("*.json"):
+            self._remove(path)
+
+    def prune(self):
+        """
+        Supprime les entrées expirées puis, si une limite de nombre ou de taille est
+        dépassée, les moins récemment utilisées jusqu'à LOW_WATER de ces limites.
+        """
+        with self._lock:
+            now = time.time()
+            entries = []
+            for path in self.directory.glob("*.json"):
+                try:
+                    info = path.stat()
+                except FileNotFoundError:
+                    continue
+                if self.ttl and now - info.st_mtime > self.ttl:
+                    self._remove(path)
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+            entries.sort(key=lambda e: e[0])
+            total = sum(e[1] for e in entries)
+            if len(entries) > self.max_entries or total > self.max_bytes:
+                max_entries, max_bytes = int(self.max_entries * LOW_WATER), int(self.max_bytes * LOW_WATER)
+                while entries and (len(entries) > max_entries or total > max_bytes):
+                    _, size, path = entries.pop(0)
+                    self._remove(path)
+                    total -= size
+            self._entries, self._bytes, self._writes = len(entries), total, 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            path.unlink()
+        except (FileNotFoundError, OSError):
+            pass
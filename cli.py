@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+from cache import content_hash
+from extraction import DOC_TIMEOUT, MAX_PAGES, PdfExtractor
+from pipeline import DEFAULT_OPTIONS, REF_DIR, RESULT_CACHE, iter_ordered, load_referentials, screen_batch, screen_pdf
+from metrics import write_metrics
+from backends import BACKENDS, DEFAULT_BACKEND, DEFAULT_BASE_URL, DEFAULT_CASSETTE, READ_TIMEOUT, build_client, make_timeout
+from scheduler import RATE_LIMITS, parse_limits
+
+# Criblage de CV en ligne de commande, sans interface Streamlit :
+#   GROQ_API_KEY=... python cli.py cvs/ --referential IFS --lang fr -o resultats.jsonl
+# Une ligne JSON par CV, écrite dès que le CV (et ceux qui le précèdent) sont traités.
+
+DEFAULT_MODEL = "openai/gpt-oss-120b"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse par lots de CV PDF contre un référentiel GFSI (sortie JSONL).")
+    parser.add_argument("cv_dir", help="Dossier contenant les CV au format PDF (parcours récursif)")
+    parser.add_argument("-r", "--referential", required=True, help="Nom du référentiel (fichier de referentiels/ sans .json)")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help=f"Modèle Groq (défaut : {DEFAULT_MODEL})")
+    parser.add_argument("-l", "--lang", default="fr", choices=["fr", "en", "es"], help="Langue des justifications")
+    parser.add_argument("-o", "--output", help="Fichier JSONL de sortie (défaut : sortie standard)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Nombre d'analyses simultanées")
+    parser.add_argument("--chunked", action="store_true", help="Évaluer le référentiel par groupes d'exigences en parallèle")
+    parser.add_argument("--group-size", type=int, default=DEFAULT_OPTIONS["group_size"], help="Exigences par groupe en mode --chunked")
+    parser.add_argument("--prescreen", choices=["facts", "filter"], help="Pré-filtrage local : faits transmis au modèle (facts), ou en plus rejet sans appel LLM des CV échouant une exigence critique (filter)")
+    parser.add_argument("--retrieval", action="store_true", help="N'envoyer au modèle que les passages du CV pertinents pour chaque exigence (BM25)")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_OPTIONS["top_k"], help="Passages retenus par exigence en mode --retrieval")
+    parser.add_argument("--cascade", action="store_true", help="Modèle rapide d'abord ; seules les exigences incertaines sont réévaluées par --model")
+    parser.add_argument("--fast-model", default=DEFAULT_OPTIONS["fast_model"], help="Modèle rapide de la cascade")
+    parser.add_argument("--escalate-below", type=float, default=DEFAULT_OPTIONS["escalate_below"], help="Cascade : confiance sous laquelle une exigence est réévaluée")
+    parser.add_argument("--pack", action="store_true", help="Évaluer plusieurs CV courts par requête (taille adaptée au contexte du modèle ; sans effet avec --chunked ou --cascade)")
+    parser.add_argument("--pack-size", type=int, default=DEFAULT_OPTIONS["pack_size"], help="CV au plus par requête groupée")
+    parser.add_argument("--no-hierarchy", action="store_true", help="Score pondéré par item (ponderation) au lieu des poids catégorie/sous-catégorie")
+    parser.add_argument("--extract-workers", type=int, default=None, help="Processus d'extraction PDF (défaut : nombre de CPU, 0 = sans pool)")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES, help="Pages extraites au maximum par CV")
+    parser.add_argument("--extract-timeout", type=float, default=DOC_TIMEOUT, help="Délai maximal d'extraction d'une tranche de pages, depuis son démarrage (secondes) ; au-delà le texte est partiel")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="Fournisseur : groq, openai (URL compatible OpenAI) ou replay (réponses enregistrées)")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="URL de base de l'API compatible OpenAI (--backend openai)")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE, help="Fichier de réponses enregistrées lu par --backend replay")
+    parser.add_argument("--replay-speed", type=float, default=0.0, help="Rejeu : 0 = instantané, 1 = durée d'origine des réponses")
+    parser.add_argument("--record", help="Enregistrer chaque réponse du modèle dans ce fichier (à rejouer avec --backend replay)")
+    parser.add_argument("--timeout", type=float, default=READ_TIMEOUT, help="Délai maximal de lecture d'une réponse (secondes)")
+    parser.add_argument("--max-retries", type=int, default=6, help="Réessais par requête (429, erreurs serveur ou réseau)")
+    parser.add_argument("--rate-limits", default=RATE_LIMITS,
+                        help="Quotas appliqués avant l'envoi : vide = quotas lus dans les réponses et 429 (défaut), "
+                             "free = plan gratuit Groq, ou modele=rpm:tpm,...,*=rpm:tpm")
+    parser.add_argument("--ref-dir", default=str(REF_DIR), help="Dossier des référentiels")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorer le cache disque des résultats")
+    parser.add_argument("--metrics", help="Fichier de métriques écrit en fin de lot (durées par étape, tokens, réessais, caches) : format Prometheus si .prom, JSON sinon")
+    parser.add_argument("--include-text", action="store_true", help="Inclure le texte brut du CV dans chaque ligne")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    api_key = os.environ.get("GROQ_API_KEY") if args.backend == "groq" else os.environ.get("LLM_API_KEY")
+    if args.backend == "groq" and not api_key:
+        print("GROQ_API_KEY n'est pas définie.", file=sys.stderr)
+        return 2
+
+    try:
+        parse_limits(args.rate_limits)
+    except ValueError as e:
+        print(f"--rate-limits : {e}", file=sys.stderr)
+        return 2
+
+    referentials = load_referentials(args.ref_dir, on_error=lambda file, e: print(f"❌ {file}: {e}", file=sys.stderr))
+    if args.referential not in referentials:
+        print(f"Référentiel inconnu : {args.referential} (disponibles : {', '.join(sorted(referentials))})", file=sys.stderr)
+        return 2
+    selected_ref = referentials[args.referential]
+    ref_hash = content_hash(selected_ref)
+
+    paths = sorted(Path(args.cv_dir).rglob("*.pdf"))
+    if not paths:
+        print(f"Aucun PDF trouvé dans {args.cv_dir}", file=sys.stderr)
+        return 1
+
+    client = build_client(args.backend, api_key, args.base_url if args.backend == "openai" else None, make_timeout(args.timeout),
+                          record=args.record, cassette=args.cassette, speed=args.replay_speed, max_retries=args.max_retries,
+                          rate_limits=args.rate_limits)
+    cache = None if args.no_cache else RESULT_CACHE
+    extractor = PdfExtractor(args.extract_workers, max_pages=args.max_pages, timeout=args.extract_timeout)
+    options = {"chunked": args.chunked, "group_size": args.group_size, "policy": {"hierarchy": not args.no_hierarchy}, "prescreen": args.prescreen,
+               "retrieval": args.retrieval, "top_k": args.top_k, "cascade": args.cascade, "fast_model": args.fast_model,
+               "escalate_below": args.escalate_below, "pack": args.pack, "pack_size": args.pack_size}
+
+    def run(path):
+        return screen_pdf(client, args.model, selected_ref, args.lang, path.name, path.read_bytes(), ref_hash, cache, extractor, options)
+
+    def packed():
+        # Fenêtres de quelques paquets : sortie au fil de l'eau, mémoire bornée
+        window = max(1, args.workers) * max(1, args.pack_size)
+        for i in range(0, len(paths), window):
+            chunk = paths[i:i + window]
+            batch = screen_batch(client, args.model, selected_ref, args.lang, [(p.name, p.read_bytes()) for p in chunk],
+                                 args.workers, extractor, ref_hash, cache, options)
+            for path, (_, result, err) in zip(chunk, batch):
+                yield path, result, err
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failures = 0
+    try:
+        if args.pack:
+            results = packed()
+        else:
+            results = ((path, result, err) for (path,), result, err in iter_ordered(run, ((p,) for p in paths), args.workers))
+        for path, result, err in results:
+            if err is not None or result is None:
+                failures += 1
+                line = {"nom": path.name, "path": str(path), "error": str(err) if err else "invalid-json"}
+            else:
+                line = dict(result, path=str(path))
+                if not args.include_text:
+                    line.pop("cv_text", None)
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        extractor.close()
+        if out is not sys.stdout:
+            out.close()
+        if args.metrics:
+            write_metrics(args.metrics)
+    print(f"{len(paths) - failures}/{len(paths)} CV analysés", file=sys.stderr)
+    return 0 if failures == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
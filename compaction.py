@@ -0,0 +1,163 @@
+import re
+from collections import Counter
+
+# Compactage du texte brut des CV avant envoi au modèle : en-têtes/pieds de page
+# répétés, numéros de page, césures, espaces multiples et coordonnées n'apportent
+# rien à l'évaluation mais coûtent des tokens (latence et facturation).
+
+# Budget de tokens accordé au texte du CV, par modèle
+MODEL_TOKEN_BUDGETS = {
+    "openai/gpt-oss-120b": 6000,
+    "llama-3.3-70b-versatile": 6000,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 6000,
+    "moonshotai/kimi-k2-instruct-0905": 6000,
+    "llama-3.1-8b-instant": 4000,
+}
+DEFAULT_TOKEN_BUDGET = 6000
+
+# Fenêtre de contexte et réponse maximale (tokens) par modèle, pour les requêtes groupées
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-oss-120b": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 131072,
+    "moonshotai/kimi-k2-instruct-0905": 262144,
+    "llama-3.1-8b-instant": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 32768
+MODEL_MAX_COMPLETION_TOKENS = {
+    "openai/gpt-oss-120b": 65536,
+    "llama-3.3-70b-versatile": 32768,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 8192,
+    "moonshotai/kimi-k2-instruct-0905": 16384,
+    "llama-3.1-8b-instant": 131072,
+}
+DEFAULT_MAX_COMPLETION_TOKENS = 8192
+
+# Séparateur des pages dans le texte extrait (saut de page, comme pdftotext)
+PAGE_BREAK = "\f"
+# En-tête / pied de page : ligne parmi les premières ou dernières de la page, présente sur la plupart des pages
+EDGE_LINES = 2
+MIN_PAGE_SHARE = 0.6
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PAGE_NUM_RE = re.compile(r"^\s*(?:page|p\.|pág(?:ina)?\.?)?\s*\d{1,3}\s*(?:(?:/|sur|of|de)\s*\d{1,3})?\s*$", re.IGNORECASE)
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_URL_RE = re.compile(r"(?:https?://|www\.)\S+|\b(?:linkedin|github|viadeo)\.com/\S*", re.IGNORECASE)
+# Téléphones : indicatif international (+33 6 12 34 56 78) ou numéro national en 5 paires au même
+# séparateur (06 12 34 56 78, 06.12.34.56.78) ; jamais des périodes comme 01.2015-12.2019
+_PHONE_RE = re.compile(r"(?<![\w+.])(?:\+\d{1,3}[\s.-]?(?:\(0\)[\s.-]?)?\d(?:[\s.-]?\d{2,4}){2,5}|0\d([\s.-]?)\d{2}(?:\1\d{2}){3})(?![\w.]?\d)")
+# Césure de fin de ligne entre deux minuscules seulement : pas les périodes (2015-\n2019) ni les prénoms composés
+_HYPHEN_RE = re.compile(r"([a-zà-ÿ])-[ \t]*\n\s*([a-zà-ÿ])")
+_SPACES_RE = re.compile(r"[ \t ]+")
+_SEPARATORS_RE = re.compile(r"(?:\s*[|•·/,;:-]\s*){2,}")
+
+
+def estimate_tokens(text):
+    """
+    Estimation locale du nombre de tokens (sans tokenizer) : chaque mot compte pour
+    un token par tranche de 4 caractères, chaque signe de ponctuation pour un token.
+    """
+    return sum((len(t) + 3) // 4 for t in _TOKEN_RE.findall(text or ""))
+
+
+def token_budget(model):
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+def context_window(model):
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def max_completion_tokens(model):
+    return MODEL_MAX_COMPLETION_TOKENS.get(model, DEFAULT_MAX_COMPLETION_TOKENS)
+
+
+def clean_line(line):
+    return _SPACES_RE.sub(" ", _SEPARATORS_RE.sub(" | ", line)).strip(" |")
+
+
+def page_edge_lines(pages):
+    """
+    Lignes répétées en tête ou en pied de page sur la plupart des pages (en-têtes,
+    pieds de page) ; vide pour un document d'une page. Une ligne répétée ailleurs
+    (intitulé de poste, tâche) n'en fait pas partie.
+    """
+    if len(pages) < 2:
+        return set()
+    counts = Counter()
+    for page in pages:
+        lines = [line.lower() for line in map(clean_line, page.split("\n")) if re.search(r"\w", line) and not _PAGE_NUM_RE.match(line)]
+        counts.update(set(lines[:EDGE_LINES] + lines[-EDGE_LINES:]))
+    min_pages = max(2, round(len(pages) * MIN_PAGE_SHARE))
+    return {line for line, n in counts.items() if n >= min_pages}
+
+
+def normalize_text(text):
+    """
+    Recolle les césures de fin de ligne, retire coordonnées et numéros de page,
+    réduit les espaces et supprime les en-têtes et pieds de page répétés d'une page à l'autre.
+    """
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    text = _HYPHEN_RE.sub(r"\1\2", text)
+    text = _EMAIL_RE.sub(" ", text)
+    text = _URL_RE.sub(" ", text)
+    text = _PHONE_RE.sub(" ", text)
+    pages = text.split(PAGE_BREAK)
+    repeated = page_edge_lines(pages)
+    seen = set()
+    out = []
+    for line in map(clean_line, "\n".join(pages).split("\n")):
+        if not re.search(r"\w", line) or _PAGE_NUM_RE.match(line):
+            continue
+        low = line.lower()
+        if low in repeated:
+            # En-tête / pied de page : on ne garde que la première occurrence
+            if low in seen:
+                continue
+            seen.add(low)
+        out.append(line)
+    return "\n".join(out)
+
+
+def fit_budget(text, budget):
+    """
+    Tronque le texte au budget de tokens en gardant le début (expérience récente)
+    et la fin (formations, certifications), séparés par une marque d'omission.
+    """
+    if budget is None or estimate_tokens(text) <= budget:
+        return text
+    lines = text.split("\n")
+    head_budget = budget * 2 // 3
+    head, used = [], 0
+    for line in lines:
+        n = estimate_tokens(line)
+        if used + n > head_budget:
+            break
+        head.append(line)
+        used += n
+    tail, used_tail = [], 0
+    for line in reversed(lines[len(head):]):
+        n = estimate_tokens(line)
+        if used + used_tail + n > budget - 2:
+            break
+        tail.append(line)
+        used_tail += n
+    return "\n".join(head + ["[...]"] + tail[::-1])
+
+
+def compact_cv_text(text, budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Normalise puis tronque le texte du CV. Renvoie (texte compacté, statistiques)
+    où les statistiques indiquent les tokens estimés avant/après et économisés.
+    """
+    before = estimate_tokens(text)
+    normalized = normalize_text(text)
+    truncated = budget is not None and estimate_tokens(normalized) > budget
+    compacted = fit_budget(normalized, budget) if truncated else normalized
+    after = estimate_tokens(compacted)
+    return compacted, {
+        "tokens_before": before,
+        "tokens_after": after,
+        "tokens_saved": before - after,
+        "truncated": truncated,
+    }
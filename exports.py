@@ -0,0 +1,139 @@
+import io
+import csv
+import json
+import importlib.util
+import zipfile
+import tempfile
+
+# Exports générés à la demande (au clic sur le bouton de téléchargement) et écrits par
+# morceaux dans un fichier temporaire qui ne reste en mémoire que s'il est petit :
+# ni le texte des CV ni les lignes de détail ne sont sérialisés tant que personne
+# ne télécharge.
+
+CHUNK_ROWS = 500
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+NUMERIC_COLUMNS = {"confiance", "ponderation"}
+
+EXPORT_FORMATS = {
+    "csv": {"label": "CSV", "ext": "csv", "mime": "text/csv"},
+    "jsonl": {"label": "JSONL", "ext": "jsonl", "mime": "application/x-ndjson"},
+    "parquet": {"label": "Parquet", "ext": "parquet", "mime": "application/vnd.apache.parquet"},
+    "zip": {"label": "ZIP (JSON par candidat)", "ext": "zip", "mime": "application/zip"},
+}
+
+
+def parquet_available():
+    # pyarrow est optionnel : sans lui, l'export Parquet n'est pas proposé
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def available_formats():
+    return [f for f in EXPORT_FORMATS if f != "parquet" or parquet_available()]
+
+
+def export_record(result, include_text=False):
+    """
+    Résultat d'un candidat prêt à exporter (sans le texte brut du CV par défaut).
+    """
+    if include_text or "cv_text" not in result:
+        return result
+    return {k: v for k, v in result.items() if k != "cv_text"}
+
+
+def detail_columns(results):
+    # Colonnes du détail par exigence, dans l'ordre d'apparition (sans rien sérialiser)
+    columns = {}
+    for r in results:
+        for d in r["details"]:
+            columns.update(dict.fromkeys(d))
+    return list(columns)
+
+
+def iter_detail_chunks(results, chunk_rows=CHUNK_ROWS):
+    chunk = []
+    for r in results:
+        for d in r["details"]:
+            chunk.append(d)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(results, fileobj):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="", write_through=True)
+    writer = csv.DictWriter(text, fieldnames=detail_columns(results), extrasaction="ignore")
+    writer.writeheader()
+    for chunk in iter_detail_chunks(results):
+        writer.writerows(chunk)
+    text.detach()
+
+
+def write_jsonl(results, fileobj, include_text=False):
+    for r in results:
+        fileobj.write((json.dumps(export_record(r, include_text), ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def write_parquet(results, fileobj):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = detail_columns(results)
+    schema = pa.schema([(c, pa.float64() if c in NUMERIC_COLUMNS else pa.string()) for c in columns])
+
+    def cell(column, value):
+        if value is None:
+            return None
+        if column in NUMERIC_COLUMNS:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+        return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for chunk in iter_detail_chunks(results):
+            data = {c: [cell(c, d.get(c)) for d in chunk] for c in columns}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+
+
+def write_zip(results, fileobj, include_text=False):
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        names = set()
+        for i, r in enumerate(results):
+            name = f"detailed_{r['nom']}.json"
+            if name in names:
+                name = f"detailed_{i + 1}_{r['nom']}.json"
+            names.add(name)
+            zf.writestr(name, json.dumps(export_record(r, include_text), ensure_ascii=False, indent=2))
+
+
+def export_file(results, fmt, include_text=False):
+    """
+    Génère l'export demandé dans un fichier temporaire (en mémoire jusqu'à 8 Mo,
+    sur disque au-delà) et le renvoie rembobiné. Le texte des CV n'est inclus
+    (JSONL, ZIP) que si include_text est vrai.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    if fmt == "csv":
+        write_csv(results, out)
+    elif fmt == "jsonl":
+        write_jsonl(results, out, include_text)
+    elif fmt == "parquet":
+        write_parquet(results, out)
+    elif fmt == "zip":
+        write_zip(results, out, include_text)
+    else:
+        raise ValueError(f"unknown export format: {fmt}")
+    out.seek(0)
+    return out
+
+
+def export_bytes(results, fmt, include_text=False):
+    """
+    Contenu de l'export (bytes), pour st.download_button différé : Streamlit
+    n'accepte pas les fichiers temporaires et charge de toute façon le contenu.
+    """
+    with export_file(results, fmt, include_text) as f:
+        return f.read()
@@ -0,0 +1,146 @@
+import io
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import PyPDF2
+
+from compaction import PAGE_BREAK
+
+# Extraction de texte PDF dans un pool de processus : PyPDF2 est du Python pur
+# (limité par le GIL), on répartit donc les documents, et les pages des gros
+# documents, sur plusieurs processus.
+
+MAX_PAGES = 40          # pages extraites au maximum par document
+PAGES_PER_CHUNK = 8     # pages par tâche envoyée au pool
+DOC_TIMEOUT = 60.0      # secondes accordées à une tranche de pages, depuis son démarrage
+POLL_INTERVAL = 0.1     # secondes entre deux vérifications des tranches en cours
+MAX_RESUBMITS = 2       # nouvelles soumissions d'une tranche interrompue par un recyclage du pool
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def extract_page_range(data: bytes, start: int, stop: int):
+    """
+    Extrait le texte des pages [start, stop) d'un PDF (exécuté dans un processus du pool).
+    """
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [(page.extract_text() or "") for page in reader.pages[start:stop]]
+
+
+def count_pages(data: bytes):
+    return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+
+class PdfExtractor:
+    """
+    Extracteur partagé entre threads : chaque appel à extract() découpe le document
+    en tranches de pages soumises au pool de processus. Une tranche dispose de
+    `timeout` secondes à partir de son démarrage (pas de sa mise en file) ; au-delà
+    elle est abandonnée, le pool est recyclé pour arrêter le processus bloqué, et le
+    texte renvoyé est marqué partiel (ExtractionTimeout si aucune tranche n'aboutit).
+    max_workers=0 désactive le pool (extraction dans le thread appelant).
+    """
+
+    def __init__(self, max_workers=None, max_pages=MAX_PAGES, pages_per_chunk=PAGES_PER_CHUNK, timeout=DOC_TIMEOUT):
+        self.max_workers = (os.cpu_count() or 2) if max_workers is None else max_workers
+        self.max_pages = max_pages
+        self.pages_per_chunk = max(1, pages_per_chunk)
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # "spawn" : pas de fork d'un processus multi-thread (Streamlit, pool de threads)
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _submit(self, data, start, stop):
+        pool = self._get_pool()
+        return pool, pool.submit(extract_page_range, data, start, stop)
+
+    def _recycle(self, pool):
+        """
+        Remplace un pool dont une tâche a dépassé son délai : fut.cancel() n'arrête pas
+        une tâche en cours, ses processus sont donc arrêtés. Les tranches des autres
+        documents qui s'y exécutaient échouent (BrokenProcessPool) et sont soumises à nouveau.
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def extract(self, data: bytes):
+        """
+        Texte du document et indicateur partial : True si des tranches de pages ont été
+        abandonnées (délai dépassé), le texte ne couvre alors qu'une partie du document.
+        """
+        n_pages = count_pages(data)
+        if self.max_pages:
+            n_pages = min(n_pages, self.max_pages)
+        ranges = [(i, min(i + self.pages_per_chunk, n_pages)) for i in range(0, n_pages, self.pages_per_chunk)]
+        if not ranges:
+            return "", False
+        if not self.max_workers:
+            return PAGE_BREAK.join(t for a, b in ranges for t in extract_page_range(data, a, b)), False
+
+        tasks = [self._submit(data, a, b) for a, b in ranges]
+        results = [None] * len(ranges)
+        pending, started, resubmits, expired = set(range(len(ranges))), {}, {}, False
+        while pending:
+            wait([tasks[i][1] for i in pending], timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for i in sorted(pending):
+                pool, fut = tasks[i]
+                if fut.done():
+                    pending.discard(i)
+                    try:
+                        results[i] = fut.result()
+                    except BrokenProcessPool:
+                        # Pool recyclé pendant la tranche : nouvelle soumission (bornée)
+                        resubmits[i] = resubmits.get(i, 0) + 1
+                        if resubmits[i] <= MAX_RESUBMITS:
+                            tasks[i] = self._submit(data, *ranges[i])
+                            started.pop(i, None)
+                            pending.add(i)
+                elif fut.running() and now - started.setdefault(i, now) > self.timeout:
+                    pending.discard(i)
+                    expired = True
+                    self._recycle(pool)
+        if all(r is None for r in results):
+            if expired:
+                raise ExtractionTimeout(f"PDF extraction exceeded {self.timeout}s")
+            raise BrokenProcessPool("PDF extraction workers failed")
+        return PAGE_BREAK.join(t for r in results if r is not None for t in r), any(r is None for r in results)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_default_extractor = None
+_default_lock = threading.Lock()
+
+
+def get_extractor():
+    """
+    Extracteur partagé par tout le processus (créé à la première utilisation).
+    """
+    global _default_extractor
+    with _default_lock:
+        if _default_extractor is None:
+            _default_extractor = PdfExtractor()
+        return _default_extractor
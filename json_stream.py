@@ -0,0 +1,151 @@
+import json
+
+# Lecture tolérante des réponses JSON du modèle :
+# - analyse incrémentale d'une réponse reçue en streaming : chaque objet du tableau
+#   "analysis" est restitué dès que son accolade fermante arrive ;
+# - extraction en un seul passage (linéaire) du premier objet JSON valide d'un texte,
+#   avec réparation des réponses tronquées.
+
+
+class AnalysisStreamParser:
+    """
+    Parseur incrémental : feed(fragment) renvoie la liste des éléments du tableau
+    `key` (au premier niveau de l'objet racine) complétés par ce fragment.
+    Chaque caractère n'est examiné qu'une fois ; les chaînes JSON (et leurs
+    échappements) sont reconnues, donc les accolades citées dans les textes du CV
+    ne perturbent pas le comptage.
+    """
+
+    def __init__(self, key="analysis"):
+        self.key = key
+        self.text = ""
+        self.pos = 0
+        self.stack = []           # "{", "[" ou "A" (le tableau ciblé)
+        self.in_string = False
+        self.escape = False
+        self.str_start = None
+        self.last_string = None
+        self.pending_key = None
+        self.item_start = None
+        self.count = 0
+        self.last_item_end = None   # position de la fin du dernier élément complet
+        self.closers = ""           # fermetures à ajouter après cet élément
+
+    def feed(self, chunk):
+        self.text += chunk
+        items = []
+        text, stack = self.text, self.stack
+        for i in range(self.pos, len(text)):
+            ch = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.last_string = text[self.str_start + 1:i]
+                continue
+            if ch == '"':
+                self.in_string = True
+                self.str_start = i
+            elif ch == ":":
+                self.pending_key = self.last_string
+            elif ch == ",":
+                self.pending_key = None
+            elif ch == "{":
+                if stack and stack[-1] == "A":
+                    self.item_start = i
+                stack.append("{")
+                self.pending_key = None
+            elif ch == "[":
+                is_target = len(stack) == 1 and stack[-1] == "{" and self.pending_key == self.key
+                stack.append("A" if is_target else "[")
+                self.pending_key = None
+            elif ch in "}]":
+                if not stack:
+                    continue
+                opened = stack.pop()
+                if opened == "{" and stack and stack[-1] == "A" and self.item_start is not None:
+                    try:
+                        items.append(json.loads(text[self.item_start:i + 1]))
+                        self.count += 1
+                        self.last_item_end = i
+                        self.closers = "".join("}" if c == "{" else "]" for c in reversed(stack))
+                    except ValueError:
+                        pass
+                    self.item_start = None
+        self.pos = len(text)
+        return items
+
+
+def top_level_objects(s):
+    """
+    Repère en un passage les objets JSON de premier niveau d'un texte (les chaînes
+    sont reconnues à l'intérieur des objets). Génère (début, fin) ; fin vaut None
+    pour un objet ouvert jamais refermé (réponse tronquée).
+    """
+    depth, start, in_string, escape = 0, None, False, False
+    for i, ch in enumerate(s):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"' and depth > 0:
+            in_string = True
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                yield start, i
+    if depth > 0:
+        yield start, None
+
+
+def repair_truncated(fragment, key="analysis"):
+    """
+    Referme une réponse coupée après le dernier élément complet du tableau `key`.
+    Renvoie l'objet réparé (marqué "truncated": true) ou None si aucun élément n'est complet.
+    """
+    parser = AnalysisStreamParser(key)
+    parser.feed(fragment)
+    if parser.last_item_end is None:
+        return None
+    try:
+        obj = json.loads(fragment[:parser.last_item_end + 1] + parser.closers)
+    except ValueError:
+        return None
+    if isinstance(obj, dict):
+        obj["truncated"] = True
+    return obj
+
+
+def extract_json_strict(text, repair=True):
+    """
+    Premier objet JSON valide du texte. Chaque objet candidat n'est décodé qu'une
+    fois (coût linéaire) ; si la réponse est tronquée, les éléments complets du
+    tableau "analysis" sont conservés (repair=True).
+    """
+    s = (text or "").strip()
+    a, b = s.find("{"), s.rfind("}")
+    if a == -1:
+        return None
+    if b > a:
+        try:
+            return json.loads(s[a:b+1])
+        except ValueError:
+            pass
+    for start, end in top_level_objects(s):
+        if end is None:
+            return repair_truncated(s[start:]) if repair else None
+        try:
+            return json.loads(s[start:end+1])
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,111 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+from cache import HashMemo
+from registry import referential_hash
+from scoring import strip_accents
+
+# Détection « ce que nous avons cherché » : les mots-clés des critères de chaque
+# exigence sont extraits une fois par référentiel et compilés en automate
+# Aho-Corasick ; chaque CV est normalisé et parcouru une seule fois.
+
+KEYWORD_RE = re.compile(r"[A-Za-zÀ-ÿ]{4,}")
+MAX_KEYWORDS = 10
+
+
+class AhoCorasick:
+    """
+    Automate de recherche simultanée de plusieurs motifs (sous-chaînes) en un passage.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [set()]
+        for pattern in patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(set())
+                node = nxt
+            self.out[node].add(pattern)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] |= self.out[self.fail[nxt]]
+
+    def find_all(self, text):
+        found = set()
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+
+class KeywordIndex:
+    """
+    Mots-clés par exigence (forme "exigences" : 10 premiers mots de 4 lettres ou plus
+    des critères) et automate associé. found() mémorise le résultat par CV.
+    """
+
+    def __init__(self, selected_ref, memo_size=256):
+        self.requirements = []
+        patterns = set()
+        exigences = selected_ref.get("exigences") if isinstance(selected_ref.get("exigences"), dict) else {}
+        for req_id, req in exigences.items():
+            keywords = KEYWORD_RE.findall(" ".join(req.get("criteres", [])))[:MAX_KEYWORDS]
+            normalized = [strip_accents(k).lower() for k in keywords]
+            patterns.update(normalized)
+            self.requirements.append((req_id, req.get("title", ""), list(zip(keywords, normalized))))
+        self.automaton = AhoCorasick(sorted(patterns))
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+
+    def found(self, cv_text):
+        key = hashlib.sha1((cv_text or "").encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        found = self.automaton.find_all(strip_accents(cv_text).lower())
+        with self._lock:
+            self._memo[key] = found
+            if len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        return found
+
+    def presence(self, cv_text):
+        """
+        [(id, titre, mots-clés présents dans le CV)] pour chaque exigence.
+        """
+        found = self.found(cv_text)
+        return [(req_id, title, [k for k, n in keywords if n in found]) for req_id, title, keywords in self.requirements]
+
+
+_INDEXES = HashMemo(32)
+
+
+def keyword_index(selected_ref, ref_hash=None):
+    """
+    Index de mots-clés du référentiel, construit une fois par version de contenu.
+    """
+    return _INDEXES.get(ref_hash or referential_hash(selected_ref), lambda: KeywordIndex(selected_ref))
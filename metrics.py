@@ -0,0 +1,213 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from cache import CACHE_DIR, atomic_write_json, atomic_write_text
+
+# Instrumentation du chemin d'analyse : durées par étape (extraction PDF, compaction,
+# pré-filtrage, sélection des passages, prompt, appel LLM, parsing JSON, scores, rendu)
+# et compteurs (tokens envoyés/reçus d'après response.usage, réessais, échecs de
+# parsing, hits de cache). Les valeurs sont cumulées pour tout le processus, comme des
+# compteurs Prometheus : l'écart entre deux instantanés (diff) donne le coût d'un lot.
+
+METRICS_FILE = CACHE_DIR / "metrics.json"
+PROMETHEUS_FILE = CACHE_DIR / "metrics.prom"
+PREFIX = "cvscreen"
+# Bornes (secondes) des histogrammes de durée, pour estimer p50/p95 côté Prometheus
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+COUNTER_HELP = {
+    "llm_requests": "Appels au modèle",
+    "llm_errors": "Appels au modèle en échec (après réessais)",
+    "llm_retries": "Réessais (429, erreurs serveur ou réseau)",
+    "tokens_in": "Tokens envoyés (usage.prompt_tokens)",
+    "tokens_out": "Tokens générés (usage.completion_tokens)",
+    "parse_failures": "Réponses dont le JSON est inexploitable",
+    "cache_hits": "Lectures de cache réussies",
+    "cache_misses": "Lectures de cache sans résultat",
+    "prescreen_rejections": "CV rejetés par le pré-filtrage sans appel LLM",
+    "cascade_requirements": "Exigences évaluées par le modèle rapide (cascade)",
+    "cascade_escalations": "Exigences réévaluées par le grand modèle (cascade)",
+    "cascade_fallbacks": "Passages rapides inexploitables, analyse complète par le grand modèle",
+    "pack_requests": "Requêtes groupant plusieurs CV",
+    "pack_candidates": "CV analysés dans une requête groupée",
+    "pack_fallbacks": "CV absents ou inexploitables dans la réponse groupée, réanalysés seuls",
+    "pack_repairs": "Exigences manquantes dans la réponse groupée, réévaluées pour un CV",
+}
+
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+class Metrics:
+    """
+    Compteurs et chronomètres partagés entre threads. Chaque série est identifiée
+    par un nom et des étiquettes (model=..., cache=...), comme en Prometheus.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}      # (nom, étiquettes) -> valeur
+        self.timers = {}        # (étape, étiquettes) -> {count, sum, max, buckets}
+        self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, label_key(labels))
+        with self.lock:
+            t = self.timers.get(key)
+            if t is None:
+                t = self.timers[key] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)}
+            t["count"] += 1
+            t["sum"] += seconds
+            t["max"] = max(t["max"], seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    t["buckets"][i] += 1
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def record_usage(self, response, model=None):
+        """
+        Tokens consommés d'après response.usage (ou x_groq.usage du dernier
+        fragment d'une réponse en streaming). Ignoré si le fournisseur n'en renvoie pas.
+        """
+        usage = getattr(response, "usage", None) or getattr(getattr(response, "x_groq", None), "usage", None)
+        if usage is None:
+            return False
+        self.inc("tokens_in", getattr(usage, "prompt_tokens", 0) or 0, model=model)
+        self.inc("tokens_out", getattr(usage, "completion_tokens", 0) or 0, model=model)
+        return True
+
+    def snapshot(self):
+        """
+        Copie sérialisable : {"counters": [...], "timers": [...], ...}.
+        """
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "collected_at": time.time(),
+                "counters": [{"name": n, "labels": dict(lk), "value": v} for (n, lk), v in sorted(self.counters.items())],
+                "timers": [dict(t, stage=s, labels=dict(lk), buckets=list(t["buckets"])) for (s, lk), t in sorted(self.timers.items())],
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timers.clear()
+            self.started_at = time.time()
+
+
+def diff(after, before):
+    """
+    Écart entre deux instantanés (coût d'un lot). Le maximum n'étant pas
+    décomposable, celui de `after` est conservé.
+    """
+    old_counters = {(c["name"], label_key(c["labels"])): c["value"] for c in before["counters"]}
+    old_timers = {(t["stage"], label_key(t["labels"])): t for t in before["timers"]}
+    counters = []
+    for c in after["counters"]:
+        value = c["value"] - old_counters.get((c["name"], label_key(c["labels"])), 0)
+        if value:
+            counters.append(dict(c, value=value))
+    timers = []
+    for t in after["timers"]:
+        old = old_timers.get((t["stage"], label_key(t["labels"])))
+        if old is None:
+            timers.append(t)
+        elif t["count"] > old["count"]:
+            timers.append(dict(
+                t, count=t["count"] - old["count"], sum=t["sum"] - old["sum"],
+                buckets=[a - b for a, b in zip(t["buckets"], old["buckets"])],
+            ))
+    return {"started_at": before["collected_at"], "collected_at": after["collected_at"], "counters": counters, "timers": timers}
+
+
+def totals(snapshot, name):
+    # Somme d'un compteur toutes étiquettes confondues
+    return sum(c["value"] for c in snapshot["counters"] if c["name"] == name)
+
+
+def stage_rows(snapshot):
+    """
+    Une ligne par étape (toutes étiquettes confondues) : appels, total, moyenne, max.
+    """
+    rows = {}
+    for t in snapshot["timers"]:
+        row = rows.setdefault(t["stage"], {"stage": t["stage"], "count": 0, "total_s": 0.0, "max_ms": 0.0})
+        row["count"] += t["count"]
+        row["total_s"] += t["sum"]
+        row["max_ms"] = max(row["max_ms"], t["max"] * 1000)
+    for row in rows.values():
+        row["mean_ms"] = row["total_s"] * 1000 / row["count"] if row["count"] else 0.0
+    return sorted(rows.values(), key=lambda r: r["total_s"], reverse=True)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def to_prometheus(snapshot):
+    """
+    Format texte d'exposition Prometheus (compteurs *_total, histogrammes *_seconds).
+    """
+    lines, declared = [], set()
+    for c in snapshot["counters"]:
+        metric = f"{PREFIX}_{c['name']}_total"
+        if metric not in declared:
+            declared.add(metric)
+            lines.append(f"# HELP {metric} {COUNTER_HELP.get(c['name'], c['name'])}")
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{prometheus_labels(c['labels'])} {c['value']}")
+    metric = f"{PREFIX}_stage_seconds"
+    if snapshot["timers"]:
+        lines.append(f"# HELP {metric} Durée des étapes de l'analyse")
+        lines.append(f"# TYPE {metric} histogram")
+    for t in snapshot["timers"]:
+        labels = dict(t["labels"], stage=t["stage"])
+        for bound, count in zip(BUCKETS, t["buckets"]):
+            lines.append(f"{metric}_bucket{prometheus_labels(labels, le=bound)} {count}")
+        lines.append(f"{metric}_bucket{prometheus_labels(labels, le='+Inf')} {t['count']}")
+        lines.append(f"{metric}_sum{prometheus_labels(labels)} {t['sum']:.6f}")
+        lines.append(f"{metric}_count{prometheus_labels(labels)} {t['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, snapshot=None):
+    """
+    Écrit les métriques (écriture atomique) : format Prometheus si le fichier se
+    termine par .prom ou .txt, JSON sinon.
+    """
+    snapshot = snapshot or METRICS.snapshot()
+    if str(path).endswith((".prom", ".txt")):
+        atomic_write_text(path, to_prometheus(snapshot))
+    else:
+        atomic_write_json(path, snapshot, indent=2)
+
+
+def write_default_files(snapshot=None):
+    snapshot = snapshot or METRICS.snapshot()
+    write_metrics(METRICS_FILE, snapshot)
+    write_metrics(PROMETHEUS_FILE, snapshot)
+
+
+# Instance partagée par le pipeline, l'ordonnanceur, l'application et le CLI
+METRICS = Metrics()
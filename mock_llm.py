@@ -0,0 +1,218 @@
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from compaction import estimate_tokens
+
+# Serveur local compatible avec l'API chat.completions de Groq / OpenAI, pour les
+# benchmarks et les démos sans clé : latence et taux d'erreur réglables, réponse
+# « analysis » générée à partir des exigences présentes dans le prompt (ou fichier
+# de réponse fixe), streaming SSE et champ usage comme l'API réelle.
+#   python mock_llm.py --port 8765 --latency 1.5 --error-rate 0.05
+#   groq.Client(api_key="mock", base_url="http://127.0.0.1:8765")
+
+REQUIREMENT_RE = re.compile(r"REQUIREMENT ([^\s:]+)")
+CANDIDATE_RE = re.compile(r"=== CANDIDATE (\S+) ===")
+STATUSES = ["COMPLIANT", "COMPLIANT", "TO_REVIEW", "NON_COMPLIANT"]
+STREAM_CHUNK_CHARS = 40
+
+
+def canned_items(ids):
+    items = []
+    for req_id in ids:
+        h = int(hashlib.sha256(req_id.encode("utf-8")).hexdigest()[:8], 16)
+        items.append({
+            "exigence_id": req_id,
+            "exigence_titre": f"Requirement {req_id}",
+            "category_id": "",
+            "statut": STATUSES[h % len(STATUSES)],
+            "justification": "Synthetic verdict generated by the local mock server.",
+            "elements_cv": "",
+            "confiance": round(0.5 + (h % 50) / 100, 2),
+            "niveau_requis": "obligatoire",
+            "ponderation": 1.0,
+        })
+    return items
+
+
+def canned_analysis(prompt):
+    """
+    Réponse JSON « analysis » plausible : un verdict par exigence du prompt,
+    déterministe (fonction de l'identifiant de l'exigence). Prompt groupé (plusieurs
+    CV) : une entrée "candidates" par identifiant de candidat.
+    """
+    ids = list(dict.fromkeys(REQUIREMENT_RE.findall(prompt))) or ["REQ-1"]
+    candidates = list(dict.fromkeys(CANDIDATE_RE.findall(prompt)))
+    if candidates:
+        return json.dumps({"candidates": [
+            {"candidate_id": cid, "analysis": canned_items(ids), "score_global": 0.7, "synthese": f"Synthetic summary for {cid} (mock server)."}
+            for cid in candidates
+        ]}, ensure_ascii=False)
+    return json.dumps({"analysis": canned_items(ids), "score_global": 0.7, "synthese": "Synthetic summary (mock server)."}, ensure_ascii=False)
+
+
+class MockConfig:
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, error_status=429, retry_after=0.1, response=None, seed=None, model_latency=None):
+        self.latency = latency          # secondes par requête (moyenne)
+        self.model_latency = dict(model_latency or {})  # latence propre à certains modèles (ex. modèle rapide)
+        self.jitter = jitter            # écart maximal autour de la moyenne
+        self.error_rate = error_rate    # proportion de requêtes en erreur
+        self.error_status = error_status
+        self.retry_after = retry_after  # en-tête retry-after des 429
+        self.response = response        # contenu fixe (sinon canned_analysis)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "streams": 0}
+
+    def draw(self, model=None):
+        with self.lock:
+            self.stats["requests"] += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.stats["errors"] += 1
+            latency = self.model_latency.get(model, self.latency)
+            delay = max(0.0, latency + self.random.uniform(-self.jitter, self.jitter) * latency / (self.latency or 1))
+        return failed, delay
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self.send_json(400, {"error": {"message": "invalid JSON body"}})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": "not found"}})
+
+        config = self.server.config
+        failed, delay = config.draw(request.get("model"))
+        time.sleep(delay)
+        if failed:
+            headers = {"retry-after": str(config.retry_after)} if config.error_status == 429 else {}
+            return self.send_json(config.error_status, {"error": {"message": "mock error", "type": "mock_error"}}, headers)
+
+        prompt = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+        content = config.response if config.response is not None else canned_analysis(prompt)
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": f"mock-{time.time_ns()}", "created": int(time.time()), "model": request.get("model", "mock")}
+        if request.get("stream"):
+            with config.lock:
+                config.stats["streams"] += 1
+            return self.send_stream(base, content, usage)
+        self.send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"},
+        ]))
+
+    def send_stream(self, base, content, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        chunks = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+        for i, text in enumerate(chunks):
+            last = i == len(chunks) - 1
+            event = dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": {"content": text}, "finish_reason": "stop" if last else None},
+            ])
+            if last:
+                # Comme Groq : usage transmis avec le dernier fragment
+                event["x_groq"] = {"id": base["id"], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockLLMServer:
+    """
+    Serveur de test dans un thread : with MockLLMServer(latency=0.2) as server: ... server.url
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, **config):
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = MockConfig(**config)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        return dict(self.httpd.config.stats)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur LLM local compatible Groq/OpenAI (benchmarks, démos).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Latence moyenne par requête (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variation maximale de la latence (secondes)")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODELE=SECONDES", help="Latence propre à un modèle (répétable)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de requêtes en erreur (0 à 1)")
+    parser.add_argument("--error-status", type=int, default=429, help="Code HTTP des erreurs simulées")
+    parser.add_argument("--response", help="Fichier dont le contenu est renvoyé tel quel (sinon réponse générée)")
+    parser.add_argument("--seed", type=int, help="Graine du tirage latence/erreurs")
+    args = parser.parse_args(argv)
+    response = open(args.response, encoding="utf-8").read() if args.response else None
+    server = MockLLMServer(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          error_status=args.error_status, response=response, seed=args.seed,
+                          model_latency={m: float(v) for m, v in (item.rsplit("=", 1) for item in args.model_latency)})
+    print(f"Serveur LLM simulé sur {server.url}", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,911 @@
+import io
+import json
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import PyPDF2
+
+from backends import chat
+from cache import CACHE_DIR, DiskCache, HashMemo, make_key
+from compaction import PAGE_BREAK, compact_cv_text, context_window, estimate_tokens, max_completion_tokens, token_budget
+from extraction import get_extractor
+from json_stream import AnalysisStreamParser, extract_json_strict
+from metrics import METRICS
+from registry import REF_DIR, referential_hash
+from prescreen import PRESCREEN_VERSION, facts_for_prompt, prescreen, rejection_analysis
+from retrieval import MIN_CV_TOKENS, CvEvidence
+from scoring import compile_weights, iter_requirements, normalize_status, score_candidates
+
+# Pipeline d'analyse sans dépendance à Streamlit : importable depuis l'application,
+# le CLI (cli.py) ou tout script de traitement par lots.
+
+# Incrémenter à chaque modification de build_prompt / du schéma pour invalider le cache
+PROMPT_VERSION = "3"
+RESULT_CACHE = DiskCache(CACHE_DIR / "results", max_entries=5000, ttl=30 * 24 * 3600)
+# Texte extrait des PDF, indexé par l'empreinte SHA-256 du fichier (survit aux redémarrages)
+TEXT_CACHE = DiskCache(CACHE_DIR / "text", max_entries=10000, max_bytes=100 * 1024 * 1024, ttl=90 * 24 * 3600)
+
+def validate_analysis(obj):
+    if not isinstance(obj, dict):
+        return False, "root-not-dict"
+    if "analysis" not in obj or not isinstance(obj["analysis"], list):
+        return False, "no-analysis"
+    ok_items = []
+    for it in obj["analysis"]:
+        if not isinstance(it, dict):
+            continue
+        need = ["exigence_id", "exigence_titre", "statut", "justification", "confiance", "ponderation", "niveau_requis"]
+        if not all(k in it for k in need):
+            continue
+        it["statut"] = normalize_status(it.get("statut"))
+        if "category_id" not in it:
+            it["category_id"] = ""
+        ok_items.append(it)
+    obj["analysis"] = ok_items
+    if "score_global" not in obj:
+        obj["score_global"] = 0
+    if "synthese" not in obj:
+        obj["synthese"] = ""
+    return True, obj
+
+def pdf_to_text(file_bytes: bytes):
+    reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
+    return PAGE_BREAK.join([(page.extract_text() or "") for page in reader.pages])
+
+def bytes_digest(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+def validate_referential_structure(data: dict):
+    if not isinstance(data, dict):
+        return False, "root must be object"
+    if "exigences" not in data and "categories" not in data:
+        return False, "missing 'exigences' or 'categories'"
+    if "exigences" in data and not isinstance(data["exigences"], dict):
+        return False, "'exigences' must be object"
+    if "categories" in data and not isinstance(data["categories"], dict):
+        return False, "'categories' must be object"
+    return True, "OK"
+
+def load_referentials(ref_dir=REF_DIR, on_error=None):
+    """
+    Charge les référentiels JSON valides du dossier (clé = nom du fichier sans extension).
+    on_error(fichier, exception) est appelé pour chaque fichier illisible.
+    """
+    out = {}
+    ref_dir = Path(ref_dir)
+    if ref_dir.exists():
+        for file in ref_dir.glob("*.json"):
+            try:
+                with open(file, encoding="utf-8") as f:
+                    data = json.load(f)
+                if "exigences" in data or "categories" in data:
+                    out[file.stem] = data
+            except Exception as e:
+                if on_error:
+                    on_error(file, e)
+    return out
+
+def render_referential(selected_ref):
+    if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict) and selected_ref["exigences"]:
+        lines = []
+        for req_id, req in selected_ref["exigences"].items():
+            lines.append(
+                f"REQUIREMENT {req_id}: {req.get('title','')}\n"
+                f"Description: {req.get('description','')}\n"
+                f"Level: {req.get('niveau_requis','')}\n"
+                f"Weight: {req.get('ponderation',1.0)}\n"
+                "Criteria:\n" + "\n".join(["• "+c for c in req.get("criteres", [])])
+            )
+            lines.append("Conform examples:\n" + "\n".join(["• "+e for e in req.get("exemples_conformes", [])]))
+            lines.append("Non-conform examples:\n" + "\n".join(["• "+e for e in req.get("exemples_non_conformes", [])]) + "\n---")
+        return "\n".join(lines)
+    lines = []
+    for cat, cat_data in selected_ref.get("categories", {}).items():
+        lines.append(f"== CATEGORY {cat} (weight {cat_data.get('weight',0)}) ==")
+        lines.append(cat_data.get("description",""))
+        for sub, sub_data in cat_data.get("subcategories", {}).items():
+            lines.append(f"-- Subcategory {sub} (weight {sub_data.get('weight',0)}) --")
+            for req in sub_data.get("requirements", []):
+                lines.append(
+                    f"REQUIREMENT {req.get('id','N/A')}\n"
+                    f"Text: {req.get('text','')}\n"
+                    f"Minimum acceptable: {req.get('minimum_acceptable','')}\n"
+                    f"References: {', '.join(req.get('references', []))}\n---"
+                )
+    return "\n".join(lines)
+
+PROMPT_SCHEMA = {
+    "analysis": [{
+        "exigence_id": "ID exact",
+        "exigence_titre": "Title",
+        "category_id": "Category/Subcategory",
+        "statut": "COMPLIANT | TO_REVIEW | NON_COMPLIANT | CONFORME | A CHALLENGER | NON CONFORME | CUMPLE | A REVISAR | NO CUMPLE",
+        "justification": "Evidence and reasoning",
+        "elements_cv": "CV quotes",
+        "confiance": 0.0,
+        "niveau_requis": "obligatoire|recommande|souhaitable|mandatory|recommended|desirable",
+        "ponderation": 1.0
+    }],
+    "score_global": 0.0,
+    "synthese": "Summary and recommendations"
+}
+
+LANG_NAMES = {
+    "fr": "Français",
+    "en": "English",
+    "es": "Español",
+}
+
+# Justification des exigences d'un groupe dont la requête a échoué (analyse découpée)
+NOT_EVALUATED = {
+    "fr": "Non évalué : la requête de ce groupe d'exigences a échoué.",
+    "en": "Not evaluated: the request for this group of requirements failed.",
+    "es": "No evaluado: la solicitud de este grupo de requisitos falló.",
+}
+
+# Préfixes compilés, indexés par empreinte du contenu du référentiel
+_PREFIXES = HashMemo(64)
+
+def compile_prompt_prefix(selected_ref, ref_hash=None):
+    """
+    Partie statique du prompt (consignes, schéma, méthode, référentiel), identique
+    octet pour octet pour toutes les langues et tous les CV d'une même version du
+    référentiel : compilée une fois, elle profite du cache de prompt du fournisseur.
+    """
+    return _PREFIXES.get(ref_hash or referential_hash(selected_ref), lambda: render_prompt_prefix(selected_ref))
+
+def render_prompt_prefix(selected_ref):
+    return f"""
+You are a senior GFSI conformity expert.
+Respond ONLY with STRICTLY VALID JSON using EXACTLY the following keys/schema (keys in English).
+Schema:
+{json.dumps(PROMPT_SCHEMA, ensure_ascii=False, indent=2)}
+
+Method:
+1) Match CV evidence against each requirement criteria and examples
+2) Decide status: COMPLIANT / TO_REVIEW / NON_COMPLIANT
+3) Provide precise justification with CV evidence quotes
+4) Provide confidence 0..1
+
+REFERENTIAL:
+{render_referential(selected_ref)}
+"""
+
+EXCERPTS_HEADER = (
+    "CANDIDATE CV (excerpts [Pn] selected as most relevant to the requirements above; "
+    "other sections are omitted, so prefer TO_REVIEW over NON_COMPLIANT when evidence is missing):"
+)
+
+def build_prompt(selected_ref, cv_text, lang, ref_hash=None, facts="", excerpts=False):
+    # Préfixe statique d'abord, puis la langue, le CV et les faits pré-calculés (parties variables)
+    return (
+        compile_prompt_prefix(selected_ref, ref_hash)
+        + f"""
+All texts (justification, synthese) must be written in {LANG_NAMES[lang]}.
+
+{EXCERPTS_HEADER if excerpts else "CANDIDATE CV:"}
+{cv_text}
+"""
+        + (f"\n{facts}\n" if facts else "")
+    )
+
+PACK_SCHEMA = {
+    "candidates": [{
+        "candidate_id": "CV1",
+        "analysis": ["... one item per requirement, as in the schema above ..."],
+        "score_global": 0.0,
+        "synthese": "Summary and recommendations for this candidate"
+    }]
+}
+
+def build_packed_prompt(selected_ref, candidates, lang, ref_hash=None):
+    """
+    Prompt groupé : même préfixe statique que build_prompt (cache de prompt du
+    fournisseur), puis plusieurs CV délimités par leur identifiant.
+    candidates : liste de (identifiant, texte du CV, faits, extraits ou non).
+    """
+    blocks = []
+    for cid, text, facts, excerpts in candidates:
+        blocks.append(
+            f"=== CANDIDATE {cid} ===\n{EXCERPTS_HEADER if excerpts else 'CANDIDATE CV:'}\n{text}\n"
+            + (f"\n{facts}\n" if facts else "")
+            + f"=== END CANDIDATE {cid} ==="
+        )
+    ids = ", ".join(c[0] for c in candidates)
+    return (
+        compile_prompt_prefix(selected_ref, ref_hash)
+        + f"""
+PACKED EVALUATION: {len(candidates)} candidates ({ids}) are evaluated independently against the referential above.
+Respond ONLY with STRICTLY VALID JSON of the form:
+{json.dumps(PACK_SCHEMA, ensure_ascii=False, indent=2)}
+with exactly one entry per candidate ID, each entry following the schema above with one "analysis" item for EVERY requirement.
+Never use the evidence of one candidate for another.
+All texts (justification, synthese) must be written in {LANG_NAMES[lang]}.
+
+"""
+        + "\n\n".join(blocks)
+        + "\n"
+    )
+
+def score_analysis(analysis, selected_ref=None, ref_hash=None, policy=None):
+    """
+    Score d'un candidat via le moteur vectorisé (pondérations hiérarchiques du
+    référentiel si fourni). Renvoie (score, conformes, challengers, non_conformes).
+    """
+    compiled = compile_weights(selected_ref, ref_hash) if selected_ref is not None else None
+    row = score_candidates([analysis], compiled, policy).iloc[0]
+    return float(row["score"]), int(row["conformes"]), int(row["challengers"]), int(row["non_conformes"])
+
+def rescore(result, selected_ref, ref_hash=None, policy=None):
+    """
+    Recalcule en place score et compteurs d'un résultat relu du cache : la politique de
+    pondération ne fait pas partie de la clé, le score suit donc la politique courante.
+    """
+    score, result["conformes"], result["challengers"], result["non_conformes"] = score_analysis(result["details"], selected_ref, ref_hash, policy)
+    result["score"] = round(score, 2)
+    return result
+
+# Options d'analyse (surchargées via le paramètre options des fonctions analyse_*)
+DEFAULT_OPTIONS = {
+    "chunked": False,           # découpe du référentiel en groupes d'exigences évalués en parallèle
+    "group_size": 4,            # exigences par groupe
+    "max_tokens": 4000,         # réponse maximale (requête unique)
+    "chunk_max_tokens": 1500,   # réponse maximale par groupe
+    "on_item": None,            # rappel on_item(nom du CV, exigence) : active le streaming
+    "policy": None,             # politique de pondération (voir scoring.DEFAULT_POLICY)
+    "prescreen": None,          # pré-filtrage local : None, "facts" (faits ajoutés au prompt) ou "filter" (+ rejet sans appel LLM)
+    "retrieval": False,         # n'envoyer que les passages du CV pertinents pour chaque exigence (BM25)
+    "top_k": 3,                 # passages retenus par exigence
+    "cascade": False,           # modèle rapide d'abord, seules les exigences incertaines passent au modèle choisi
+    "fast_model": "llama-3.1-8b-instant",
+    "escalate_below": 0.7,      # confiance du modèle rapide en dessous de laquelle l'exigence est réévaluée
+    "pack": False,              # plusieurs CV courts par requête (lots uniquement, sans chunked ni cascade)
+    "pack_size": 8,             # CV au plus par requête groupée
+    "pack_max_cv_tokens": 1500, # au-delà, le CV est analysé seul
+}
+
+def cache_variant(options):
+    """
+    Options qui modifient le résultat d'une analyse, pour la clé du cache ("" si aucune).
+    """
+    options = options or {}
+    parts = []
+    if options.get("chunked"):
+        parts.append(f"chunked={options.get('group_size', DEFAULT_OPTIONS['group_size'])}")
+    if options.get("prescreen"):
+        parts.append(f"prescreen={options['prescreen']}@{PRESCREEN_VERSION}")
+    if options.get("retrieval"):
+        parts.append(f"retrieval={options.get('top_k', DEFAULT_OPTIONS['top_k'])}")
+    if options.get("cascade"):
+        parts.append(f"cascade={options.get('fast_model', DEFAULT_OPTIONS['fast_model'])}@{options.get('escalate_below', DEFAULT_OPTIONS['escalate_below'])}")
+    if packing_enabled(options):
+        parts.append("pack")
+    return ";".join(parts)
+
+def cacheable(result):
+    """
+    Un résultat n'est mis en cache que s'il est complet : une réponse tronquée, un texte
+    extrait en partie ou des groupes d'exigences en échec doivent être redemandés à la
+    prochaine analyse, pas resservis.
+    """
+    return (result is not None and not result.get("truncated") and not result.get("extraction_partial")
+            and not result.get("failed_requirements"))
+
+def packing_enabled(options):
+    options = options or {}
+    return bool(options.get("pack")) and not options.get("chunked") and not options.get("cascade")
+
+def split_referential(selected_ref, group_size=4):
+    """
+    Découpe un référentiel en sous-référentiels de même structure : par catégorie pour
+    la forme "categories" (les catégories trop grosses sont scindées par sous-catégorie),
+    par paquets de group_size exigences pour la forme "exigences".
+    """
+    group_size = max(1, int(group_size))
+    if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict) and selected_ref["exigences"]:
+        items = list(selected_ref["exigences"].items())
+        return [{"exigences": dict(items[i:i + group_size])} for i in range(0, len(items), group_size)]
+    groups = []
+    for cat, cat_data in selected_ref.get("categories", {}).items():
+        subs = cat_data.get("subcategories", {})
+        n_reqs = sum(len(sub.get("requirements", [])) for sub in subs.values())
+        if n_reqs <= group_size or len(subs) <= 1:
+            groups.append({"categories": {cat: cat_data}})
+            continue
+        for sub, sub_data in subs.items():
+            groups.append({"categories": {cat: dict(cat_data, subcategories={sub: sub_data})}})
+    return groups
+
+def select_requirements(selected_ref, ids):
+    """
+    Sous-référentiel de même structure restreint aux exigences ids (catégories et
+    sous-catégories vides retirées).
+    """
+    ids = {str(i) for i in ids}
+    if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict) and selected_ref["exigences"]:
+        return {"exigences": {k: v for k, v in selected_ref["exigences"].items() if str(k) in ids}}
+    categories = {}
+    for cat, cat_data in selected_ref.get("categories", {}).items():
+        subs = {}
+        for sub, sub_data in cat_data.get("subcategories", {}).items():
+            reqs = [r for r in sub_data.get("requirements", []) if str(r.get("id", "N/A")) in ids]
+            if reqs:
+                subs[sub] = dict(sub_data, requirements=reqs)
+        if subs:
+            categories[cat] = dict(cat_data, subcategories=subs)
+    return {"categories": categories}
+
+def call_model(client, model, prompt, max_tokens=4000, on_item=None):
+    """
+    Un appel au modèle (compteurs et durée), renvoie le texte de la complétion.
+    Avec on_item, la complétion est reçue en streaming et on_item(exigence) est appelé
+    pour chaque élément du tableau "analysis" dès qu'il est complet.
+    """
+    METRICS.inc("llm_requests", model=model)
+    try:
+        with METRICS.timer("llm", model=model):
+            if on_item is None:
+                response = chat(client, model, prompt, max_tokens)
+                METRICS.record_usage(response, model)
+                raw = response.choices[0].message.content or ""
+            else:
+                parser, parts = AnalysisStreamParser(), []
+                for chunk in chat(client, model, prompt, max_tokens, stream=True):
+                    # L'usage n'arrive qu'avec le dernier fragment (x_groq.usage chez Groq)
+                    METRICS.record_usage(chunk, model)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        for item in parser.feed(delta):
+                            on_item(item)
+                raw = "".join(parts)
+    except Exception:
+        METRICS.inc("llm_errors", model=model)
+        raise
+    return raw
+
+def request_analysis(client, model, prompt, max_tokens=4000, on_item=None):
+    """
+    Un appel au modèle suivi de l'extraction/validation du JSON. None si inexploitable.
+    """
+    raw = call_model(client, model, prompt, max_tokens, on_item)
+    with METRICS.timer("parse"):
+        parsed = extract_json_strict(raw)
+        ok, res = validate_analysis(parsed) if parsed else (False, None)
+    if not ok:
+        METRICS.inc("parse_failures", model=model)
+        return None
+    return res
+
+def merge_analyses(parts):
+    """
+    Fusionne les réponses des groupes d'exigences en un seul résultat validé.
+    """
+    analysis, syntheses, score_sum = [], [], 0.0
+    for res in parts:
+        analysis.extend(res["analysis"])
+        if res.get("synthese"):
+            syntheses.append(str(res["synthese"]))
+        try:
+            score_sum += float(res.get("score_global") or 0) * len(res["analysis"])
+        except (TypeError, ValueError):
+            pass
+    merged = {
+        "analysis": analysis,
+        "score_global": round(score_sum / len(analysis), 2) if analysis else 0,
+        "synthese": "\n\n".join(syntheses),
+        "truncated": any(res.get("truncated") for res in parts),
+    }
+    return validate_analysis(merged)[1]
+
+def unevaluated_analysis(group, lang):
+    """
+    Réponse de remplacement d'un groupe en échec : ses exigences restent à challenger,
+    confiance nulle, marquées non_evalue (le résultat n'est alors pas mis en cache).
+    """
+    return {"analysis": [{
+        "exigence_id": req["id"],
+        "exigence_titre": req["title"],
+        "category_id": req["category_id"],
+        "statut": "A CHALLENGER",
+        "justification": NOT_EVALUATED[lang],
+        "elements_cv": "",
+        "confiance": 0.0,
+        "niveau_requis": "obligatoire" if req["critical"] else "recommande",
+        "ponderation": 1.0,
+        "non_evalue": True,
+    } for req in iter_requirements(group)]}
+
+def analyse_groups(client, model, selected_ref, lang, cv_text, options, on_item=None, facts="", evidence=None):
+    """
+    Évalue chaque groupe d'exigences par une requête distincte (réponses courtes, en
+    parallèle) puis fusionne. Un groupe en échec est redemandé seul une fois ; s'il
+    échoue encore, les autres groupes sont conservés et ses exigences marquées non
+    évaluées. None (ou l'erreur) si aucun groupe n'aboutit. Avec evidence (CvEvidence),
+    chaque groupe ne reçoit que les passages retenus pour ses exigences.
+    """
+    groups = split_referential(selected_ref, options["group_size"])
+
+    def run(group):
+        with METRICS.timer("prompt"):
+            text = evidence.render(group) if evidence is not None else cv_text
+            prompt = build_prompt(group, text, lang, facts=facts, excerpts=evidence is not None)
+        return request_analysis(client, model, prompt, options["chunk_max_tokens"], on_item)
+
+    parts, failed, error = [None] * len(groups), [], None
+    for i, (_, res, err) in enumerate(iter_ordered(run, [(g,) for g in groups], len(groups))):
+        if res is None:
+            failed.append(i)
+        parts[i] = res
+    for i in failed:
+        METRICS.inc("group_retries", model=model)
+        try:
+            parts[i] = run(groups[i])
+        except Exception as e:
+            error = e
+    if all(res is None for res in parts):
+        if error is not None:
+            raise error
+        return None
+    for i, res in enumerate(parts):
+        if res is None:
+            METRICS.inc("group_failures", model=model)
+            parts[i] = unevaluated_analysis(groups[i], lang)
+    return merge_analyses(parts)
+
+def evaluate(client, model, selected_ref, lang, cv_text, options, on_item=None, facts="", evidence=None, ref_hash=None):
+    """
+    Un passage d'évaluation du référentiel (requête unique ou groupes d'exigences).
+    ref_hash : empreinte de selected_ref, à ne passer que pour le référentiel complet.
+    """
+    if options["chunked"]:
+        return analyse_groups(client, model, selected_ref, lang, cv_text, options, on_item, facts, evidence)
+    with METRICS.timer("prompt"):
+        text = evidence.render(selected_ref) if evidence is not None else cv_text
+        prompt = build_prompt(selected_ref, text, lang, ref_hash, facts, evidence is not None)
+    return request_analysis(client, model, prompt, options["max_tokens"], on_item)
+
+def confidence(item):
+    try:
+        return float(item.get("confiance"))
+    except (TypeError, ValueError):
+        return 0.0
+
+def missing_ids(selected_ref, analysis):
+    """
+    Exigences du référentiel sans verdict dans analysis.
+    """
+    answered = {str(a.get("exigence_id")) for a in analysis}
+    return [req["id"] for req in iter_requirements(selected_ref) if req["id"] not in answered]
+
+def uncertain(item, threshold):
+    return normalize_status(item.get("statut")) == "CHALLENGE" or confidence(item) < threshold
+
+def escalation_ids(selected_ref, analysis, threshold):
+    """
+    Exigences à réévaluer : « à challenger », confiance sous le seuil, ou absentes de la réponse.
+    """
+    ids = [str(a["exigence_id"]) for a in analysis if uncertain(a, threshold)]
+    return list(dict.fromkeys(ids + missing_ids(selected_ref, analysis)))
+
+def analyse_cascade(client, model, selected_ref, lang, cv_text, fast_text, options, on_item=None, facts="", evidence=None, ref_hash=None):
+    """
+    Cascade : le modèle rapide évalue tout le référentiel, puis seules les exigences
+    incertaines sont réévaluées par `model` et remplacent les verdicts rapides.
+    Si le passage rapide échoue, analyse complète par `model` ; si la réévaluation
+    échoue, les verdicts rapides sont conservés (signalé dans result["cascade"]).
+    En streaming, seul le verdict final de chaque exigence est transmis à on_item : les
+    verdicts rapides incertains (réévalués) ne sont émis que si la réévaluation échoue.
+    """
+    fast_model = options["fast_model"]
+    threshold = options["escalate_below"]
+    info = {"fast_model": fast_model, "model": model, "threshold": threshold,
+            "total": sum(1 for _ in iter_requirements(selected_ref))}
+    # Seuls les verdicts sûrs du modèle rapide sont diffusés ; les autres le seront après escalade
+    fast_on_item = (lambda item: None if uncertain(item, threshold) else on_item(item)) if on_item is not None else None
+    try:
+        fast = evaluate(client, fast_model, selected_ref, lang, fast_text, options, fast_on_item, facts, evidence, ref_hash)
+    except Exception:
+        fast = None
+    if fast is None:
+        METRICS.inc("cascade_fallbacks", model=fast_model)
+        res = evaluate(client, model, selected_ref, lang, cv_text, options, on_item, facts, evidence, ref_hash)
+        if res is not None:
+            for a in res["analysis"]:
+                a["modele"] = model
+            res["cascade"] = dict(info, escalated=info["total"], escalated_ids=[], fallback=True)
+        return res
+    for a in fast["analysis"]:
+        a["modele"] = fast_model
+    ids = escalation_ids(selected_ref, fast["analysis"], threshold)
+    info.update(escalated=len(ids), escalated_ids=ids)
+    METRICS.inc("cascade_requirements", info["total"])
+    METRICS.inc("cascade_escalations", len(ids), model=model)
+    if not ids:
+        fast["cascade"] = info
+        return fast
+    res = evaluate(client, model, select_requirements(selected_ref, ids), lang, cv_text, options, on_item, facts, evidence)
+    if res is None:
+        if on_item is not None:
+            for a in fast["analysis"]:
+                if str(a["exigence_id"]) in ids:
+                    on_item(a)
+        fast["cascade"] = dict(info, escalation_failed=True)
+        return fast
+    for a in res["analysis"]:
+        a["modele"] = model
+    replaced = {str(a["exigence_id"]) for a in res["analysis"]}
+    kept = [a for a in fast["analysis"] if str(a["exigence_id"]) not in replaced]
+    merged = merge_analyses([dict(fast, analysis=kept), res])
+    merged["cascade"] = info
+    return merged
+
+def prepare_cv(model, selected_ref, name, cv_text, partial, ref_hash, options):
+    """
+    Étapes locales précédant l'appel au modèle (compaction, pré-filtrage, passages
+    pertinents). options : options complètes (DEFAULT_OPTIONS surchargées).
+    partial : texte extrait d'une partie seulement du PDF (délai dépassé).
+    """
+    with METRICS.timer("compaction"):
+        compacted, compaction = compact_cv_text(cv_text, token_budget(model))
+    callback = options["on_item"]
+    # Pré-filtrage sur le texte complet (la compaction retire des éléments utiles, ex. dates)
+    report, facts, evidence, excerpt = None, "", None, None
+    if options["prescreen"]:
+        with METRICS.timer("prescreen"):
+            report = prescreen(cv_text, selected_ref, ref_hash)
+            facts = facts_for_prompt(report)
+    if options["retrieval"] and compaction["tokens_after"] >= MIN_CV_TOKENS:
+        with METRICS.timer("retrieval"):
+            evidence = CvEvidence(compacted, selected_ref, ref_hash, options["top_k"])
+            excerpt = evidence.render(selected_ref)
+    return {
+        "name": name,
+        "cv_text": cv_text,
+        "extraction_partial": partial,
+        "compacted": compacted,
+        "compaction": compaction,
+        "on_item": (lambda item: callback(name, item)) if callback is not None else None,
+        "report": report,
+        "facts": facts,
+        "evidence": evidence,
+        "excerpt": excerpt,
+        "rejected": bool(report and report["reject"] and options["prescreen"] == "filter"),
+    }
+
+def analyse_prepared(client, model, selected_ref, lang, ctx, options, ref_hash):
+    """
+    Analyse d'un CV préparé par prepare_cv (rejet local, cascade ou évaluation simple).
+    """
+    on_item, facts, evidence = ctx["on_item"], ctx["facts"], ctx["evidence"]
+    if ctx["rejected"]:
+        METRICS.inc("prescreen_rejections")
+        res = validate_analysis(rejection_analysis(ctx["report"], selected_ref, lang))[1]
+        if on_item is not None:
+            for item in res["analysis"]:
+                on_item(item)
+    elif options["cascade"]:
+        fast_budget = token_budget(options["fast_model"])
+        # Le modèle rapide peut avoir un budget de tokens plus petit (contexte plus court)
+        fast_text = ctx["compacted"] if fast_budget >= token_budget(model) else compact_cv_text(ctx["cv_text"], fast_budget)[0]
+        res = analyse_cascade(client, model, selected_ref, lang, ctx["compacted"], fast_text, options, on_item, facts, evidence, ref_hash)
+    else:
+        res = evaluate(client, model, selected_ref, lang, ctx["compacted"], options, on_item, facts, evidence, ref_hash)
+    return finish_cv(ctx, res, selected_ref, ref_hash, options)
+
+def finish_cv(ctx, res, selected_ref, ref_hash, options):
+    """
+    Résultat final d'un CV (scores, détails, diagnostics) ; None si res est inexploitable.
+    """
+    if res is None:
+        return None
+    name, evidence = ctx["name"], ctx["evidence"]
+    analysis = res["analysis"]
+    for a in analysis:
+        a["cv"] = name
+    with METRICS.timer("scoring"):
+        score_final, ok_c, ch_c, ko_c = score_analysis(analysis, selected_ref, ref_hash, options["policy"])
+    return {
+        "nom": name,
+        "conformes": ok_c,
+        "challengers": ch_c,
+        "non_conformes": ko_c,
+        "score": round(score_final, 2),
+        "score_global": res.get("score_global", score_final),
+        "details": analysis,
+        "synthese": res.get("synthese", ""),
+        "cv_text": ctx["cv_text"],
+        "referentiel_version": ref_hash,
+        "compaction": ctx["compaction"],
+        "truncated": bool(res.get("truncated")),
+        "extraction_partial": ctx["extraction_partial"],
+        "failed_requirements": [a["exigence_id"] for a in analysis if a.get("non_evalue")],
+        "prescreen": ctx["report"],
+        "retrieval": evidence.stats(ctx["excerpt"]) if evidence is not None else None,
+        "prescreen_rejected": ctx["rejected"],
+        "cascade": res.get("cascade"),
+        "pack": res.get("pack"),
+    }
+
+def analyse_cv(client, model, selected_ref, lang, name, cv_text, ref_hash=None, options=None, partial=False):
+    # Exécuté dans un thread worker : aucun appel st.* ici
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    ref_hash = ref_hash or referential_hash(selected_ref)
+    ctx = prepare_cv(model, selected_ref, name, cv_text, partial, ref_hash, options)
+    return analyse_prepared(client, model, selected_ref, lang, ctx, options, ref_hash)
+
+# Réponse attendue par CV d'une requête groupée (réserve de tokens de sortie)
+OUTPUT_TOKENS_PER_REQUIREMENT = 120
+OUTPUT_TOKENS_PER_CANDIDATE = 200
+PACK_OVERHEAD_TOKENS = 200
+
+def pack_text(ctx):
+    # Texte envoyé pour ce CV : passages retenus (retrieval) ou texte compacté
+    return ctx["excerpt"] if ctx["evidence"] is not None else ctx["compacted"]
+
+def pack_budget(client, model):
+    """
+    Taille maximale d'une requête groupée (prompt et réponse) : fenêtre de contexte du
+    modèle, plafonnée par le quota de tokens/minute de l'ordonnanceur du client.
+    """
+    budget = context_window(model)
+    scheduler = getattr(client, "scheduler", None)
+    limit = scheduler.token_limit(model) if scheduler is not None else None
+    return min(budget, limit) if limit else budget
+
+def pack_output_tokens(selected_ref, options):
+    n_reqs = sum(1 for _ in iter_requirements(selected_ref))
+    return min(options["max_tokens"], n_reqs * OUTPUT_TOKENS_PER_REQUIREMENT + OUTPUT_TOKENS_PER_CANDIDATE)
+
+def plan_packs(client, model, selected_ref, ctxs, options, ref_hash=None):
+    """
+    Regroupe les CV courts, dans l'ordre, en paquets tenant dans une requête : préfixe,
+    CV et réponses attendues dans pack_budget, réponses dans la sortie maximale du
+    modèle, au plus pack_size CV. Renvoie des listes d'indices de ctxs ; les CV longs
+    ou rejetés localement forment des paquets d'un seul CV.
+    """
+    out_each = pack_output_tokens(selected_ref, options)
+    room = pack_budget(client, model) - estimate_tokens(compile_prompt_prefix(selected_ref, ref_hash)) - PACK_OVERHEAD_TOKENS
+    max_out = max_completion_tokens(model)
+    packs, current, used = [], [], 0
+    for i, ctx in enumerate(ctxs):
+        cv_tokens = estimate_tokens(pack_text(ctx))
+        if ctx["rejected"] or cv_tokens > options["pack_max_cv_tokens"]:
+            packs.append([i])
+            continue
+        cost = cv_tokens + estimate_tokens(ctx["facts"]) + out_each
+        if current and (len(current) >= options["pack_size"] or used + cost > room or (len(current) + 1) * out_each > max_out):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+def split_packed(parsed, ids):
+    """
+    Répartit une réponse groupée par candidat : {identifiant: résultat validé}.
+    Les candidats absents, inconnus ou sans verdict exploitable n'y figurent pas.
+    """
+    out = {}
+    entries = parsed.get("candidates") if isinstance(parsed, dict) else None
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        cid = str(entry.get("candidate_id", "")).strip()
+        if cid not in ids or cid in out:
+            continue
+        ok, res = validate_analysis(dict(entry))
+        if ok and res["analysis"]:
+            out[cid] = res
+    return out
+
+def analyse_pack(client, model, selected_ref, lang, ctxs, options, ref_hash=None):
+    """
+    Évalue plusieurs CV préparés en une seule requête, puis répartit la réponse par
+    candidat et vérifie la couverture : un CV absent de la réponse est réanalysé seul,
+    les exigences manquantes d'un CV sont réévaluées pour lui seul.
+    Renvoie [(résultat, erreur)] dans l'ordre de ctxs.
+    """
+    ids = [f"CV{i + 1}" for i in range(len(ctxs))]
+    with METRICS.timer("prompt"):
+        candidates = [(cid, pack_text(ctx), ctx["facts"], ctx["evidence"] is not None) for cid, ctx in zip(ids, ctxs)]
+        prompt = build_packed_prompt(selected_ref, candidates, lang, ref_hash)
+    max_tokens = min(max_completion_tokens(model), pack_output_tokens(selected_ref, options) * len(ctxs))
+    METRICS.inc("pack_requests", model=model)
+    METRICS.inc("pack_candidates", len(ctxs), model=model)
+    try:
+        raw = call_model(client, model, prompt, max_tokens)
+        with METRICS.timer("parse"):
+            parts = split_packed(extract_json_strict(raw), ids)
+        if not parts:
+            METRICS.inc("parse_failures", model=model)
+    except Exception:
+        # Chaque CV est alors réanalysé seul (et y obtient sa propre erreur le cas échéant)
+        parts = {}
+
+    out = []
+    for cid, ctx in zip(ids, ctxs):
+        info = {"size": len(ctxs), "candidate_id": cid}
+        res = parts.get(cid)
+        try:
+            if res is None:
+                METRICS.inc("pack_fallbacks", model=model)
+                res = evaluate(client, model, selected_ref, lang, ctx["compacted"], options, ctx["on_item"], ctx["facts"], ctx["evidence"], ref_hash)
+                info["fallback"] = True
+            else:
+                if ctx["on_item"] is not None:
+                    for item in res["analysis"]:
+                        ctx["on_item"](item)
+                missing = missing_ids(selected_ref, res["analysis"])
+                if missing:
+                    METRICS.inc("pack_repairs", len(missing), model=model)
+                    extra = evaluate(client, model, select_requirements(selected_ref, missing), lang, ctx["compacted"], options,
+                                     ctx["on_item"], ctx["facts"], ctx["evidence"])
+                    if extra is not None:
+                        res = merge_analyses([res, extra])
+                    info["repaired"] = missing
+            if res is not None:
+                res["pack"] = info
+            out.append((finish_cv(ctx, res, selected_ref, ref_hash, options), None))
+        except Exception as e:
+            out.append((None, e))
+    return out
+
+def result_cache_key(digest, ref_hash, model, lang, variant=""):
+    # variant : voir cache_variant() ; vide, les clés existantes restent valides
+    return make_key(digest, ref_hash, model, lang, PROMPT_VERSION, *([variant] if variant else []))
+
+def iter_ordered(func, items, max_workers=4):
+    """
+    Applique func(*item) à chaque élément avec au plus max_workers exécutions simultanées.
+    Génère (item, résultat, erreur) dans l'ordre d'entrée, au fil de l'eau : les éléments
+    ne sont consommés qu'à mesure que des places se libèrent (adapté aux gros volumes).
+    """
+    max_workers = max(1, int(max_workers))
+    items = iter(items)
+    pending = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            while len(pending) < max_workers * 2:
+                item = next(items, None)
+                if item is None:
+                    break
+                pending.append((item, pool.submit(func, *item)))
+            if not pending:
+                return
+            item, fut = pending.pop(0)
+            try:
+                yield item, fut.result(), None
+            except Exception as e:
+                yield item, None, e
+
+def load_cached(cache, key, name):
+    """
+    Renvoie le résultat mis en cache pour cette clé (renommé pour le fichier courant) ou None.
+    """
+    cached = cache.get(key) if cache is not None else None
+    if cache is not None:
+        METRICS.inc("cache_hits" if cached is not None else "cache_misses", cache="result")
+    if cached is not None:
+        cached["nom"] = name
+        for a in cached["details"]:
+            a["cv"] = name
+    return cached
+
+def analyse_batch(client, model, selected_ref, lang, files, max_workers=4, extractor=None, ref_hash=None, options=None):
+    """
+    Analyse plusieurs CV en parallèle (au plus max_workers appels LLM simultanés).
+    files : liste de (nom, octets PDF, empreinte). Renvoie une liste de (nom, résultat, erreur)
+    dans l'ordre d'entrée ; l'échec d'un CV n'affecte pas les autres. Avec options["pack"],
+    les CV courts sont regroupés en requêtes communes (voir analyse_packed_batch).
+    """
+    ref_hash = ref_hash or referential_hash(selected_ref)
+    if packing_enabled(options):
+        return analyse_packed_batch(client, model, selected_ref, lang, files, max_workers, extractor, ref_hash, options)
+
+    def run(name, data, digest):
+        return analyse_pdf(client, model, selected_ref, lang, name, data, extractor, digest, ref_hash, options)
+    return [(item[0], result, err) for item, result, err in iter_ordered(run, files, max_workers)]
+
+def analyse_packed_batch(client, model, selected_ref, lang, files, max_workers=4, extractor=None, ref_hash=None, options=None):
+    """
+    analyse_batch en requêtes groupées : extraction et préparation de tous les CV, puis
+    une requête par paquet (plan_packs), au plus max_workers paquets simultanés.
+    """
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    ref_hash = ref_hash or referential_hash(selected_ref)
+
+    def prepare(name, data, digest):
+        return prepare_cv(model, selected_ref, name, *extract_text(data, digest, extractor), ref_hash, options)
+
+    out, ctxs, slots = [None] * len(files), [], []
+    for i, (item, ctx, err) in enumerate(iter_ordered(prepare, files, max_workers)):
+        if err is not None:
+            out[i] = (item[0], None, err)
+        else:
+            ctxs.append(ctx)
+            slots.append(i)
+
+    def run(pack):
+        if len(pack) == 1:
+            return [(analyse_prepared(client, model, selected_ref, lang, ctxs[pack[0]], options, ref_hash), None)]
+        return analyse_pack(client, model, selected_ref, lang, [ctxs[j] for j in pack], options, ref_hash)
+
+    packs = plan_packs(client, model, selected_ref, ctxs, options, ref_hash)
+    for (pack,), results, err in iter_ordered(run, [(p,) for p in packs], max_workers):
+        for j, (result, error) in zip(pack, results or [(None, err)] * len(pack)):
+            out[slots[j]] = (ctxs[j]["name"], result, error)
+    return out
+
+def extract_text(data, digest=None, extractor=None, cache=TEXT_CACHE):
+    """
+    Texte d'un PDF, lu dans le cache disque si possible, sinon extrait via le pool
+    de processus. digest : empreinte déjà calculée du fichier (évite de le re-hacher).
+    Renvoie (texte, partial) ; un texte partiel (délai d'extraction dépassé) n'est pas mis en cache.
+    """
+    extractor = extractor or get_extractor()
+    key = make_key(digest or bytes_digest(data), extractor.max_pages)
+    cached = cache.get(key) if cache is not None else None
+    if cache is not None:
+        METRICS.inc("cache_hits" if cached is not None else "cache_misses", cache="text")
+    if cached is not None:
+        return cached["text"], False
+    with METRICS.timer("extract"):
+        cv_text, partial = extractor.extract(data)
+    if partial:
+        METRICS.inc("extraction_partial")
+    elif cache is not None:
+        cache.set(key, {"text": cv_text})
+    return cv_text, partial
+
+def analyse_pdf(client, model, selected_ref, lang, name, data, extractor=None, digest=None, ref_hash=None, options=None):
+    """
+    Extrait le texte (cache disque puis pool de processus) et analyse le CV. Appelée depuis
+    les threads d'analyse, l'extraction d'un CV se recouvre avec les appels LLM des autres.
+    """
+    cv_text, partial = extract_text(data, digest, extractor)
+    return analyse_cv(client, model, selected_ref, lang, name, cv_text, ref_hash, options, partial)
+
+def screen_pdf(client, model, selected_ref, lang, name, data, ref_hash=None, cache=RESULT_CACHE, extractor=None, options=None):
+    """
+    Chaîne complète pour un PDF : cache, extraction du texte, appel LLM, mise en cache.
+    Renvoie le résultat ou None si la réponse du modèle est inexploitable.
+    """
+    ref_hash = ref_hash or referential_hash(selected_ref)
+    digest = bytes_digest(data)
+    key = result_cache_key(digest, ref_hash, model, lang, cache_variant(options))
+    cached = load_cached(cache, key, name)
+    if cached is not None:
+        return rescore(cached, selected_ref, ref_hash, (options or {}).get("policy"))
+    result = analyse_pdf(client, model, selected_ref, lang, name, data, extractor, digest, ref_hash, options)
+    if cache is not None and cacheable(result):
+        cache.set(key, result)
+    return result
+
+def screen_batch(client, model, selected_ref, lang, files, max_workers=4, extractor=None, ref_hash=None, cache=RESULT_CACHE, options=None):
+    """
+    screen_pdf pour un lot (files : liste de (nom, octets PDF)) : les résultats en cache
+    sont relus, les autres analysés ensemble par analyse_batch (requêtes groupées avec
+    options["pack"]) puis mis en cache. Renvoie [(nom, résultat, erreur)] dans l'ordre.
+    """
+    ref_hash = ref_hash or referential_hash(selected_ref)
+    variant = cache_variant(options)
+    slots, todo, keys = [], [], []
+    for name, data in files:
+        digest = bytes_digest(data)
+        key = result_cache_key(digest, ref_hash, model, lang, variant)
+        cached = load_cached(cache, key, name)
+        if cached is not None:
+            slots.append((name, rescore(cached, selected_ref, ref_hash, (options or {}).get("policy")), None))
+            continue
+        todo.append((name, data, digest))
+        keys.append(key)
+        slots.append(len(todo) - 1)
+    analysed = analyse_batch(client, model, selected_ref, lang, todo, max_workers, extractor, ref_hash, options)
+    for key, (_, result, _) in zip(keys, analysed):
+        if cache is not None and cacheable(result):
+            cache.set(key, result)
+    return [analysed[slot] if isinstance(slot, int) else slot for slot in slots]
@@ -0,0 +1,305 @@
+import re
+from datetime import date
+
+from cache import HashMemo
+from registry import referential_hash
+from scoring import iter_requirements, strip_accents
+
+# Pré-filtrage local et déterministe, avant tout appel LLM : certaines exigences
+# sont vérifiables mécaniquement (années d'expérience, durée d'une formation HACCP
+# ou Lead Auditor, nombre d'audits réalisés). Les règles sont déduites du texte des
+# exigences, les faits sont extraits du texte du CV par expressions régulières.
+# Les verdicts sont prudents : "KO" uniquement quand le CV est clair, sinon "UNKNOWN" ;
+# seul un "KO" fondé sur une preuve positive (conclusive) peut rejeter un CV, jamais
+# une simple absence de correspondance.
+
+MONTHS = {
+    "jan": 1, "janv": 1, "janvier": 1, "january": 1, "enero": 1, "ene": 1,
+    "feb": 2, "fev": 2, "fevr": 2, "fevrier": 2, "february": 2, "febrero": 2,
+    "mar": 3, "mars": 3, "march": 3, "marzo": 3,
+    "apr": 4, "avr": 4, "avril": 4, "april": 4, "abril": 4, "abr": 4,
+    "may": 5, "mai": 5, "mayo": 5,
+    "jun": 6, "juin": 6, "june": 6, "junio": 6,
+    "jul": 7, "juil": 7, "juillet": 7, "july": 7, "julio": 7,
+    "aug": 8, "aou": 8, "aout": 8, "august": 8, "agosto": 8, "ago": 8,
+    "sep": 9, "sept": 9, "septembre": 9, "september": 9, "septiembre": 9,
+    "oct": 10, "octobre": 10, "october": 10, "octubre": 10,
+    "nov": 11, "novembre": 11, "november": 11, "noviembre": 11,
+    "dec": 12, "decembre": 12, "december": 12, "diciembre": 12, "dic": 12,
+}
+
+_MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+_DATE = rf"(?:(?:0?[1-9]|1[0-2])[/.-](?:19|20)\d{{2}}|(?:{_MONTH_NAMES})\.?\s+(?:19|20)\d{{2}}|(?:19|20)\d{{2}})"
+_NOW = r"(?:present|aujourd['’ ]?hui|a ce jour|ce jour|today|now|current|actuel(?:lement)?|en cours|actualidad|hoy|presente)"
+DATE_RANGE_RE = re.compile(rf"({_DATE})\s*(?:-|–|—|à|a|au|to|until|hasta|/)\s*({_DATE}|{_NOW})")
+_SINCE_RE = re.compile(rf"(?:depuis|since|desde)\s+({_DATE})")
+_HOURS_RE = re.compile(r"(\d{1,3})\s*(?:h\b|hrs?\b|heures?\b|hours?\b|horas?\b)")
+_DAYS_RE = re.compile(r"(\d{1,2})\s*(?:jours?\b|days?\b|dias?\b|j\b)")
+# En dessous, le texte extrait est jugé inexploitable (PDF scanné…) : aucun rejet
+MIN_TEXT_CHARS = 200
+_AUDITS_RE = re.compile(r"(?<![\d.,])(\d{1,4})(?![\d.,]?\d)\s*\+?\s*(?:[a-z0-9-]+\s+){0,3}(?:audits?|auditorias?)\b(?!\s+days)")
+# Numéro de norme juste avant le nombre (« ISO 9001 audits », « FSSC 22000 audits ») : pas un décompte
+_STANDARD_RE = re.compile(r"\b(?:iso|fssc|ifs|brc|brcgs|gfsi|nf)[\s/:-]*$")
+# Au-delà, le nombre n'est pas un décompte d'audits plausible (année, référence…)
+MAX_AUDIT_COUNT = 1000
+_YEAR_RE = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+
+COURSES = {
+    "haccp": re.compile(r"haccp"),
+    "lead_auditor": re.compile(r"lead[\s-]*audit(?:or|eur|rice)|audit(?:eur|rice)\s+principale?|lead\s+assessor|auditor\s+(?:jefe|lider)|\birca\b"),
+}
+
+_REQ_YEARS_RE = re.compile(r"(?:minimum of|at least|minimum|au moins|au minimum|minimo de|al menos)\s+(\d{1,2})\s+(?:years?|ans|anos)")
+_REQ_HOURS_RE = re.compile(r"(\d{1,3})\s*(?:hours?|heures?|horas?|h\b)")
+_REQ_AUDITS_RE = re.compile(r"(?:minimum of|at least|minimum|au moins|au minimum|minimo de|al menos)\s+(\d{1,3})\s+(?:[a-z0-9-]+\s+){0,3}(?:audits?|auditorias?)\b(?!\s+(?:days|jours))(?!.*\bper\b)")
+
+# Incrémenter à chaque modification des règles ou des extractions (clé du cache des résultats)
+PRESCREEN_VERSION = "3"
+
+MESSAGES = {
+    "reject": {
+        "fr": "Rejeté par le pré-filtrage local (sans appel IA) : exigence(s) critique(s) non satisfaite(s) : {ids}.",
+        "en": "Rejected by local pre-screening (no AI call): unmet critical requirement(s): {ids}.",
+        "es": "Rechazado por el pre-filtrado local (sin llamada a la IA): requisito(s) crítico(s) no cumplido(s): {ids}.",
+    },
+    "not_evaluated": {
+        "fr": "Non évalué (pré-filtrage local).",
+        "en": "Not evaluated (local pre-screening).",
+        "es": "No evaluado (pre-filtrado local).",
+    },
+}
+
+
+def _norm(text):
+    return strip_accents(text or "").lower()
+
+
+def parse_date(token, today=None):
+    """
+    (année, mois) d'une date de CV : "03/2019", "mars 2019", "2019", ou "présent".
+    """
+    token = _norm(token).strip()
+    if re.fullmatch(_NOW, token):
+        today = today or date.today()
+        return today.year, today.month
+    m = re.fullmatch(r"(\d{1,2})[/.-](\d{4})", token)
+    if m:
+        return int(m.group(2)), int(m.group(1))
+    m = re.fullmatch(rf"({_MONTH_NAMES})\.?\s+(\d{{4}})", token)
+    if m:
+        return int(m.group(2)), MONTHS[m.group(1)]
+    return int(token[-4:]), None
+
+
+def experience_months(text, today=None):
+    """
+    Durée couverte par les périodes datées du CV (union des intervalles, en mois) et
+    liste des périodes. Une année seule couvre janvier (début) ou décembre (fin).
+    """
+    periods = []
+    for start, end in DATE_RANGE_RE.findall(text):
+        (y1, m1), (y2, m2) = parse_date(start, today), parse_date(end, today)
+        periods.append((y1 * 12 + (m1 or 1) - 1, y2 * 12 + (m2 or 12)))
+    for start in _SINCE_RE.findall(text):
+        y1, m1 = parse_date(start, today)
+        today_ = today or date.today()
+        periods.append((y1 * 12 + (m1 or 1) - 1, today_.year * 12 + today_.month))
+    periods = sorted((a, b) for a, b in periods if b > a)
+    total, cur_a, cur_b = 0, None, None
+    for a, b in periods:
+        if cur_b is None or a > cur_b:
+            if cur_b is not None:
+                total += cur_b - cur_a
+            cur_a, cur_b = a, b
+        else:
+            cur_b = max(cur_b, b)
+    if cur_b is not None:
+        total += cur_b - cur_a
+    return total, periods
+
+
+def course_hours(text, pattern, window=80):
+    """
+    Pour une formation : (durée, mentions sans durée). Durée : None si jamais mentionnée,
+    0 si aucune durée lisible, sinon la plus grande durée (heures, ou jours × 8) trouvée
+    près d'une mention. La fenêtre s'arrête à la mention suivante (même formation ou autre) :
+    la durée d'un recyclage n'est pas attribuée à la formation citée juste avant.
+    """
+    best, undated = None, 0
+    for m in pattern.finditer(text):
+        best = best or 0
+        end = m.end() + window
+        for course in COURSES.values():
+            o = course.search(text, m.end(), end)
+            if o:
+                end = o.start()
+        # Avant la mention : seulement le segment courant (ex. « formation de 16 h HACCP »)
+        before = re.split(r"[;,.()|•]", text[max(0, m.start() - window // 4):m.start()])[-1]
+        around = before + text[m.start():end]
+        hours = [int(h) for h in _HOURS_RE.findall(around)] + [int(d) * 8 for d in _DAYS_RE.findall(around)]
+        if hours:
+            best = max(best, max(hours))
+        else:
+            undated += 1
+    return best, undated
+
+
+def audit_count(text):
+    """
+    Plus grand nombre d'audits cité, 0 si des audits sont mentionnés sans nombre,
+    None si le CV ne parle pas d'audit.
+    """
+    counts = []
+    for m in _AUDITS_RE.finditer(text):
+        n = int(m.group(1))
+        if n <= MAX_AUDIT_COUNT and not _STANDARD_RE.search(text[max(0, m.start() - 12):m.start()]):
+            counts.append(n)
+    if counts:
+        return max(counts)
+    return 0 if re.search(r"audit", text) else None
+
+
+def extract_facts(cv_text, today=None):
+    text = _norm(cv_text)
+    months, periods = experience_months(text, today)
+    years = [int(y) for y in _YEAR_RE.findall(text)]
+    courses = {name: course_hours(text, pattern) for name, pattern in COURSES.items()}
+    return {
+        "experience_years": round(months / 12, 1),
+        "periods": len(periods),
+        # Première année citée dans le CV : aucune expérience ne peut être antérieure
+        "earliest_year": min(years) if years else None,
+        "courses": {name: hours for name, (hours, _) in courses.items()},
+        # Mentions d'une formation sans durée lisible (ex. formation initiale non détaillée)
+        "courses_undated": {name: undated for name, (_, undated) in courses.items()},
+        "audit_count": audit_count(text),
+    }
+
+
+def rule_for(text):
+    """
+    Règle mécanique déduite du texte d'une exigence, ou None.
+    """
+    text = _norm(text)
+    m = _REQ_YEARS_RE.search(text)
+    if m and "experience" in text and "consult" not in text:
+        return {"kind": "experience", "min": int(m.group(1))}
+    hours = _REQ_HOURS_RE.search(text)
+    if hours:
+        for name, pattern in COURSES.items():
+            if pattern.search(text):
+                return {"kind": "course", "course": name, "min": int(hours.group(1))}
+    m = _REQ_AUDITS_RE.search(text)
+    if m:
+        return {"kind": "audits", "min": int(m.group(1))}
+    return None
+
+
+_RULES = HashMemo(64)
+
+
+def compile_rules(selected_ref, ref_hash=None):
+    """
+    Règles mécaniques du référentiel, calculées une fois par version de contenu.
+    """
+    return _RULES.get(ref_hash or referential_hash(selected_ref), lambda: _compile_rules(selected_ref))
+
+
+def _compile_rules(selected_ref):
+    rules = []
+    for req in iter_requirements(selected_ref):
+        rule = rule_for(req["text"])
+        if rule:
+            rules.append(dict(rule, exigence_id=req["id"], critical=req["critical"]))
+    return rules
+
+
+def evaluate(rule, facts, today=None):
+    """
+    (statut, détail, conclusif) d'une règle : statut "OK", "KO" ou "UNKNOWN" ; un "KO"
+    n'est conclusif que s'il repose sur une preuve positive (durée de formation lue
+    inférieure au minimum, CV dont toutes les dates sont trop récentes), et non sur
+    une mention ou une période que les expressions régulières n'auraient pas reconnue.
+    """
+    if rule["kind"] == "experience":
+        years = facts["experience_years"]
+        if not facts["periods"]:
+            return "UNKNOWN", "no dated periods found", False
+        if years >= rule["min"]:
+            return "OK", f"{years} years of dated periods (required {rule['min']})", False
+        earliest = facts.get("earliest_year")
+        span = (today or date.today()).year - earliest if earliest else None
+        return "KO", f"{years} years of dated periods (required {rule['min']})", span is not None and span < rule["min"]
+    if rule["kind"] == "course":
+        hours = facts["courses"].get(rule["course"])
+        if hours is None:
+            return "KO", f"no {rule['course']} course mentioned (required {rule['min']}h)", False
+        if hours == 0:
+            return "UNKNOWN", f"{rule['course']} course mentioned without duration", False
+        if hours >= rule["min"]:
+            return "OK", f"{rule['course']} course of {hours}h (required {rule['min']}h)", False
+        if facts.get("courses_undated", {}).get(rule["course"]):
+            # Une autre mention sans durée peut être la formation requise : au modèle d'en juger
+            return "UNKNOWN", f"{rule['course']} course of {hours}h and mention(s) without duration (required {rule['min']}h)", False
+        return "KO", f"{rule['course']} course of {hours}h (required {rule['min']}h)", True
+    count = facts["audit_count"]
+    if count is None:
+        return "KO", f"no audit mentioned (required {rule['min']})", False
+    if count == 0:
+        return "UNKNOWN", "audits mentioned without a count", False
+    # Plus grand nombre cité, pas un total : un « KO » n'est jamais conclusif
+    return ("OK" if count >= rule["min"] else "KO"), f"{count} audits cited (required {rule['min']})", False
+
+
+def prescreen(cv_text, selected_ref, ref_hash=None, today=None):
+    """
+    Pré-évaluation locale d'un CV : faits extraits, verdict par exigence vérifiable,
+    et reject=True si une exigence critique est non satisfaite de façon conclusive.
+    """
+    facts = extract_facts(cv_text, today)
+    readable = len((cv_text or "").strip()) >= MIN_TEXT_CHARS
+    verdicts = []
+    for rule in compile_rules(selected_ref, ref_hash):
+        statut, detail, conclusive = evaluate(rule, facts, today) if readable else ("UNKNOWN", "CV text too short to pre-screen", False)
+        verdicts.append({"exigence_id": rule["exigence_id"], "kind": rule["kind"], "critical": rule["critical"], "statut": statut,
+                         "detail": detail, "conclusive": conclusive})
+    return {
+        "facts": facts,
+        "verdicts": verdicts,
+        "reject": any(v["critical"] and v["statut"] == "KO" and v["conclusive"] for v in verdicts),
+    }
+
+
+def facts_for_prompt(report):
+    """
+    Bloc de faits pré-calculés ajouté au prompt (après le CV).
+    """
+    if not report["verdicts"]:
+        return ""
+    lines = ["PRE-COMPUTED FACTS (deterministic extraction from the CV; verify against the CV text):"]
+    lines += [f"- {v['exigence_id']}: {v['statut']} — {v['detail']}" for v in report["verdicts"]]
+    return "\n".join(lines)
+
+
+def rejection_analysis(report, selected_ref, lang):
+    """
+    Réponse au format du modèle pour un CV rejeté localement : les exigences en échec
+    conclusif sont non conformes, les autres restent à challenger (non évaluées).
+    """
+    failed = {v["exigence_id"]: v for v in report["verdicts"] if v["statut"] == "KO" and v.get("conclusive")}
+    analysis = []
+    for req in iter_requirements(selected_ref):
+        v = failed.get(req["id"])
+        analysis.append({
+            "exigence_id": req["id"],
+            "exigence_titre": req["title"],
+            "category_id": req["category_id"],
+            "statut": "NON CONFORME" if v else "A CHALLENGER",
+            "justification": v["detail"] if v else MESSAGES["not_evaluated"][lang],
+            "elements_cv": "",
+            "confiance": 0.9 if v else 0.0,
+            "niveau_requis": "obligatoire" if req["critical"] else "recommande",
+            "ponderation": 1.0,
+        })
+    ids = ", ".join(v["exigence_id"] for v in report["verdicts"] if v["critical"] and v["statut"] == "KO" and v.get("conclusive"))
+    return {"analysis": analysis, "score_global": 0.0, "synthese": MESSAGES["reject"][lang].format(ids=ids)}
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from pathlib import Path
+from types import MappingProxyType
+
+from cache import atomic_write_json, content_hash
+
+# Registre des référentiels partagé par toutes les sessions du processus : chaque
+# fichier est lu une fois, puis relu seulement si sa date de modification ou sa taille
+# change. Les objets sont gelés (lecture seule) et partagés sans copie ; un rerun
+# Streamlit ne coûte qu'un stat() par fichier, au plus une fois par seconde.
+
+REF_DIR = Path("referentiels")
+REFRESH_INTERVAL = 1.0
+# Historique des versions (ignoré par le registre : dossier caché, hors *.json de premier niveau)
+VERSIONS_DIRNAME = ".versions"
+
+
+class FrozenDict(dict):
+    """
+    dict en lecture seule : reste un dict pour json.dumps / isinstance, mais toute
+    modification lève TypeError. Les copies renvoient l'objet lui-même.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("referential objects are read-only; edit a JSON copy (json.loads(json.dumps(ref)))")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(value):
+    """
+    Copie gelée d'un objet JSON : dicts -> FrozenDict, listes -> tuples.
+    """
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class ReferentialRegistry:
+    """
+    Référentiels JSON d'un dossier. snapshot() renvoie une vue en lecture seule
+    {nom: référentiel gelé}, reconstruite uniquement quand un fichier change.
+    L'empreinte du contenu est calculée au chargement (voir referential_hash).
+    """
+
+    def __init__(self, ref_dir=REF_DIR, interval=REFRESH_INTERVAL):
+        self.ref_dir = Path(ref_dir)
+        self.interval = interval
+        self.entries = {}        # nom -> (mtime_ns, taille, référentiel gelé)
+        self.errors = {}         # nom -> (signature du fichier, message d'erreur)
+        self.checked = 0.0
+        self.view = MappingProxyType({})
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """
+        Relit les fichiers ajoutés ou modifiés, oublie les fichiers supprimés.
+        Sans force, au plus une vérification par intervalle.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.checked < self.interval:
+                return self.view
+            self.checked = now
+            seen, changed = set(), False
+            files = sorted(self.ref_dir.glob("*.json")) if self.ref_dir.exists() else []
+            for file in files:
+                name = file.stem
+                try:
+                    st = file.stat()
+                except OSError:
+                    continue
+                signature = (st.st_mtime_ns, st.st_size)
+                seen.add(name)
+                entry = self.entries.get(name)
+                if entry is not None and entry[:2] == signature:
+                    continue
+                if name in self.errors and self.errors[name][0] == signature:
+                    continue
+                changed = True
+                try:
+                    with open(file, encoding="utf-8") as f:
+                        data = json.load(f)
+                except Exception as e:
+                    self.entries.pop(name, None)
+                    self.errors[name] = (signature, f"{file}: {e}")
+                    continue
+                self.errors.pop(name, None)
+                if isinstance(data, dict) and ("exigences" in data or "categories" in data):
+                    frozen = freeze(data)
+                    frozen.content_hash = content_hash(data)
+                    self.entries[name] = signature + (frozen,)
+                else:
+                    # Fichier JSON d'un autre format : ignoré, mais mémorisé pour ne pas le relire
+                    self.entries.pop(name, None)
+                    self.errors[name] = (signature, None)
+            for name in set(self.entries) - seen:
+                del self.entries[name]
+                changed = True
+            for name in set(self.errors) - seen:
+                del self.errors[name]
+            if changed:
+                self.view = MappingProxyType({name: entry[2] for name, entry in sorted(self.entries.items())})
+            return self.view
+
+    def snapshot(self):
+        return self.refresh()
+
+    def error_messages(self):
+        return [message for _, message in self.errors.values() if message]
+
+
+def referential_hash(selected_ref):
+    """
+    Empreinte du contenu d'un référentiel : précalculée pour ceux du registre.
+    """
+    return getattr(selected_ref, "content_hash", None) or content_hash(selected_ref)
+
+
+_REGISTRIES = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(ref_dir=REF_DIR):
+    """
+    Registre partagé du dossier (un seul par processus et par dossier).
+    """
+    key = os.path.abspath(ref_dir)
+    with _registries_lock:
+        if key not in _REGISTRIES:
+            _REGISTRIES[key] = ReferentialRegistry(ref_dir)
+        return _REGISTRIES[key]
+
+
+def safe_referential_name(filename):
+    name = filename.strip().replace(" ", "_").replace("/", "_").replace("\\", "_")
+    return name[:-5] if name.endswith(".json") else name
+
+
+class ReferentialStore:
+    """
+    Écriture versionnée des référentiels. Chaque version est identifiée par
+    l'empreinte de son contenu et conservée telle quelle sous .versions/<nom>/ ;
+    index.json liste, par référentiel, les versions enregistrées (empreinte, date,
+    taille). Toutes les écritures sont atomiques (fichier temporaire + rename) :
+    les sessions qui lisent en parallèle ne voient jamais de fichier partiel.
+    """
+
+    def __init__(self, ref_dir=REF_DIR):
+        self.ref_dir = Path(ref_dir)
+        self.versions_dir = self.ref_dir / VERSIONS_DIRNAME
+        self.index_path = self.versions_dir / "index.json"
+        self.lock = threading.Lock()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _archive(self, index, name, data, digest):
+        # Une version déjà archivée (même contenu) n'est ni réécrite ni dupliquée
+        folder = self.versions_dir / name
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"{digest}.json"
+        if not path.exists():
+            atomic_write_json(path, data, indent=2)
+        history = index.setdefault(name, [])
+        if not history or history[-1]["hash"] != digest:
+            history.append({"hash": digest, "saved_at": datetime.now().isoformat(timespec="seconds"), "bytes": path.stat().st_size})
+
+    def save(self, data, filename):
+        """
+        Enregistre le référentiel sous <nom>.json et l'archive comme nouvelle version.
+        La version remplacée est archivée au passage si elle ne l'était pas encore.
+        Renvoie (nom, empreinte).
+        """
+        name = safe_referential_name(filename)
+        digest = referential_hash(data)
+        target = self.ref_dir / f"{name}.json"
+        with self.lock:
+            self.ref_dir.mkdir(parents=True, exist_ok=True)
+            index = self._read_index()
+            if target.exists():
+                try:
+                    with open(target, encoding="utf-8") as f:
+                        previous = json.load(f)
+                    self._archive(index, name, previous, content_hash(previous))
+                except (OSError, ValueError):
+                    pass
+            self._archive(index, name, data, digest)
+            atomic_write_json(target, data, indent=2)
+            atomic_write_json(self.index_path, index, indent=2)
+        return name, digest
+
+    def versions(self, name):
+        """
+        Versions enregistrées d'un référentiel, de la plus récente à la plus ancienne.
+        """
+        return list(reversed(self._read_index().get(name, [])))
+
+    def load_version(self, name, digest):
+        with open(self.versions_dir / name / f"{digest}.json", encoding="utf-8") as f:
+            return json.load(f)
+
+    def restore(self, name, digest):
+        return self.save(self.load_version(name, digest), name)
+
+
+_STORES = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(ref_dir=REF_DIR):
+    """
+    Magasin partagé du dossier (un verrou d'écriture par processus et par dossier).
+    """
+    key = os.path.abspath(ref_dir)
+    with _stores_lock:
+        if key not in _STORES:
+            _STORES[key] = ReferentialStore(ref_dir)
+        return _STORES[key]
@@ -0,0 +1,132 @@
+import re
+import math
+from collections import Counter
+
+from cache import HashMemo
+from compaction import estimate_tokens
+from prescreen import DATE_RANGE_RE
+from registry import referential_hash
+from scoring import iter_requirements, strip_accents
+
+# Sélection des passages pertinents du CV pour chaque exigence (BM25 local, sans
+# dépendance) : le CV est découpé en passages, chaque exigence devient une requête
+# (texte, critères, minimum acceptable) et seuls les meilleurs passages sont envoyés
+# au modèle. En mode découpé, chaque groupe d'exigences ne reçoit que ses passages.
+
+PASSAGE_WORDS = 60
+TOP_K = 3
+# En dessous, le CV est envoyé entier : la sélection n'économiserait presque rien
+MIN_CV_TOKENS = 800
+# Lignes datées (postes) hors passages retenus : début de ligne conservé dans la chronologie
+TIMELINE_WORDS = 12
+K1 = 1.5
+B = 0.75
+
+_WORD_RE = re.compile(r"[a-z0-9]{3,}")
+STOPWORDS = set("""
+the and for with shall must have has from that this are been least minimum years year which will into
+les des une pour par dans avec sur aux est sont qui que ses son leur ans plus etre doit
+los las del con por para una que sus este esta son anos
+""".split())
+
+
+def tokenize(text):
+    return [w for w in _WORD_RE.findall(strip_accents(text or "").lower()) if w not in STOPWORDS]
+
+
+def split_passages(text, max_words=PASSAGE_WORDS):
+    """
+    Découpe le CV en passages d'au plus max_words mots, en regroupant les lignes
+    consécutives (sections, postes) ; une ligne trop longue est coupée en fenêtres.
+    """
+    passages, current, count = [], [], 0
+    for line in (text or "").split("\n"):
+        words = line.split()
+        if not words:
+            continue
+        if count and count + len(words) > max_words:
+            passages.append(" ".join(current))
+            current, count = [], 0
+        while len(words) > max_words:
+            passages.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        current.extend(words)
+        count += len(words)
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class BM25:
+    """
+    Index BM25 d'une liste de passages.
+    """
+
+    def __init__(self, passages, k1=K1, b=B):
+        self.k1, self.b = k1, b
+        self.tf = [Counter(tokenize(p)) for p in passages]
+        self.lengths = [sum(tf.values()) for tf in self.tf]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter(term for tf in self.tf for term in tf)
+        n = len(self.tf)
+        self.idf = {term: math.log(1 + (n - d + 0.5) / (d + 0.5)) for term, d in df.items()}
+
+    def scores(self, query_terms):
+        out = []
+        for tf, length in zip(self.tf, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            out.append(sum(self.idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t in query_terms if t in tf))
+        return out
+
+    def top(self, query_terms, k=TOP_K):
+        scores = self.scores(query_terms)
+        ranked = sorted(range(len(scores)), key=lambda i: -scores[i])
+        return [i for i in ranked[:k] if scores[i] > 0]
+
+
+_QUERIES = HashMemo(64)
+
+
+def requirement_queries(selected_ref, ref_hash=None):
+    """
+    {id d'exigence: termes de la requête}, calculé une fois par version du référentiel.
+    """
+    return _QUERIES.get(ref_hash or referential_hash(selected_ref),
+                        lambda: {req["id"]: set(tokenize(req["text"])) for req in iter_requirements(selected_ref)})
+
+
+class CvEvidence:
+    """
+    Passages du CV retenus par exigence. render(référentiel ou sous-référentiel)
+    produit le texte envoyé au modèle : l'en-tête du CV (premier passage), les
+    passages retenus pour ses exigences dans l'ordre du document, puis la chronologie
+    des autres lignes datées (pour que la durée d'expérience reste évaluable).
+    """
+
+    def __init__(self, cv_text, selected_ref, ref_hash=None, top_k=TOP_K):
+        self.passages = split_passages(cv_text)
+        index = BM25(self.passages)
+        self.selection = {req_id: index.top(terms, top_k) for req_id, terms in requirement_queries(selected_ref, ref_hash).items()}
+        self.tokens_before = estimate_tokens(cv_text)
+        self.timeline = []
+        for line in (cv_text or "").split("\n"):
+            if DATE_RANGE_RE.search(strip_accents(line).lower()):
+                self.timeline.append(" ".join(line.split()[:TIMELINE_WORDS]))
+
+    def render(self, selected_ref):
+        ids = [req["id"] for req in iter_requirements(selected_ref)]
+        keep = sorted({0} | {i for req_id in ids for i in self.selection.get(req_id, [])}) if self.passages else []
+        lines = [f"[P{i + 1}] {self.passages[i]}" for i in keep]
+        shown = " ".join(self.passages[i] for i in keep)
+        timeline = [t for t in self.timeline if t not in shown]
+        if timeline:
+            lines.append("[TIMELINE] " + " | ".join(timeline))
+        return "\n".join(lines)
+
+    def stats(self, rendered):
+        return {
+            "passages": len(self.passages),
+            "selected": rendered.count("[P"),
+            "tokens_before": self.tokens_before,
+            "tokens_after": estimate_tokens(rendered),
+        }
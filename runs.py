@@ -0,0 +1,126 @@
+import json
+import hashlib
+import secrets
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from cache import CACHE_DIR, atomic_write_json
+
+# Historique des analyses : chaque lot analysé est enregistré sous un identifiant de
+# run (résultats complets + métadonnées légères), pour être ré-affiché après un rerun
+# Streamlit, un rechargement de page ou un redémarrage, sans nouvel appel LLM.
+# Chaque run appartient à la clé API qui l'a lancé (à défaut, à la session) : une
+# autre session ne peut ni le lister ni l'ouvrir, même avec son identifiant
+# (?run=<id>), sauf en mode admin. Le texte brut des CV n'est conservé que sur demande.
+
+RUNS_DIR = CACHE_DIR / "runs"
+MAX_RUNS = 200
+
+
+def new_run_id():
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+def run_owner(api_key=None, session_id=None):
+    """
+    Propriétaire d'un run : empreinte de la clé API (runs partagés par les sessions de
+    la même clé), sinon identifiant de la session.
+    """
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+    return f"session:{session_id}" if session_id else None
+
+
+def strip_text(results):
+    return [{k: v for k, v in r.items() if k != "cv_text"} for r in results]
+
+
+def visible(meta, owner, admin=False):
+    # Runs sans propriétaire (enregistrés avant le cloisonnement) : admin seulement
+    return admin or (owner is not None and meta.get("owner") == owner)
+
+
+class RunStore:
+    """
+    Un fichier <id>.json par run (résultats) et un fichier <id>.meta.json (date,
+    référentiel, modèle, langue, nombre de candidats) lu seul pour lister les runs.
+    Écritures atomiques ; au-delà de max_runs, les plus anciens sont supprimés.
+    """
+
+    def __init__(self, directory=RUNS_DIR, max_runs=MAX_RUNS):
+        self.directory = Path(directory)
+        self.max_runs = max_runs
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def save(self, results, owner=None, keep_text=False, **meta):
+        """
+        Enregistre un run ; meta : referential, ref_hash, model, lang, options…
+        Le texte brut des CV n'est écrit que si keep_text. Renvoie les métadonnées
+        complétées (id, owner, created_at, candidates).
+        """
+        run_id = new_run_id()
+        meta = dict(meta, id=run_id, owner=owner, created_at=datetime.now().isoformat(timespec="seconds"), candidates=len(results))
+        stored = results if keep_text else strip_text(results)
+        atomic_write_json(self.directory / f"{run_id}.json", {"meta": meta, "results": stored})
+        atomic_write_json(self.directory / f"{run_id}.meta.json", meta)
+        self.prune()
+        return meta
+
+    def load(self, run_id, owner=None, admin=False):
+        """
+        {"meta": ..., "results": [...]} ou None si le run n'existe pas (ou plus) ou
+        n'appartient pas à owner (admin : tous les runs).
+        """
+        if not run_id or "/" in run_id or "\\" in run_id:
+            return None
+        try:
+            with open(self.directory / f"{run_id}.json", encoding="utf-8") as f:
+                run = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return run if visible(run["meta"], owner, admin) else None
+
+    def list_runs(self, owner=None, admin=False):
+        """
+        Métadonnées des runs de owner (admin : tous), du plus récent au plus ancien.
+        """
+        return [meta for meta in self.all_runs() if visible(meta, owner, admin)]
+
+    def all_runs(self):
+        runs = []
+        for path in self.directory.glob("*.meta.json"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    runs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(runs, key=lambda m: m.get("id", ""), reverse=True)
+
+    def delete(self, run_id):
+        for path in (self.directory / f"{run_id}.json", self.directory / f"{run_id}.meta.json"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def prune(self):
+        with self.lock:
+            for meta in self.all_runs()[self.max_runs:]:
+                self.delete(meta["id"])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_run_store():
+    """
+    Historique partagé par toutes les sessions du processus.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RunStore()
+        return _store
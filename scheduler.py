@@ -0,0 +1,328 @@
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+
+from compaction import estimate_tokens
+from metrics import METRICS
+
+# Ordonnanceur placé devant client.chat.completions.create : suit l'en-tête retry-after
+# et réessaie les erreurs transitoires avec un backoff exponentiel « jitteré ». Par
+# défaut il est réactif : aucun quota supposé, les quotas réels du compte sont lus dans
+# les en-têtes x-ratelimit-* des réponses (restant, remise à zéro) et les appels qui
+# les dépasseraient attendent leur tour. Des quotas proactifs (requêtes et tokens par
+# minute, par modèle) peuvent être imposés : LLM_RATE_LIMITS, --rate-limits ou la
+# barre latérale (voir parse_limits).
+
+# Quotas du plan gratuit Groq (requêtes/minute, tokens/minute), appliqués avec "free"
+MODEL_LIMITS = {
+    "openai/gpt-oss-120b": (30, 8000),
+    "llama-3.3-70b-versatile": (30, 12000),
+    "meta-llama/llama-4-maverick-17b-128e-instruct": (30, 6000),
+    "moonshotai/kimi-k2-instruct-0905": (60, 10000),
+    "llama-3.1-8b-instant": (30, 6000),
+}
+DEFAULT_LIMITS = (30, 6000)
+# Quotas proactifs par défaut : "" (réactif), "free" ou "modele=rpm:tpm,...,*=rpm:tpm"
+RATE_LIMITS = os.environ.get("LLM_RATE_LIMITS", "")
+
+# Tokens de réponse réservés par requête avant de connaître la consommation réelle
+EXPECTED_COMPLETION_TOKENS = 1500
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectionError", "TimeoutError"}
+
+
+class TokenBucket:
+    """
+    Seau à jetons rechargé en continu (capacity jetons par `period` secondes).
+    acquire() bloque jusqu'à disponibilité ; adjust() corrige a posteriori une
+    réservation (le niveau peut devenir négatif, ce qui retarde les suivants).
+    """
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1.0):
+        amount = min(float(amount), self.capacity)
+        with self.cond:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                self.cond.wait((amount - self.level) / self.rate)
+
+    def adjust(self, delta):
+        with self.cond:
+            self._refill()
+            self.level = min(self.capacity, self.level - delta)
+            self.cond.notify_all()
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value):
+    """
+    Durée d'un en-tête de quota en secondes : "12", "7.66s", "2m59.56s", "6ms". None si illisible.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    parts = _DURATION_RE.findall(str(value or ""))
+    return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+
+def header_int(headers, name):
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+class ModelLimiter:
+    """
+    Quotas d'un modèle : seaux à jetons si des quotas sont configurés, et consommation
+    réelle du compte lue dans les en-têtes x-ratelimit-* (restant jusqu'à la remise à
+    zéro, décompté localement entre deux réponses).
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.token_limit = tpm
+        self.paused_until = 0.0
+        self.remaining = {}  # "requests" / "tokens" -> [restant, instant de remise à zéro]
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        # Un 429 suspend tous les appels du modèle, pas seulement celui qui l'a reçu
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe(self, headers):
+        """
+        Met à jour les quotas à partir des en-têtes x-ratelimit-* d'une réponse.
+        """
+        if not headers or not hasattr(headers, "get"):
+            return
+        now = time.monotonic()
+        with self.lock:
+            limit = header_int(headers, "x-ratelimit-limit-tokens")
+            if limit:
+                self.token_limit = limit
+            for kind in ("requests", "tokens"):
+                remaining = header_int(headers, f"x-ratelimit-remaining-{kind}")
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if remaining is not None and reset is not None:
+                    self.remaining[kind] = [remaining, now + reset]
+
+    def _reserve(self, amounts):
+        # Délai avant que le quota restant annoncé couvre la requête (0 : réservé)
+        now = time.monotonic()
+        with self.lock:
+            delay = self.paused_until - now
+            for kind, amount in amounts.items():
+                state = self.remaining.get(kind)
+                if state is None or state[1] <= now:
+                    self.remaining.pop(kind, None)
+                elif state[0] < amount:
+                    delay = max(delay, state[1] - now)
+            if delay > 0:
+                return delay
+            for kind, amount in amounts.items():
+                if kind in self.remaining:
+                    self.remaining[kind][0] -= amount
+            return 0
+
+    def wait(self, tokens):
+        while True:
+            delay = self._reserve({"requests": 1, "tokens": tokens})
+            if delay <= 0:
+                break
+            time.sleep(delay)
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None:
+            self.tokens.acquire(tokens)
+
+
+def retry_after_seconds(exc):
+    """
+    Délai demandé par le serveur (en-tête retry-after, en secondes), ou None.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc):
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status in RETRYABLE_STATUS or type(exc).__name__ in RETRYABLE_ERRORS
+
+
+def parse_limits(spec):
+    """
+    Quotas proactifs (model_limits, default_limits) d'une configuration texte :
+    "" (aucun, réactif), "free" (plan gratuit Groq) ou
+    "openai/gpt-oss-120b=1000:250000,*=300:60000" (requêtes:tokens par minute, * = autres modèles).
+    ValueError si la configuration est illisible.
+    """
+    spec = (spec or "").strip()
+    if spec.lower() in ("", "auto", "none"):
+        return {}, None
+    if spec.lower() == "free":
+        return dict(MODEL_LIMITS), DEFAULT_LIMITS
+    model_limits, default_limits = {}, None
+    for item in spec.split(","):
+        model, sep, values = item.strip().rpartition("=")
+        rpm, sep2, tpm = values.partition(":")
+        if not sep or not sep2 or not model.strip():
+            raise ValueError(f"invalid rate limit {item.strip()!r} (expected model=rpm:tpm)")
+        limits = (int(rpm), int(tpm))
+        if model.strip() == "*":
+            default_limits = limits
+        else:
+            model_limits[model.strip()] = limits
+    return model_limits, default_limits
+
+
+class RateLimitScheduler:
+    """
+    Applique les quotas par modèle et les réessais à une fonction `create`
+    compatible avec chat.completions.create. Sans quota configuré (par défaut), seuls
+    les en-têtes x-ratelimit-* des réponses et les 429 règlent le débit.
+    """
+
+    def __init__(self, limits=None, max_retries=6, base_delay=1.0, max_delay=60.0, model_limits=None, default_limits=None):
+        self.limits = dict(model_limits or {}, **(limits or {}))
+        self.default_limits = default_limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiters = {}
+        self.lock = threading.Lock()
+        self.retries = 0
+
+    def limiter(self, model):
+        with self.lock:
+            if model not in self.limiters:
+                self.limiters[model] = ModelLimiter(*(self.limits.get(model, self.default_limits) or ()))
+            return self.limiters[model]
+
+    def observe(self, model, headers):
+        self.limiter(model).observe(headers)
+
+    def token_limit(self, model):
+        """
+        Quota de tokens/minute du modèle (annoncé par le fournisseur, sinon configuré ;
+        None si inconnu) : une requête plus grosse ne pourrait jamais passer.
+        """
+        return self.limiter(model).token_limit
+
+    def backoff(self, attempt):
+        # Backoff exponentiel avec « full jitter »
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, create, **kwargs):
+        limiter = self.limiter(kwargs.get("model"))
+        prompt = " ".join(str(m.get("content", "")) for m in kwargs.get("messages", []))
+        reserved = estimate_tokens(prompt) + min(kwargs.get("max_tokens") or EXPECTED_COMPLETION_TOKENS, EXPECTED_COMPLETION_TOKENS)
+        attempt = 0
+        while True:
+            with METRICS.timer("rate_limit_wait", model=kwargs.get("model")):
+                limiter.wait(reserved)
+            try:
+                response = create(**kwargs)
+            except Exception as e:
+                limiter.observe(getattr(getattr(e, "response", None), "headers", None))
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is not None:
+                    limiter.pause(delay)
+                else:
+                    delay = self.backoff(attempt)
+                with self.lock:
+                    self.retries += 1
+                METRICS.inc("llm_retries", model=kwargs.get("model"))
+                attempt += 1
+                time.sleep(delay)
+                continue
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", None)
+            if used is not None and limiter.tokens is not None:
+                limiter.tokens.adjust(used - reserved)
+            return response
+
+
+class ScheduledClient:
+    """
+    Enveloppe un client Groq/OpenAI : chat.completions.create passe par l'ordonnanceur,
+    les autres attributs sont délégués au client d'origine. Quand le client expose
+    with_raw_response (SDK, clients maison), les en-têtes de quota de chaque réponse
+    sont transmis à l'ordonnanceur.
+    """
+
+    def __init__(self, client, scheduler=None):
+        self._client = client
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        completions = self._client.chat.completions
+        raw = getattr(completions, "with_raw_response", None)
+        if raw is None:
+            return self.scheduler.call(completions.create, **kwargs)
+
+        def create(**kw):
+            response = raw.create(**kw)
+            self.scheduler.observe(kw.get("model"), response.headers)
+            return response.parse()
+        return self.scheduler.call(create, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def make_scheduler(spec=RATE_LIMITS, max_retries=6):
+    """
+    Ordonnanceur pour une configuration de quotas (voir parse_limits).
+    """
+    model_limits, default_limits = parse_limits(spec)
+    return RateLimitScheduler(max_retries=max_retries, model_limits=model_limits, default_limits=default_limits)
+
+
+def shared_scheduler(api_key, spec=RATE_LIMITS):
+    """
+    Ordonnanceur partagé par toutes les sessions utilisant la même clé API et la même
+    configuration de quotas (les quotas Groq s'appliquent à l'organisation, pas à la session).
+    """
+    key = (hashlib.sha256((api_key or "").encode("utf-8")).hexdigest(), (spec or "").strip())
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = make_scheduler(spec)
+        return _schedulers[key]
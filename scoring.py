@@ -0,0 +1,232 @@
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from cache import HashMemo
+from registry import referential_hash
+
+# Moteur de scoring vectorisé : la hiérarchie de pondérations d'un référentiel
+# (catégorie -> sous-catégorie -> exigence) est compilée une fois en tableaux,
+# puis tous les candidats × exigences sont notés en une passe NumPy/pandas.
+# Changer de politique de pondération ne demande qu'un recalcul, sans appel LLM.
+
+STATUS_INDEX = {"OK": 0, "CHALLENGE": 1, "KO": 2}
+
+
+def strip_accents(s):
+    return "".join(c for c in unicodedata.normalize("NFD", s or "") if unicodedata.category(c) != "Mn")
+
+
+def normalize_status(raw):
+    if not raw:
+        return "CHALLENGE"
+    # Idempotente (les statuts déjà normalisés sont conservés) ; "NON_COMPLIANT" == "NON COMPLIANT"
+    s = strip_accents(str(raw)).upper().replace("_", " ").strip()
+    mapping = {
+        "KO": "KO",
+        "CHALLENGE": "CHALLENGE",
+        "CONFORME": "OK",
+        "COMPLIANT": "OK",
+        "CUMPLE": "OK",
+        "OK": "OK",
+        "A CHALLENGER": "CHALLENGE",
+        "A REVOIR": "CHALLENGE",
+        "A VERIFIER": "CHALLENGE",
+        "TO REVIEW": "CHALLENGE",
+        "REVIEW": "CHALLENGE",
+        "TO CHALLENGE": "CHALLENGE",
+        "A REVISAR": "CHALLENGE",
+        "POR REVISAR": "CHALLENGE",
+        "NON CONFORME": "KO",
+        "NON-COMPLIANT": "KO",
+        "NON COMPLIANT": "KO",
+        "NOT COMPLIANT": "KO",
+        "NO CUMPLE": "KO",
+        "INCUMPLE": "KO",
+    }
+    return mapping.get(s, "CHALLENGE")
+
+
+DEFAULT_POLICY = {
+    "hierarchy": True,          # pondérations catégorie × sous-catégorie du référentiel
+    "challenge_factor": 0.5,    # part du crédit accordée à une exigence « à challenger »
+    "use_confidence": True,     # crédit multiplié par la confiance du modèle
+}
+
+_COMPILED = HashMemo(64)
+
+
+def compile_weights(selected_ref, ref_hash=None):
+    """
+    Tableaux du référentiel : identifiants des exigences, poids effectifs (normalisés
+    à 1) et indicateur « critique ». Forme "categories" : poids catégorie × poids
+    sous-catégorie, réparti entre les exigences de la sous-catégorie. Forme
+    "exigences" : champ ponderation. Mis en cache par empreinte du contenu.
+    """
+    return _COMPILED.get(ref_hash or referential_hash(selected_ref), lambda: _compile_weights(selected_ref))
+
+
+def _compile_weights(selected_ref):
+    ids, weights, critical = [], [], []
+    if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict) and selected_ref["exigences"]:
+        for req_id, req in selected_ref["exigences"].items():
+            ids.append(str(req_id))
+            weights.append(_as_float(req.get("ponderation", 1.0), 1.0))
+            critical.append(str(req.get("niveau_requis", "")).lower() in ("obligatoire", "mandatory", "obligatorio"))
+    else:
+        for cat_data in selected_ref.get("categories", {}).values():
+            cat_w = _as_float(cat_data.get("weight", 0), 0.0)
+            for sub_data in cat_data.get("subcategories", {}).values():
+                reqs = sub_data.get("requirements", [])
+                sub_w = _as_float(sub_data.get("weight", 0), 0.0)
+                for req in reqs:
+                    ids.append(str(req.get("id", "N/A")))
+                    weights.append(cat_w * sub_w / len(reqs))
+                    critical.append(bool(req.get("critical", False)))
+    weights = np.asarray(weights, dtype=float)
+    if weights.size and weights.sum() <= 0:
+        # Référentiel sans pondérations renseignées (ex. template) : poids uniformes
+        weights = np.ones_like(weights)
+    if weights.size:
+        weights = weights / weights.sum()
+    return {
+        "ids": ids,
+        "index": {req_id: i for i, req_id in enumerate(ids)},
+        "weights": weights,
+        "critical": np.asarray(critical, dtype=bool),
+    }
+
+
+def iter_requirements(selected_ref):
+    """
+    Exigences d'un référentiel, quelle que soit sa forme : dicts id, title, text
+    (texte complet utile à l'analyse), category_id et critical.
+    """
+    if "exigences" in selected_ref and isinstance(selected_ref["exigences"], dict) and selected_ref["exigences"]:
+        for req_id, req in selected_ref["exigences"].items():
+            yield {
+                "id": str(req_id),
+                "title": req.get("title", ""),
+                "text": " ".join([req.get("title", ""), req.get("description", "")] + list(req.get("criteres", []))),
+                "category_id": "",
+                "critical": str(req.get("niveau_requis", "")).lower() in ("obligatoire", "mandatory", "obligatorio"),
+            }
+        return
+    for cat, cat_data in selected_ref.get("categories", {}).items():
+        for sub, sub_data in cat_data.get("subcategories", {}).items():
+            for req in sub_data.get("requirements", []):
+                yield {
+                    "id": str(req.get("id", "N/A")),
+                    "title": req.get("text", ""),
+                    "text": f"{req.get('text', '')} {req.get('minimum_acceptable', '')}",
+                    "category_id": f"{cat}/{sub}",
+                    "critical": bool(req.get("critical", False)),
+                }
+
+
+def _as_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def items_frame(analyses):
+    """
+    Aplatis les analyses (une liste d'items par candidat) en un DataFrame long :
+    candidat, exigence, statut (0/1/2), confiance, pondération.
+    """
+    rows = [
+        (c, str(it.get("exigence_id", "")), STATUS_INDEX.get(normalize_status(it.get("statut")), 1),
+         _as_float(it.get("confiance", 0) or 0, 0.0), _as_float(it.get("ponderation", 1.0) or 1.0, 1.0))
+        for c, analysis in enumerate(analyses) for it in analysis
+    ]
+    return pd.DataFrame(rows, columns=["candidate", "exigence_id", "status", "confiance", "ponderation"])
+
+
+def item_credit(df, policy):
+    """
+    Crédit (0..1) de chaque item de items_frame selon la politique : conforme 1,
+    à challenger challenge_factor, non conforme 0, modulé par la confiance si use_confidence.
+    """
+    status = df["status"].to_numpy()
+    credit = np.select([status == 0, status == 1], [1.0, policy["challenge_factor"]], 0.0)
+    if policy["use_confidence"]:
+        credit = credit * df["confiance"].to_numpy()
+    return credit
+
+
+def score_candidates(analyses, compiled=None, policy=None):
+    """
+    Note tous les candidats d'un coup. Renvoie un DataFrame indexé par position du
+    candidat : score (0..1), conformes, challengers, non_conformes, critiques_ko.
+    Sans référentiel compilé (ou si policy["hierarchy"] est faux), chaque item est
+    pondéré par son champ ponderation, comme le calcul historique.
+    """
+    policy = dict(DEFAULT_POLICY, **(policy or {}))
+    df = items_frame(analyses)
+    n = len(analyses)
+    out = pd.DataFrame({"score": 0.0, "conformes": 0, "challengers": 0, "non_conformes": 0, "critiques_ko": 0}, index=pd.RangeIndex(n))
+    if df.empty:
+        return out
+
+    status = df["status"].to_numpy()
+    credit = item_credit(df, policy)
+
+    weight = df["ponderation"].to_numpy()
+    critical = np.zeros(len(df), dtype=bool)
+    if compiled is not None and compiled["ids"]:
+        pos = df["exigence_id"].map(compiled["index"]).to_numpy(dtype=float)
+        known = ~np.isnan(pos)
+        idx = np.where(known, pos, 0).astype(int)
+        critical = known & compiled["critical"][idx]
+        if policy["hierarchy"] and known.any():
+            # Exigences hors référentiel : poids moyen d'une exigence connue
+            weight = np.where(known, compiled["weights"][idx], compiled["weights"].mean())
+
+    cand = df["candidate"].to_numpy()
+    earned = np.bincount(cand, weights=weight * credit, minlength=n)
+    total = np.bincount(cand, weights=weight, minlength=n)
+    out["score"] = np.divide(earned, total, out=np.zeros(n), where=total > 0)
+    for col, code in (("conformes", 0), ("challengers", 1), ("non_conformes", 2)):
+        out[col] = np.bincount(cand, weights=(status == code), minlength=n).astype(int)
+    out["critiques_ko"] = np.bincount(cand, weights=(status == 2) & critical, minlength=n).astype(int)
+    return out
+
+
+def requirement_matrix(analyses, names, compiled=None, policy=None):
+    """
+    Matrice candidats × exigences du crédit obtenu (0..1), pour les comparaisons visuelles,
+    calculé comme dans score_candidates (mêmes options de la politique).
+    """
+    policy = dict(DEFAULT_POLICY, **(policy or {}))
+    df = items_frame(analyses)
+    if df.empty:
+        return pd.DataFrame(index=list(names))
+    df["credit"] = item_credit(df, policy)
+    matrix = df.pivot_table(index="candidate", columns="exigence_id", values="credit", aggfunc="mean")
+    if compiled is not None:
+        ordered = [i for i in compiled["ids"] if i in matrix.columns]
+        matrix = matrix[ordered + [c for c in matrix.columns if c not in compiled["index"]]]
+    matrix = matrix.reindex(range(len(names)))
+    matrix.index = list(names)
+    return matrix
+
+
+def apply_scores(results, selected_ref=None, policy=None, ref_hash=None):
+    """
+    Recalcule en place score et compteurs de chaque résultat (liste de dicts produits
+    par analyse_cv) selon la politique de pondération.
+    """
+    if not results:
+        return results
+    compiled = compile_weights(selected_ref, ref_hash) if selected_ref is not None else None
+    scores = score_candidates([r["details"] for r in results], compiled, policy)
+    for r, row in zip(results, scores.itertuples(index=False)):
+        r["score"] = round(float(row.score), 2)
+        r["conformes"] = int(row.conformes)
+        r["challengers"] = int(row.challengers)
+        r["non_conformes"] = int(row.non_conformes)
+        r["critiques_ko"] = int(row.critiques_ko)
+    return results
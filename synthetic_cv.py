@@ -0,0 +1,151 @@
+import sys
+import random
+import argparse
+import textwrap
+from pathlib import Path
+
+# CV d'auditeurs synthétiques (PDF) pour les benchmarks : aucune donnée réelle de
+# candidat. Le PDF est écrit directement (police Helvetica standard, encodage
+# WinAnsi), sans dépendance supplémentaire ; PyPDF2 en extrait le texte comme
+# pour un vrai CV.
+
+FIRST_NAMES = ["Camille", "Lucas", "Inès", "Hugo", "Léa", "Karim", "Sofia", "Julien", "Maëlle", "Thomas"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Moreau", "Laurent", "Garcia", "Roux", "Fontaine", "Chevalier", "Lopez"]
+EMPLOYERS = ["Laiterie des Alpes", "Biscuiterie Nantaise", "Conserves du Sud-Ouest", "Groupe Volailles Ouest",
+             "Brasserie du Nord", "Charcuteries Réunies", "Surgelés Atlantique", "Fromagerie Comtoise"]
+ROLES = ["Responsable qualité", "Auditeur qualité", "Ingénieur sécurité des aliments", "Technicien HACCP",
+         "Responsable assurance qualité", "Auditeur interne IFS", "Chef de production"]
+SECTORS = ["produits laitiers", "viande et volaille", "boulangerie industrielle", "conserverie",
+           "boissons", "plats cuisinés", "produits surgelés", "emballage alimentaire"]
+DUTIES = [
+    "Mise en place et animation du plan HACCP, validation des CCP et des mesures de maîtrise.",
+    "Réalisation d'audits internes et fournisseurs selon les référentiels IFS Food et BRCGS.",
+    "Gestion des non-conformités, analyse des causes et suivi des actions correctives.",
+    "Préparation des audits de certification FSSC 22000 et accompagnement des équipes.",
+    "Rédaction des procédures de traçabilité, de rappel produit et de gestion des allergènes.",
+    "Formation du personnel aux bonnes pratiques d'hygiène et à la culture sécurité des aliments.",
+    "Suivi des plans de surveillance environnementale (Listeria, Salmonella) et des analyses.",
+    "Revue de direction, indicateurs qualité et amélioration continue (PDCA).",
+    "Évaluation des risques de fraude alimentaire (VACCP) et de malveillance (TACCP).",
+    "Qualification des fournisseurs et revue des cahiers des charges matières premières.",
+]
+COURSES = [
+    "Formation HACCP - {hours} heures - {year}",
+    "Lead Auditor ISO 22000 (IRCA) - {days} jours - {year}",
+    "Formation IFS Food version 8 - {days} jours - {year}",
+    "BRCGS Food Safety Issue 9 - formation auditeur - {year}",
+    "Microbiologie alimentaire appliquée - {hours} heures - {year}",
+]
+LANGUAGES = ["Français (langue maternelle)", "Anglais (courant, C1)", "Espagnol (intermédiaire, B1)", "Allemand (notions)"]
+
+CHARS_PER_LINE = 95
+LINES_PER_PAGE = 60
+
+
+def synthetic_cv(seed=0, pages=2):
+    """
+    Texte d'un CV synthétique (liste de lignes) d'environ `pages` pages :
+    identité, expériences datées, formations, audits réalisés, langues.
+    """
+    rng = random.Random(seed)
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    lines = [
+        f"CURRICULUM VITAE - {name}",
+        f"{rng.choice(ROLES)} - secteur {rng.choice(SECTORS)}",
+        f"{name.split()[0].lower()}.{name.split()[1].lower()}@example.com - +33 6 {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        "",
+        "EXPÉRIENCE PROFESSIONNELLE",
+    ]
+    target = max(1, pages) * LINES_PER_PAGE
+    year, career_start = 2025, 2025 - rng.randint(3, 25)
+    while len(lines) < target * 0.7 and year > career_start:
+        start = year - rng.randint(1, 5)
+        lines.append(f"{rng.randint(1, 12):02d}/{start} - {rng.randint(1, 12):02d}/{year} : {rng.choice(ROLES)}, {rng.choice(EMPLOYERS)} ({rng.choice(SECTORS)})")
+        for duty in rng.sample(DUTIES, rng.randint(2, 4)):
+            lines.extend(textwrap.wrap(f"- {duty}", CHARS_PER_LINE))
+        lines.append(f"- {rng.randint(5, 60)} audits réalisés sur la période.")
+        lines.append("")
+        year = start
+    lines.append("FORMATIONS ET CERTIFICATIONS")
+    for course in rng.sample(COURSES, rng.randint(2, len(COURSES))):
+        lines.append("- " + course.format(hours=rng.choice([14, 16, 21, 35]), days=rng.choice([2, 3, 5]), year=rng.randint(2005, 2024)))
+    lines.append("")
+    lines.append("LANGUES")
+    lines.extend(f"- {lang}" for lang in LANGUAGES[:rng.randint(2, len(LANGUAGES))])
+    while len(lines) < target:
+        lines.extend(textwrap.wrap(f"- {rng.choice(DUTIES)}", CHARS_PER_LINE))
+    return lines[:target]
+
+
+def pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(lines, lines_per_page=LINES_PER_PAGE):
+    """
+    PDF minimal (une police standard, texte brut) à partir d'une liste de lignes.
+    """
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    kids = []
+    for i, page in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({pdf_escape(line)}) Tj T*" for line in page) + " ET"
+        data = stream.encode("cp1252", errors="replace")
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        objects[content_id] = (f"<< /Length {len(data)} >>\nstream\n".encode("latin-1") + data + b"\nendstream")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        body = objects[obj_id]
+        out += f"{obj_id} 0 obj\n".encode("latin-1")
+        out += body if isinstance(body, bytes) else body.encode("latin-1")
+        out += b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for obj_id in sorted(objects):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def synthetic_pdf(seed=0, pages=2):
+    return make_pdf(synthetic_cv(seed, pages))
+
+
+def generate(out_dir, count=20, pages=2, seed=0):
+    """
+    Écrit `count` CV synthétiques dans out_dir (cv_0001.pdf, ...). Renvoie les chemins.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = out_dir / f"cv_{i + 1:04d}.pdf"
+        path.write_bytes(synthetic_pdf(seed + i, pages))
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère des CV PDF synthétiques (benchmarks, démos).")
+    parser.add_argument("out_dir", help="Dossier de sortie")
+    parser.add_argument("-n", "--count", type=int, default=20, help="Nombre de CV")
+    parser.add_argument("-p", "--pages", type=int, default=2, help="Pages par CV")
+    parser.add_argument("--seed", type=int, default=0, help="Graine (CV reproductibles)")
+    args = parser.parse_args(argv)
+    paths = generate(args.out_dir, args.count, args.pages, args.seed)
+    print(f"{len(paths)} CV écrits dans {args.out_dir}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import cache
+from cache import DiskCache, HashMemo
+
+
+def test_set_does_not_scan_the_directory_on_every_write(tmp_path, monkeypatch):
+    store = DiskCache(tmp_path, max_entries=100)
+    scans = []
+    prune = store.prune
+    monkeypatch.setattr(store, "prune", lambda: (scans.append(1), prune()))
+    for i in range(50):
+        store.set(f"k{i}", {"i": i})
+    assert len(scans) == 1
+    assert store.get("k49") == {"i": 49}
+
+
+def test_limits_are_enforced_down_to_the_low_water_mark(tmp_path):
+    store = DiskCache(tmp_path, max_entries=10)
+    for i in range(11):
+        store.set(f"k{i}", {"i": i})
+    assert len(list(tmp_path.glob("*.json"))) == int(10 * cache.LOW_WATER)
+    assert store.get("k10") == {"i": 10}
+
+
+def test_periodic_scan_picks_up_other_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "PRUNE_EVERY", 5)
+    store, other = DiskCache(tmp_path, max_entries=8), DiskCache(tmp_path, max_entries=8)
+    store.set("a", {})
+    for i in range(8):
+        other.set(f"o{i}", {})
+    for i in range(5):
+        store.set(f"s{i}", {})
+    assert len(list(tmp_path.glob("*.json"))) <= 8
+
+
+def test_hash_memo_computes_once_and_stays_bounded():
+    memo, calls = HashMemo(max_entries=3), []
+
+    def compute(key):
+        calls.append(key)
+        return [key]
+
+    for key in ["a", "b", "a", "c", "d", "a"]:
+        assert memo.get(key, lambda: compute(key)) == [key]
+    assert len(memo) == 3
+    # "a", le plus ancien, a été oublié à l'arrivée de "d" puis recalculé
+    assert calls == ["a", "b", "c", "d", "a"]
+    assert memo.get("e", list) == [] and memo.get("e", lambda: compute("e")) == []
@@ -0,0 +1,46 @@
+import pytest
+
+from compaction import PAGE_BREAK, normalize_text
+
+
+@pytest.mark.parametrize("text", [
+    "Quality manager 01.2015-12.2019 at Nestlé",
+    "Auditeur 03.2018 – 06.2021",
+    "01/2015 - 12/2019 : Responsable qualité",
+    "2015-2019 Danone",
+])
+def test_dates_are_kept(text):
+    assert normalize_text(text) == text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Responsable qualité 2015-\n2019", "Responsable qualité 2015-\n2019"),
+    ("Jean-\nPierre Martin", "Jean-\nPierre Martin"),
+    ("manage-\nment de la qualité", "management de la qualité"),
+    ("sécu-\nrité alimentaire", "sécurité alimentaire"),
+])
+def test_only_word_breaks_are_joined(text, expected):
+    assert normalize_text(text) == expected
+
+
+@pytest.mark.parametrize("phone", [
+    "06 12 34 56 78", "06.12.34.56.78", "0612345678", "+33 6 12 34 56 78", "+33 (0)6 12 34 56 78",
+    "+34 612 345 678", "+1 415-555-0132",
+])
+def test_phones_are_removed(phone):
+    assert normalize_text(f"Tél : {phone}\nAuditeur IFS") == "Tél :\nAuditeur IFS"
+
+
+def test_repeated_lines_inside_the_cv_are_kept():
+    text = "2019 - 2021 : Auditor\n- Audits IFS\n2016 - 2019 : Auditor\n- Audits IFS"
+    assert normalize_text(text) == text
+
+
+def test_headers_and_footers_repeated_on_each_page_are_removed():
+    body = "\n- Audits IFS\n- Formation HACCP\n- Suivi des plans d'actions\n"
+    pages = [f"Jean Dupont - CV\nPoste {i}{body}Confidentiel\n{i + 1}/3" for i in range(3)]
+    lines = normalize_text(PAGE_BREAK.join(pages)).split("\n")
+    assert lines.count("Jean Dupont - CV") == 1
+    assert lines.count("Confidentiel") == 1
+    assert lines.count("- Audits IFS") == 3
+    assert [line for line in lines if line.startswith("Poste")] == ["Poste 0", "Poste 1", "Poste 2"]
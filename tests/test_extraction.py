@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+import extraction
+from extraction import ExtractionTimeout, PdfExtractor
+from synthetic_cv import synthetic_pdf
+
+
+def slow_page_range(data, start, stop):
+    # Tranche bloquée (PDF pathologique) : dépasse le délai de l'extracteur
+    if start == 0:
+        time.sleep(30)
+    return [f"page {i}" for i in range(start, stop)]
+
+
+def hung_page_range(data, start, stop):
+    time.sleep(30)
+    return []
+
+
+@pytest.fixture
+def extractor():
+    extractor = PdfExtractor(max_workers=2, pages_per_chunk=1, timeout=1.0)
+    yield extractor
+    extractor.close()
+
+
+def test_extract_complete(extractor):
+    text, partial = extractor.extract(synthetic_pdf(0, 3))
+    assert text and not partial
+
+
+def test_extract_hung_chunk_returns_partial_text_and_recycles_pool(extractor, monkeypatch):
+    monkeypatch.setattr(extraction, "extract_page_range", slow_page_range)
+    data = synthetic_pdf(0, 3)
+    start = time.monotonic()
+    text, partial = extractor.extract(data)
+    assert partial
+    assert "page 0" not in text and "page 1" in text and "page 2" in text
+    assert time.monotonic() - start < 10
+    # Le pool recyclé reste utilisable
+    monkeypatch.undo()
+    assert extractor.extract(data)[1] is False
+
+
+def test_extract_all_chunks_hung_raises(extractor, monkeypatch):
+    monkeypatch.setattr(extraction, "extract_page_range", hung_page_range)
+    with pytest.raises(ExtractionTimeout):
+        extractor.extract(synthetic_pdf(0, 2))
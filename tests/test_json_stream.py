@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from json_stream import AnalysisStreamParser, extract_json_strict, repair_truncated, top_level_objects
+
+ITEM = {"exigence_id": "R1", "statut": "OK", "justification": "Audit {IFS} cité \"tel quel\" }"}
+REPLY = json.dumps({"analysis": [ITEM, dict(ITEM, exigence_id="R2")], "score_global": 0.8}, ensure_ascii=False)
+
+
+def spans(s):
+    return [s[a:b + 1] if b is not None else s[a:] for a, b in top_level_objects(s)]
+
+
+def test_braces_inside_strings_are_ignored():
+    assert spans(REPLY) == [REPLY]
+    assert extract_json_strict(REPLY)["analysis"][0] == ITEM
+
+
+def test_text_before_the_json_is_skipped():
+    text = "Voici l'analyse demandée (format {JSON}) :\n" + REPLY
+    assert extract_json_strict(text)["score_global"] == 0.8
+
+
+def test_several_top_level_objects():
+    text = '{"note": 1} puis ' + REPLY + ' et {"fin": true}'
+    assert spans(text) == ['{"note": 1}', REPLY, '{"fin": true}']
+    assert extract_json_strict(text) == {"note": 1}
+    # Premier objet illisible : le suivant est retenu
+    assert extract_json_strict('{"note": } ' + REPLY)["score_global"] == 0.8
+
+
+def test_array_cut_mid_item_keeps_complete_items():
+    cut = REPLY[:REPLY.index('"R2"') + 10]
+    assert spans(cut) == [cut]
+    repaired = repair_truncated(cut)
+    assert repaired == {"analysis": [ITEM], "truncated": True}
+    assert extract_json_strict("Réponse : " + cut) == repaired
+    assert extract_json_strict(cut, repair=False) is None
+
+
+def test_truncated_before_any_complete_item():
+    cut = REPLY[:REPLY.index('"OK"')]
+    assert repair_truncated(cut) is None
+    assert extract_json_strict(cut) is None
+    assert extract_json_strict("pas de JSON") is None
+
+
+def feed_all(chunks, key="analysis"):
+    parser, items = AnalysisStreamParser(key), []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 50])
+def test_stream_split_anywhere_yields_each_item_once(size):
+    assert feed_all(REPLY[i:i + size] for i in range(0, len(REPLY), size)) == [ITEM, dict(ITEM, exigence_id="R2")]
+
+
+def test_stream_split_mid_string_and_mid_escape():
+    cut_string = REPLY.index("cité") + 2
+    cut_escape = REPLY.index('\\"') + 1
+    chunks = [REPLY[:cut_string], REPLY[cut_string:cut_escape], REPLY[cut_escape:]]
+    assert REPLY[cut_escape - 1] == "\\"
+    assert feed_all(chunks)[0] == ITEM
+
+
+def test_stream_emits_only_items_of_the_root_array():
+    reply = json.dumps({
+        "meta": {"analysis": [{"exigence_id": "imbriqué"}]},
+        "notes": [{"analysis": "texte"}],
+        "analysis": [{"exigence_id": "R1", "preuves": [{"page": 1}], "detail": {"analysis": [{"x": 1}]}}],
+        "autre": [{"exigence_id": "R9"}],
+    })
+    assert feed_all(reply[i:i + 5] for i in range(0, len(reply), 5)) == [json.loads(reply)["analysis"][0]]
@@ -0,0 +1,184 @@
+import json
+from types import SimpleNamespace
+
+from backends import make_chunk
+from mock_llm import canned_analysis
+from pipeline import DEFAULT_OPTIONS, analyse_cv, analyse_groups, cache_variant, cacheable, split_referential
+from registry import REF_DIR, get_registry
+from scoring import iter_requirements
+
+
+def test_cache_variant_distinguishes_chunked_group_size():
+    assert cache_variant({}) == ""
+    assert cache_variant({"chunked": True, "group_size": 4}) != cache_variant({"chunked": True, "group_size": 8})
+    assert cache_variant({"chunked": True}) == cache_variant({"chunked": True, "group_size": DEFAULT_OPTIONS["group_size"]})
+
+
+def test_truncated_results_are_not_cacheable():
+    assert cacheable({"score": 80})
+    assert not cacheable({"score": 80, "truncated": True})
+    assert not cacheable(None)
+
+
+class GroupClient:
+    """
+    Client simulé : répond au format du modèle, sauf pour les prompts contenant `fail`
+    (réponse inexploitable) tant que failures > 0.
+    """
+
+    def __init__(self, fail, failures):
+        self.fail = fail
+        self.failures = failures
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        self.prompts.append(prompt)
+        content = canned_analysis(prompt)
+        if self.fail in prompt and self.failures > 0:
+            self.failures -= 1
+            content = "not json"
+        if kwargs.get("stream"):
+            return iter([make_chunk(content[i:i + 40]) for i in range(0, len(content), 40)])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def ifs():
+    return get_registry(REF_DIR).snapshot()["IFS"]
+
+
+def chunked_options():
+    return dict(DEFAULT_OPTIONS, chunked=True)
+
+
+def test_failed_group_is_retried_alone():
+    selected_ref = ifs()
+    groups = split_referential(selected_ref, DEFAULT_OPTIONS["group_size"])
+    first = next(iter_requirements(groups[1]))["id"]
+    client = GroupClient(f"REQUIREMENT {first}", failures=1)
+    res = analyse_groups(client, "m", selected_ref, "fr", "CV", chunked_options())
+    assert len(client.prompts) == len(groups) + 1
+    assert not any(a.get("non_evalue") for a in res["analysis"])
+
+
+def test_group_failing_twice_is_marked_not_evaluated():
+    selected_ref = ifs()
+    groups = split_referential(selected_ref, DEFAULT_OPTIONS["group_size"])
+    ids = [req["id"] for req in iter_requirements(groups[1])]
+    client = GroupClient(f"REQUIREMENT {ids[0]}", failures=2)
+    res = analyse_groups(client, "m", selected_ref, "fr", "CV", chunked_options())
+    assert sorted(a["exigence_id"] for a in res["analysis"] if a.get("non_evalue")) == sorted(ids)
+    assert len(res["analysis"]) == sum(1 for _ in iter_requirements(selected_ref))
+    result = analyse_cv(GroupClient(f"REQUIREMENT {ids[0]}", failures=2), "m", selected_ref, "fr", "cv.pdf", "CV", options={"chunked": True})
+    assert sorted(result["failed_requirements"]) == sorted(ids)
+    assert not cacheable(result)
+
+
+def test_cached_results_follow_the_scoring_policy(tmp_path):
+    from cache import DiskCache
+    from pipeline import screen_pdf
+    from synthetic_cv import synthetic_pdf
+
+    selected_ref, cache, data = ifs(), DiskCache(tmp_path), synthetic_pdf(0, 1)
+    client = GroupClient("never", failures=0)
+    scores = [screen_pdf(client, "m", selected_ref, "fr", "cv.pdf", data, cache=cache, options={"policy": {"hierarchy": h}})["score"]
+              for h in (True, False)]
+    fresh = screen_pdf(client, "m", selected_ref, "fr", "cv.pdf", data, cache=None, options={"policy": {"hierarchy": False}})["score"]
+    assert len(client.prompts) == 2
+    assert scores[1] == fresh != scores[0]
+
+
+def test_cascade_streams_one_verdict_per_requirement():
+    selected_ref = ifs()
+    seen = []
+    options = {"cascade": True, "escalate_below": 0.99, "on_item": lambda name, item: seen.append(item["exigence_id"])}
+    result = analyse_cv(GroupClient("never", failures=0), "m", selected_ref, "fr", "cv.pdf", "CV", options=options)
+    assert result["cascade"]["escalated"] > 0
+    assert sorted(seen) == sorted(req["id"] for req in iter_requirements(selected_ref))
+
+
+def prepared(selected_ref, pages, seed=0):
+    from pipeline import prepare_cv
+    from registry import referential_hash
+    from synthetic_cv import synthetic_cv
+
+    text = "\n".join(synthetic_cv(seed, pages))
+    return prepare_cv("m", selected_ref, f"cv_{seed}.pdf", text, False, referential_hash(selected_ref), DEFAULT_OPTIONS)
+
+
+def test_plan_packs_groups_short_cvs_only():
+    from pipeline import plan_packs
+
+    selected_ref = ifs()
+    short = [prepared(selected_ref, 1, seed) for seed in range(5)]
+    client = SimpleNamespace()
+    # Quatre réponses attendues tiennent dans la sortie maximale du modèle, pas cinq
+    assert plan_packs(client, "m", selected_ref, short, DEFAULT_OPTIONS) == [[0, 1, 2, 3], [4]]
+    assert plan_packs(client, "m", selected_ref, short, dict(DEFAULT_OPTIONS, pack_size=2)) == [[0, 1], [2, 3], [4]]
+    # Un CV de deux pages dépasse pack_max_cv_tokens : il forme un paquet à lui seul
+    mixed = short[:2] + [prepared(selected_ref, 2, 9)] + short[2:3]
+    assert sorted(plan_packs(client, "m", selected_ref, mixed, DEFAULT_OPTIONS)) == [[0, 1, 3], [2]]
+
+
+def test_split_packed_keeps_known_candidates_with_verdicts():
+    from pipeline import split_packed
+
+    item = {"exigence_id": "R1", "exigence_titre": "t", "statut": "ok", "justification": "", "confiance": 0.9,
+            "ponderation": 1, "niveau_requis": "obligatoire"}
+    parsed = {"candidates": [
+        {"candidate_id": "CV1", "analysis": [dict(item)]},
+        {"candidate_id": "CV1", "analysis": [dict(item, statut="KO")]},
+        {"candidate_id": "CV9", "analysis": [dict(item)]},
+        {"candidate_id": "CV3", "analysis": []},
+        "CV2",
+    ]}
+    parts = split_packed(parsed, ["CV1", "CV2", "CV3"])
+    assert list(parts) == ["CV1"]
+    assert parts["CV1"]["analysis"][0]["statut"] == "OK"
+    assert split_packed({"analysis": []}, ["CV1"]) == {}
+    assert split_packed(None, ["CV1"]) == {}
+
+
+class PackClient(GroupClient):
+    """
+    Client simulé pour les requêtes groupées : omet le candidat `drop` et, pour le
+    candidat `partial`, les verdicts des exigences `cut`.
+    """
+
+    def __init__(self, drop, partial, cut):
+        super().__init__("never", failures=0)
+        self.drop, self.partial, self.cut = drop, partial, set(cut)
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        self.prompts.append(prompt)
+        parsed = json.loads(canned_analysis(prompt))
+        for entry in parsed.get("candidates", []):
+            if entry["candidate_id"] == self.partial:
+                entry["analysis"] = [a for a in entry["analysis"] if a["exigence_id"] not in self.cut]
+        if "candidates" in parsed:
+            parsed["candidates"] = [e for e in parsed["candidates"] if e["candidate_id"] != self.drop]
+        content = json.dumps(parsed)
+        if kwargs.get("stream"):
+            return iter([make_chunk(content[i:i + 40]) for i in range(0, len(content), 40)])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def test_analyse_pack_recovers_missing_candidate_and_requirements():
+    from pipeline import analyse_pack
+
+    selected_ref = ifs()
+    ids = [req["id"] for req in iter_requirements(selected_ref)]
+    ctxs = [prepared(selected_ref, 1, seed) for seed in range(3)]
+    client = PackClient(drop="CV2", partial="CV3", cut=ids[:2])
+    out = analyse_pack(client, "m", selected_ref, "fr", ctxs, DEFAULT_OPTIONS)
+    assert [err for _, err in out] == [None, None, None]
+    results = [res for res, _ in out]
+    assert results[1]["pack"]["fallback"] and "fallback" not in results[0]["pack"]
+    assert sorted(results[2]["pack"]["repaired"]) == sorted(ids[:2])
+    for res in results:
+        assert sorted(a["exigence_id"] for a in res["details"]) == sorted(ids)
+    # Une requête groupée, un CV réanalysé seul, une réévaluation des exigences manquantes
+    assert len(client.prompts) == 3
+    assert "REQUIREMENT " + ids[2] not in client.prompts[-1]
@@ -0,0 +1,101 @@
+from datetime import date
+
+import pytest
+
+from prescreen import COURSES, _norm, audit_count, experience_months, extract_facts, prescreen
+
+TODAY = date(2026, 10, 18)
+
+REFERENTIAL = {
+    "categories": {
+        "EXP": {"weight": 1, "subcategories": {"EXP1": {"weight": 1, "requirements": [
+            {"id": "EXP-001", "text": "Minimum of 5 years professional experience in the food industry", "critical": True},
+        ]}}},
+        "CERT": {"weight": 1, "subcategories": {"CERT1": {"weight": 1, "requirements": [
+            {"id": "CERT-001", "text": "Lead Auditor course of 40 hours", "critical": True},
+        ]}}},
+    }
+}
+
+FILLER = "Gestion des non-conformités, audits fournisseurs et plans HACCP en industrie laitière. " * 4
+
+
+def years(text):
+    return round(experience_months(_norm(text), TODAY)[0] / 12, 1)
+
+
+@pytest.mark.parametrize("text", [
+    "2017 - aujourd'hui : Responsable qualité",
+    "2017 – aujourd’hui : Responsable qualité",
+    "2017 - aujourd hui : Responsable qualité",
+    "de 2017 à ce jour : Responsable qualité",
+    "2017 - à ce jour : Responsable qualité",
+    "2017 - present : Quality manager",
+])
+def test_open_ended_periods(text):
+    assert years(text) == pytest.approx(9.8, abs=0.1)
+
+
+def test_open_ended_period_added_to_older_ones():
+    assert years("2017 – aujourd’hui Responsable qualité\n2012 - 2015 Master") > 13
+
+
+@pytest.mark.parametrize("text", ["Lead Auditor ISO 22000", "Formation Lead Auditeur FSSC 22000", "lead-auditrice IFS",
+                                  "Auditeur principal BRCGS", "Auditor líder ISO 22000", "Cours IRCA 40 h"])
+def test_lead_auditor_spellings(text):
+    assert COURSES["lead_auditor"].search(_norm(text))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("ISO 9001 audits", 0),
+    ("FSSC 22000 audits", 0),
+    ("IFS 8 audits", 0),
+    ("2019 audits internes", 0),
+    ("45 audits IFS réalisés", 45),
+    ("plus de 120 audits FSSC 22000", 120),
+    ("ISO 22000 : 12 audits", 12),
+    ("Responsable qualité", None),
+])
+def test_audit_count_ignores_standard_numbers(text, expected):
+    assert audit_count(_norm(text)) == expected
+
+
+def test_facts_do_not_report_standard_numbers():
+    assert extract_facts("Audits ISO 9001 audits et FSSC 22000 audits réalisés", TODAY)["audit_count"] == 0
+
+
+def test_missing_match_never_rejects():
+    # Période ouverte non reconnue et formation non mentionnée : KO indicatifs, pas de rejet
+    cv = "Responsable qualité 2019 - 2021, chef d'équipe en 2009 chez Laiterie des Alpes. " + FILLER
+    report = prescreen(cv, REFERENTIAL, "test-missing", TODAY)
+    statuses = {v["exigence_id"]: (v["statut"], v["conclusive"]) for v in report["verdicts"]}
+    assert statuses == {"EXP-001": ("KO", False), "CERT-001": ("KO", False)}
+    assert not report["reject"]
+
+
+def test_positive_evidence_rejects():
+    cv = "Formation Lead Auditor ISO 22000 - 16 heures - 2024. Technicien qualité 2023 - aujourd'hui. " + FILLER
+    report = prescreen(cv, REFERENTIAL, "test-positive", TODAY)
+    statuses = {v["exigence_id"]: (v["statut"], v["conclusive"]) for v in report["verdicts"]}
+    assert statuses == {"EXP-001": ("KO", True), "CERT-001": ("KO", True)}
+    assert report["reject"]
+
+
+def ifs():
+    from registry import REF_DIR, get_registry
+    return get_registry(REF_DIR).snapshot()["IFS"]
+
+
+def test_undated_course_mention_is_not_a_conclusive_ko():
+    # Formation initiale sans durée + recyclage court : la formation requise peut être la première
+    cv = "Formation HACCP (Institut Pasteur, 2011). Recyclage HACCP 7h en 2022. Responsable qualité 2010 - aujourd'hui. " + FILLER.replace("HACCP", "sanitaires")
+    report = prescreen(cv, ifs(), None, TODAY)
+    verdict = next(v for v in report["verdicts"] if v["exigence_id"] == "IFS-CERT-002")
+    assert (verdict["statut"], verdict["conclusive"]) == ("UNKNOWN", False)
+    assert not report["reject"]
+
+
+def test_every_mention_below_minimum_is_conclusive():
+    cv = "Formation HACCP 7h en 2011. Recyclage HACCP 7 heures en 2022. Responsable qualité 2010 - aujourd'hui. " + FILLER.replace("HACCP", "sanitaires")
+    verdict = next(v for v in prescreen(cv, ifs(), None, TODAY)["verdicts"] if v["exigence_id"] == "IFS-CERT-002")
+    assert (verdict["statut"], verdict["conclusive"]) == ("KO", True)
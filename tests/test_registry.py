@@ -0,0 +1,76 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from cache import content_hash
+from registry import FrozenDict, ReferentialRegistry, ReferentialStore, freeze, referential_hash
+
+REF = {"nom": "Test", "exigences": [{"id": "R1", "titre": "HACCP", "criteres": {"heures": 14}}]}
+
+
+def test_frozen_referential_is_read_only():
+    frozen = freeze(REF)
+    assert isinstance(frozen, dict) and isinstance(frozen["exigences"], tuple)
+    with pytest.raises(TypeError):
+        frozen["nom"] = "x"
+    with pytest.raises(TypeError):
+        frozen["exigences"][0]["criteres"].update(heures=0)
+    for mutate in (lambda d: d.pop("nom"), lambda d: d.setdefault("x", 1), lambda d: d.clear(), lambda d: d.__delitem__("nom")):
+        with pytest.raises(TypeError):
+            mutate(frozen)
+    with pytest.raises(TypeError):
+        frozen |= {"x": 1}
+    assert json.dumps(frozen) == json.dumps(REF)
+
+
+def test_frozen_copies_share_the_object_and_stay_serialisable():
+    frozen = freeze(REF)
+    assert copy.copy(frozen) is frozen and copy.deepcopy(frozen) is frozen
+    assert isinstance(pickle.loads(pickle.dumps(frozen)), FrozenDict)
+    editable = json.loads(json.dumps(frozen))
+    editable["nom"] = "Copie"
+    assert frozen["nom"] == "Test"
+
+
+def test_referential_hash_is_stable(tmp_path):
+    reordered = {"exigences": [{"criteres": {"heures": 14}, "titre": "HACCP", "id": "R1"}], "nom": "Test"}
+    assert referential_hash(REF) == referential_hash(reordered) == referential_hash(freeze(REF)) == content_hash(REF)
+    assert referential_hash(dict(REF, nom="Autre")) != referential_hash(REF)
+    (tmp_path / "Test.json").write_text(json.dumps(REF, indent=4), encoding="utf-8")
+    loaded = ReferentialRegistry(tmp_path).refresh(force=True)["Test"]
+    assert loaded.content_hash == referential_hash(REF)
+    assert referential_hash(loaded) == referential_hash(json.loads(json.dumps(loaded)))
+
+
+def test_store_save_archives_each_version_once(tmp_path):
+    store = ReferentialStore(tmp_path)
+    assert store.save(REF, "Mon ref.json") == ("Mon_ref", referential_hash(REF))
+    v2 = dict(REF, nom="v2")
+    store.save(v2, "Mon_ref")
+    store.save(v2, "Mon_ref")
+    assert [v["hash"] for v in store.versions("Mon_ref")] == [referential_hash(v2), referential_hash(REF)]
+    assert json.loads((tmp_path / "Mon_ref.json").read_text(encoding="utf-8")) == v2
+    assert len(list((tmp_path / ".versions" / "Mon_ref").glob("*.json"))) == 2
+    # Les archives restent invisibles pour le registre
+    assert list(ReferentialRegistry(tmp_path).refresh(force=True)) == ["Mon_ref"]
+
+
+def test_store_archives_a_file_written_outside_the_store(tmp_path):
+    (tmp_path / "Ext.json").write_text(json.dumps(REF), encoding="utf-8")
+    store = ReferentialStore(tmp_path)
+    store.save(dict(REF, nom="v2"), "Ext")
+    assert store.load_version("Ext", referential_hash(REF)) == REF
+
+
+def test_store_lookup_and_restore(tmp_path):
+    store = ReferentialStore(tmp_path)
+    store.save(REF, "R")
+    store.save(dict(REF, nom="v2"), "R")
+    assert store.restore("R", referential_hash(REF)) == ("R", referential_hash(REF))
+    assert json.loads((tmp_path / "R.json").read_text(encoding="utf-8")) == REF
+    assert store.versions("R")[0]["hash"] == referential_hash(REF)
+    assert store.versions("absent") == []
+    with pytest.raises(OSError):
+        store.load_version("R", "0" * 64)
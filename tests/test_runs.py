@@ -0,0 +1,34 @@
+from runs import RunStore, run_owner
+
+
+def results():
+    return [{"nom": "cv.pdf", "score": 0.8, "cv_text": "Jean Dupont, 06 12 34 56 78"}]
+
+
+def test_runs_are_scoped_to_their_owner(tmp_path):
+    store = RunStore(tmp_path)
+    alice, bob = run_owner("key-a"), run_owner("key-b")
+    meta = store.save(results(), owner=alice, referential="IFS")
+    assert store.load(meta["id"], alice)["results"][0]["nom"] == "cv.pdf"
+    assert store.load(meta["id"], bob) is None
+    assert store.load(meta["id"]) is None
+    assert [m["id"] for m in store.list_runs(alice)] == [meta["id"]]
+    assert store.list_runs(bob) == []
+    assert store.load(meta["id"], bob, admin=True) is not None
+
+
+def test_sessions_without_api_key_do_not_share_runs(tmp_path):
+    store = RunStore(tmp_path)
+    meta = store.save(results(), owner=run_owner(None, "s1"))
+    assert store.load(meta["id"], run_owner(None, "s2")) is None
+    assert run_owner(None, None) is None
+
+
+def test_cv_text_is_only_kept_on_request(tmp_path):
+    store = RunStore(tmp_path)
+    owner = run_owner("key-a")
+    plain = store.save(results(), owner=owner)
+    kept = store.save(results(), owner=owner, keep_text=True)
+    assert "cv_text" not in store.load(plain["id"], owner)["results"][0]
+    assert "Jean Dupont" not in (tmp_path / f"{plain['id']}.json").read_text(encoding="utf-8")
+    assert store.load(kept["id"], owner)["results"][0]["cv_text"].startswith("Jean Dupont")
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from scheduler import DEFAULT_LIMITS, MODEL_LIMITS, ModelLimiter, RateLimitScheduler, parse_duration, parse_limits
+
+
+def test_parse_limits_default_is_reactive():
+    assert parse_limits("") == ({}, None)
+    assert parse_limits(None) == ({}, None)
+
+
+def test_parse_limits_free_tier():
+    assert parse_limits("free") == (MODEL_LIMITS, DEFAULT_LIMITS)
+
+
+def test_parse_limits_custom():
+    model_limits, default_limits = parse_limits("openai/gpt-oss-120b=1000:250000, *=300:60000")
+    assert model_limits == {"openai/gpt-oss-120b": (1000, 250000)}
+    assert default_limits == (300, 60000)
+
+
+@pytest.mark.parametrize("spec", ["gpt=1000", "=1:2", "gpt=a:b"])
+def test_parse_limits_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_limits(spec)
+
+
+@pytest.mark.parametrize("value, expected", [("12", 12.0), ("7.66s", 7.66), ("2m59.56s", 179.56), ("6ms", 0.006)])
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == pytest.approx(expected)
+
+
+def test_parse_duration_unreadable():
+    assert parse_duration("n/a") is None
+
+
+def test_token_limit_learned_from_headers():
+    scheduler = RateLimitScheduler()
+    assert scheduler.token_limit("m") is None
+    scheduler.observe("m", {"x-ratelimit-limit-tokens": "250000"})
+    assert scheduler.token_limit("m") == 250000
+
+
+def test_limiter_waits_for_reset_when_quota_exhausted():
+    limiter = ModelLimiter()
+    limiter.observe({"x-ratelimit-remaining-requests": "1", "x-ratelimit-reset-requests": "0.2s",
+                     "x-ratelimit-remaining-tokens": "100000", "x-ratelimit-reset-tokens": "1s"})
+    start = time.monotonic()
+    limiter.wait(10)
+    assert time.monotonic() - start < 0.1
+    limiter.wait(10)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_scheduled_client_reads_rate_limit_headers():
+    import httpx
+
+    from backends import OpenAICompatibleClient
+    from scheduler import ScheduledClient
+
+    def handler(request):
+        body = {"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 10}}
+        return httpx.Response(200, json=body, headers={"x-ratelimit-limit-tokens": "60000"})
+
+    http = httpx.Client(transport=httpx.MockTransport(handler))
+    client = ScheduledClient(OpenAICompatibleClient("http://llm/v1", http=http), RateLimitScheduler())
+    response = client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+    assert response.choices[0].message.content == "ok"
+    assert client.scheduler.token_limit("m") == 60000
@@ -0,0 +1,23 @@
+from scoring import requirement_matrix, score_candidates
+
+
+def analyses():
+    return [[
+        {"exigence_id": "A", "statut": "CONFORME", "confiance": 0.5, "ponderation": 1.0},
+        {"exigence_id": "B", "statut": "A CHALLENGER", "confiance": 0.8, "ponderation": 1.0},
+    ]]
+
+
+def test_matrix_uses_confidence_like_the_scores():
+    policy = {"use_confidence": True, "challenge_factor": 0.5}
+    matrix = requirement_matrix(analyses(), ["cv"], policy=policy)
+    assert matrix.loc["cv", "A"] == 0.5
+    assert matrix.loc["cv", "B"] == 0.4
+    score = score_candidates(analyses(), policy=policy).loc[0, "score"]
+    assert score == matrix.loc["cv"].mean()
+
+
+def test_matrix_without_confidence():
+    matrix = requirement_matrix(analyses(), ["cv"], policy={"use_confidence": False, "challenge_factor": 0.5})
+    assert matrix.loc["cv", "A"] == 1.0
+    assert matrix.loc["cv", "B"] == 0.5